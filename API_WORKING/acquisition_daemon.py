@@ -0,0 +1,157 @@
+"""
+Resident acquisition service.
+
+`python acquisition_daemon.py` imports the devices from take_measurement.py
+once, keeps the RunEngine and the connected, staged camera alive, and takes
+single measurements on request over a local Unix socket. A shot then costs
+about one exposure instead of an interpreter start, ophyd/bluesky imports,
+device connection and stage/unstage.
+
+Requests and replies are one JSON object per line:
+
+    {"cmd": "measure", "angle": 45.0}  ->  {"ok": true, "file": "...tiff", "latency": 0.21}
+    {"cmd": "ping"}                    ->  {"ok": true}
+
+request_measurement() is the client side and does not import any EPICS code.
+Shots are refused while a scan holds the detector (see DetectorLock).
+"""
+import json, os, socket, socketserver, sys, threading, time
+from datetime import datetime
+from resource_pool import DetectorLock
+from scan_catalog import record
+
+SOCKET_PATH = os.environ.get("BOLT_ACQ_SOCKET", "/tmp/bolt_acquisition.sock")
+SAVE_DIR = '/home/user/tmpData/AI_scan/measurements/'
+
+
+def request(message: dict, timeout: float = 30.0, socket_path: str = SOCKET_PATH) -> dict:
+    """ Send one request to the daemon. Raises ConnectionError when it is not running. """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall((json.dumps(message) + "\n").encode())
+            reply = sock.makefile().readline()
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        raise ConnectionError(f"Acquisition daemon not running at {socket_path}") from e
+    if not reply:
+        raise ConnectionError("Acquisition daemon closed the connection")
+    return json.loads(reply)
+
+
+def request_measurement(angle: float, timeout: float = 30.0, socket_path: str = SOCKET_PATH) -> str:
+    """ Take one measurement through the daemon and return the saved file path. """
+    reply = request({"cmd": "measure", "angle": angle}, timeout, socket_path)
+    if not reply.get("ok"):
+        raise RuntimeError(reply.get("error", "Measurement failed"))
+    return reply["file"]
+
+
+class AcquisitionService:
+    """ Owns the RunEngine and the staged camera for the lifetime of the daemon. """
+
+    def __init__(self, save_dir: str = SAVE_DIR, max_retries: int = 5, timeout: float = 5.0):
+        import bluesky.plan_stubs as bps
+        from ophyd import EpicsSignal
+        import take_measurement as hw        # Connects the motor and camera once
+        from frame_wait import FrameWaiter
+
+        self.bps = bps
+        self.hw = hw
+        self.save_dir = save_dir
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._lock = threading.Lock()        # One camera, one shot at a time
+        self.detector = DetectorLock("acquisition daemon")
+        self.acquire_signal = EpicsSignal('13ARV1:cam1:Acquire', name='acquire_signal')
+        # Requests are served from worker threads, where the SIGINT handler can't be installed
+        hw.RE.context_managers = []
+
+        os.makedirs(save_dir, exist_ok=True)
+        hw.camera.cam.array_callbacks.put(0, wait=True)
+
+        print("\n--- Staging camera ---")
+        hw.camera.stage()
+        self.waiter = FrameWaiter(save_dir, counter_signal=hw.camera.tiff.array_counter)
+        self.current_number = hw.camera.tiff.file_number.get()
+
+    def _snap(self, filename: str, number: int):
+        bps, camera = self.bps, self.hw.camera
+        # Every shot: scans repoint the shared TIFF plugin to their own folders and leave it there
+        yield from bps.mv(camera.tiff.file_path, self.save_dir)
+        yield from bps.mv(camera.tiff.file_template, '%s%s_%d.tiff')
+        yield from bps.mv(camera.tiff.file_name, filename)
+        yield from bps.mv(camera.tiff.file_number, number)
+        yield from bps.mv(self.acquire_signal, 0)
+        self._token = self.waiter.arm()
+        yield from bps.mv(self.acquire_signal, 1)  # Triggers a single image
+
+    def measure(self, angle: float) -> dict:
+        with self._lock:
+            # A running scan owns the TIFF plugin, a shot now would send its frames here
+            if not self.detector.acquire(timeout=0):
+                return {"ok": False, "error": f"Detector in use by {self.detector.holder()}"}
+            try:
+                return self._measure(angle)
+            finally:
+                self.detector.release()
+
+    def _measure(self, angle: float) -> dict:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f'scan_{timestamp}_pos_{angle}_shot'
+        self.current_number += 1
+        filepath = os.path.join(self.save_dir, f"{filename}_{self.current_number}.tiff")
+
+        t0 = time.monotonic()
+        for attempt in range(1, self.max_retries + 1):
+            self.hw.RE(self._snap(filename, self.current_number))
+            try:
+                self.waiter.wait(self._token, filepath, timeout=self.timeout)
+                print(f"✓ Image saved at {filepath}")
+                record("measurements", filepath, "raw", angle)
+                return {"ok": True, "file": filepath, "latency": time.monotonic() - t0, "attempts": attempt}
+            except TimeoutError:
+                print(f"--Timeout waiting for image at {filepath}, attempt {attempt}")
+        return {"ok": False, "error": f"Failed after {self.max_retries} attempts: {filepath}"}
+
+    def close(self):
+        print("\n--- Unstaging camera ---")
+        self.waiter.close()
+        self.hw.camera.unstage()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                if message.get("cmd") == "ping":
+                    reply = {"ok": True}
+                elif message.get("cmd") == "measure":
+                    reply = self.server.service.measure(float(message["angle"]))
+                else:
+                    reply = {"ok": False, "error": f"Unknown command {message.get('cmd')}"}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+            self.wfile.flush()
+
+
+def serve(socket_path: str = SOCKET_PATH, save_dir: str = SAVE_DIR):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    service = AcquisitionService(save_dir)
+    with socketserver.ThreadingUnixStreamServer(socket_path, _Handler) as server:
+        server.service = service
+        print(f"Acquisition daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopping acquisition daemon")
+        finally:
+            service.close()
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1] if len(sys.argv) > 1 else SOCKET_PATH)
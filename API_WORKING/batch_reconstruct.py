@@ -0,0 +1,236 @@
+"""
+Batch reconstruction of many scan folders.
+
+Each scan runs as its own reconstruction.py process, several at a time.
+They share one resource pool (see resource_pool.py): a CPU-heavy stage
+waits until the cores it runs on are free, IO-heavy stages only need an IO
+slot, so one scan can undistort or convert while another extracts features
+and the host is never oversubscribed. Per-scan logs, results and stage
+timings go to <out>/summary.json and summary.csv.
+
+    python batch_reconstruct.py "scan_2025*" bunny:high teapot --profile fast --jobs 3
+"""
+import argparse, csv, fnmatch, json, os, signal, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor, wait
+import progress
+from recon_profiles import PROFILE_NAMES, DEFAULT_PROFILE, available_cores
+from scan_catalog import DATA_ROOT
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def expand_scans(patterns, default_profile: str = DEFAULT_PROFILE, data_root: str = DATA_ROOT):
+    """
+    [(scan, profile)] for scan names or glob patterns, each optionally followed
+    by :profile. Only folders with images are kept, each scan once.
+    """
+    folders = sorted(name for name in os.listdir(data_root) if os.path.isdir(os.path.join(data_root, name)))
+    scans = {}
+    for pattern in patterns:
+        pattern, _, profile = pattern.partition(":")
+        profile = profile or default_profile
+        if profile not in PROFILE_NAMES:
+            raise ValueError(f"Unknown profile {profile} for {pattern}, expected one of {PROFILE_NAMES}")
+        matches = fnmatch.filter(folders, pattern)
+        if not matches:
+            print(f"--No scan folder matches {pattern}")
+        for name in matches:
+            scan_dir = os.path.join(data_root, name)
+            if any(os.path.isdir(os.path.join(scan_dir, d)) for d in ("images_png", "raw_images")) or \
+                    os.path.exists(os.path.join(scan_dir, "scan.h5")):
+                scans.setdefault(name, profile)
+    return list(scans.items())
+
+
+def read_scan_list(path: str):
+    """ Scan list file: one "<scan or pattern>[:profile]" per line, # comments. """
+    with open(path) as f:
+        return [line.split("#")[0].strip() for line in f if line.split("#")[0].strip()]
+
+
+class BatchJob:
+    """ One scan of the batch and what happened to it. """
+
+    def __init__(self, scan: str, profile: str):
+        self.scan = scan
+        self.profile = profile
+        self.status = "queued"
+        self.returncode = None
+        self.queued = time.time()
+        self.started = None
+        self.finished = None
+        self.stages = {}
+        self.error = None
+
+    def handle_event(self, event: dict):
+        kind = event.get("event")
+        if kind == "stage_start":
+            self.stages[event["stage"]] = {"status": "running", "waited": event.get("waited", 0.0)}
+        elif kind in ("stage_end", "stage_failed"):
+            stage = self.stages.setdefault(event["stage"], {})
+            stage.update(duration=event.get("duration"),
+                         status="failed" if kind == "stage_failed" else ("skipped" if event.get("skipped") else "done"))
+            if kind == "stage_failed":
+                self.error = f"{event['stage']}: {event.get('error')}"
+
+    def to_dict(self) -> dict:
+        return {
+            "scan": self.scan, "profile": self.profile, "status": self.status, "returncode": self.returncode,
+            "queue_wait": (self.started or self.queued) - self.queued,
+            "wall": (self.finished - self.started) if self.finished and self.started else None,
+            "resource_wait": sum(s.get("waited") or 0.0 for s in self.stages.values()),
+            "stages": self.stages, "error": self.error,
+        }
+
+
+class BatchScheduler:
+    """ Runs the jobs `jobs` at a time against one resource pool. """
+
+    def __init__(self, scans, out_dir: str, jobs: int = 3, threads: int = None, cores: int = None,
+                 io_slots: int = 2, force: bool = False):
+        self.cores = cores or available_cores()
+        self.jobs = [BatchJob(scan, profile) for scan, profile in scans]
+        self.out_dir = out_dir
+        self.max_jobs = max(1, jobs)
+        # Default: two CPU stages side by side, the third job in an IO stage
+        self.threads = min(threads or max(1, self.cores // 2), self.cores)
+        self.force = force
+        self.wall = None
+        self._lock = threading.Lock()
+        self._processes = set()
+        self._stopped = False
+        self.env = dict(os.environ,
+                        BOLT_RESOURCE_DIR=os.environ.get("BOLT_RESOURCE_DIR") or tempfile.mkdtemp(prefix="bolt_pool_"),
+                        BOLT_RESOURCE_CORES=str(self.cores), BOLT_RESOURCE_IO=str(io_slots))
+        os.makedirs(os.path.join(out_dir, "logs"), exist_ok=True)
+
+    def run_job(self, job: BatchJob):
+        if self._stopped:
+            job.status = "cancelled"
+            return
+        job.status = "running"
+        job.started = time.time()
+        cmd = [sys.executable, "-u", "reconstruction.py", job.scan, "--profile", job.profile,
+               "--threads", str(self.threads)] + (["--force"] if self.force else [])
+        print(f"→ {job.scan} ({job.profile})")
+        try:
+            with open(os.path.join(self.out_dir, "logs", f"{job.scan}.log"), "w") as log:
+                process = subprocess.Popen(cmd, cwd=SCRIPT_DIR, env=self.env, stdout=subprocess.PIPE,
+                                           stderr=subprocess.STDOUT, text=True, bufsize=1)
+                self._processes.add(process)
+                for line in process.stdout:
+                    log.write(line)
+                    event = progress.parse(line.rstrip("\n"))
+                    if event is not None:
+                        job.handle_event(event)
+                job.returncode = process.wait()
+                self._processes.discard(process)
+            if self._stopped:
+                job.status = "cancelled"
+            elif job.returncode != 0:
+                job.status = "failed"
+            elif not job.stages:
+                # reconstruction.py exits 0 when the scan has no images
+                job.status, job.error = "failed", "no stage ran, see the log"
+            else:
+                job.status = "succeeded"
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+        finally:
+            job.finished = time.time()
+            marker = "✓" if job.status == "succeeded" else "--"
+            print(f"{marker}{job.scan} {job.status} after {job.finished - job.started:.1f}s")
+            done = sum(1 for j in self.jobs if j.finished)
+            progress.emit("batch_job", scan=job.scan, status=job.status, done=done, total=len(self.jobs))
+            self.save()
+
+    def stop(self, *args):
+        """ Terminate the running reconstructions, queued ones are not started (also the SIGTERM handler). """
+        self._stopped = True
+        for process in list(self._processes):
+            process.terminate()
+
+    def run(self) -> list:
+        print(f"Batch of {len(self.jobs)} scans, {self.max_jobs} at a time, {self.threads} threads each "
+              f"on {self.cores} cores (pool {self.env['BOLT_RESOURCE_DIR']})")
+        t0 = time.time()
+        executor = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="batch-job")
+        try:
+            pending = {executor.submit(self.run_job, job) for job in self.jobs}
+            while pending:
+                # Timed waits: a signal that lands on a worker thread runs its handler only
+                # once the main thread wakes up
+                done, pending = wait(pending, timeout=0.5)
+                for future in done:
+                    future.result()
+        except KeyboardInterrupt:
+            # Not the executor's own exit, which would still start every queued scan. Queued
+            # scans are dropped first, so a worker freed by stop() has nothing left to pick up.
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.stop()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            for job in self.jobs:
+                if job.status == "queued":
+                    job.status = "cancelled"
+            self.wall = time.time() - t0
+            self.save()
+        return self.jobs
+
+    def save(self):
+        """ summary.json with everything, summary.csv with one row per scan and stage. """
+        with self._lock:
+            self._write_summary([job.to_dict() for job in self.jobs])
+
+    def _write_summary(self, jobs: list):
+        with open(os.path.join(self.out_dir, "summary.json"), "w") as f:
+            json.dump({"cores": self.cores, "threads": self.threads, "max_jobs": self.max_jobs,
+                       "wall": self.wall, "jobs": jobs}, f, indent=2)
+
+        with open(os.path.join(self.out_dir, "summary.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["scan", "profile", "status", "stage", "stage_status", "waited",
+                                                   "duration", "queue_wait", "wall"])
+            writer.writeheader()
+            for job in jobs:
+                row = {key: job[key] for key in ("scan", "profile", "status", "queue_wait", "wall")}
+                writer.writerow(dict(row, stage="total"))
+                for stage, info in job["stages"].items():
+                    writer.writerow(dict(row, stage=stage, stage_status=info.get("status"),
+                                         waited=info.get("waited"), duration=info.get("duration")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruct many scan folders with shared cores")
+    parser.add_argument("scans", nargs="*", help="scan names or glob patterns, optionally name:profile")
+    parser.add_argument("--list", metavar="FILE", help="file with one scan or pattern[:profile] per line")
+    parser.add_argument("--profile", choices=PROFILE_NAMES, default=DEFAULT_PROFILE, help="profile for scans without one")
+    parser.add_argument("--jobs", type=int, default=3, help="reconstructions running at once")
+    parser.add_argument("--threads", type=int, default=None, help="threads per stage (default: half the cores)")
+    parser.add_argument("--io-slots", type=int, default=2, help="IO-heavy stages running at once")
+    parser.add_argument("--force", action="store_true", help="ignore the stage caches")
+    parser.add_argument("--out", default=None, help="summary folder (default: <data root>/batch/<timestamp>)")
+    args = parser.parse_args()
+
+    patterns = args.scans + (read_scan_list(args.list) if args.list else [])
+    scans = expand_scans(patterns, args.profile)
+    if not scans:
+        sys.exit("No scans to reconstruct")
+
+    out_dir = args.out or os.path.join(DATA_ROOT, "batch", time.strftime("%Y%m%d_%H%M%S"))
+    scheduler = BatchScheduler(scans, out_dir, jobs=args.jobs, threads=args.threads, io_slots=args.io_slots,
+                               force=args.force)
+    # Cancelling the batch (API job, kill) also stops its reconstructions
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    try:
+        jobs = scheduler.run()
+    except KeyboardInterrupt:
+        print("\nBatch interrupted by user")
+        scheduler.stop()
+        jobs = scheduler.jobs
+
+    print(f"\n{'scan':<32} {'profile':<9} {'status':<10} {'wall s':>8} {'waited s':>9}")
+    for job in (j.to_dict() for j in jobs):
+        print(f"{job['scan']:<32} {job['profile']:<9} {job['status']:<10} {job['wall'] or 0:>8.1f} {job['resource_wait']:>9.1f}")
+    print(f"\nSummary saved at {os.path.join(out_dir, 'summary.json')}")
+    sys.exit(0 if all(job.status == "succeeded" for job in jobs) else 1)
@@ -1,10 +1,62 @@
+import os, tarfile
 import requests
 
-try:
-    laptop_1_ip = "http://192.128.196.143:8000"
+laptop_1_ip = "http://192.128.196.143:8000"
 
-    response = requests.get(laptop_1_ip)
-    print(response.json())
 
-except requests.exceptions.RequestException as e:
-    print(f"Request failed: {e}")
\ No newline at end of file
+def download(path, dest, server=laptop_1_ip):
+    """
+    Fetch a file under the data root to dest. A partial dest is resumed with
+    a Range request, a complete one is skipped while the server's copy is
+    unchanged (304).
+    """
+    # <dest>.etag holds the ETag and full size of the version being downloaded
+    meta_path = dest + ".etag"
+    headers = {"Accept-Encoding": "identity"}      # Byte offsets must refer to the file itself
+    have = os.path.getsize(dest) if os.path.exists(dest) else 0
+    if have and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            etag, size = f.read().split()
+        if have == int(size):
+            headers["If-None-Match"] = etag
+        elif have < int(size):
+            # If-Range: the server sends the whole file again if it changed since
+            headers.update({"Range": f"bytes={have}-", "If-Range": etag})
+
+    with requests.get(f"{server}/files/{path}", headers=headers, stream=True, timeout=30) as response:
+        if response.status_code == 304:
+            return dest
+        response.raise_for_status()
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        if response.status_code == 200:
+            with open(meta_path, "w") as f:
+                f.write(f"{response.headers['ETag']} {response.headers['Content-Length']}")
+        with open(dest, "ab" if response.status_code == 206 else "wb") as f:
+            for chunk in response.iter_content(1 << 20):
+                f.write(chunk)
+    return dest
+
+
+def download_scan(scan, dest_dir, groups=None, server=laptop_1_ip, compress=False):
+    """ Whole scan in one streamed tar, extracted to dest_dir/<scan>. Returns the number of files. """
+    params = {"gzip": str(compress).lower()}
+    if groups:
+        params["groups"] = ",".join(groups)
+    with requests.get(f"{server}/scans/{scan}/archive", params=params, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        response.raw.decode_content = False
+        with tarfile.open(fileobj=response.raw, mode="r|gz" if compress else "r|") as archive:
+            count = 0
+            for member in archive:
+                archive.extract(member, dest_dir, filter="data")
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    try:
+        response = requests.get(laptop_1_ip)
+        print(response.json())
+
+    except requests.exceptions.RequestException as e:
+        print(f"Request failed: {e}")
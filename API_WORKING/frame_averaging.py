@@ -0,0 +1,118 @@
+"""
+Averaging of several frames taken at the same angle.
+
+Frames are reduced into a preallocated buffer at the detector's native bit
+depth (a wide integer sum for the mean, a frame stack for the median and the
+sigma-clipped mean), and an angle's buffer is released as soon as its result
+is out, so memory stays at one accumulator per angle in flight.
+"""
+import numpy as np
+
+METHODS = ("mean", "median", "sigma_clip")
+
+
+class FrameAccumulator:
+    """ Reduces `n_frames` frames of one shape and dtype with `method`. """
+
+    def __init__(self, shape, dtype, n_frames: int, method: str = "mean", sigma: float = 3.0, chunk_rows: int = 128):
+        if method not in METHODS:
+            raise ValueError(f"Unknown averaging method {method}, expected one of {METHODS}")
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.n_frames = n_frames
+        self.method = method
+        self.sigma = sigma
+        self.chunk_rows = chunk_rows
+        self.count = 0
+
+        if method == "mean":
+            # 32 bits hold 65536 sums of 16 bit frames, wider inputs get a 64 bit sum
+            if self.dtype.kind in "ui":
+                sum_dtype = np.uint32 if self.dtype.itemsize <= 2 and n_frames <= 65536 else np.int64
+            else:
+                sum_dtype = np.float64
+            self._buffer = np.zeros(self.shape, dtype=sum_dtype)
+        else:
+            self._buffer = np.empty((n_frames,) + self.shape, dtype=self.dtype)
+
+    @property
+    def complete(self) -> bool:
+        return self.count >= self.n_frames
+
+    def add(self, frame: np.ndarray):
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match {self.shape}")
+        if self.complete:
+            raise ValueError("Accumulator already has all its frames")
+        if self.method == "mean":
+            np.add(self._buffer, frame, out=self._buffer, casting="unsafe")
+        else:
+            self._buffer[self.count] = frame
+        self.count += 1
+
+    def _to_native(self, values: np.ndarray) -> np.ndarray:
+        if self.dtype.kind in "ui":
+            info = np.iinfo(self.dtype)
+            return np.clip(np.rint(values), info.min, info.max).astype(self.dtype)
+        return values.astype(self.dtype)
+
+    def result(self) -> np.ndarray:
+        """ Reduced frame in the input dtype, from the frames added so far. """
+        if self.count == 0:
+            raise ValueError("No frames added")
+
+        if self.method == "mean":
+            if self._buffer.dtype.kind in "ui":
+                return ((self._buffer + self.count // 2) // self.count).astype(self.dtype)
+            return self._to_native(self._buffer / self.count)
+
+        stack = self._buffer[:self.count]
+        if self.method == "median":
+            return self._to_native(np.median(stack, axis=0))
+
+        # Sigma-clipped mean, by row blocks so the float temporaries stay small. The spread is the
+        # MAD scaled to a standard deviation: the plain std includes the outliers and would keep them.
+        # Integer frames get at least one count of spread, a MAD of 0 would reject plain read noise.
+        floor = 1.0 if self.dtype.kind in "ui" else 1e-6
+        out = np.empty(self.shape, dtype=self.dtype)
+        for r0 in range(0, self.shape[0], self.chunk_rows):
+            block = stack[:, r0:r0 + self.chunk_rows].astype(np.float32)
+            median = np.median(block, axis=0)
+            deviation = np.abs(block - median)
+            spread = np.maximum(1.4826 * np.median(deviation, axis=0), floor)
+            keep = deviation <= self.sigma * spread
+            counts = keep.sum(axis=0)
+            clipped = np.where(counts > 0, (block * keep).sum(axis=0) / np.maximum(counts, 1), median)
+            out[r0:r0 + self.chunk_rows] = self._to_native(clipped)
+        return out
+
+
+class AveragingReducer:
+    """ One FrameAccumulator per angle in flight, dropped once the angle is complete. """
+
+    def __init__(self, n_frames: int, method: str = "mean", sigma: float = 3.0):
+        self.n_frames = n_frames
+        self.method = method
+        self.sigma = sigma
+        self._pending = {}
+
+    def add(self, key, frame: np.ndarray):
+        """ Add a frame for `key`, returns the reduced frame when it was the last one, else None. """
+        accumulator = self._pending.get(key)
+        if accumulator is None:
+            accumulator = FrameAccumulator(frame.shape, frame.dtype, self.n_frames, self.method, self.sigma)
+            self._pending[key] = accumulator
+        accumulator.add(frame)
+        if accumulator.complete:
+            del self._pending[key]
+            return accumulator.result()
+        return None
+
+    def discard(self, key):
+        """ Drop whatever arrived for `key`, e.g. a position given up before all its frames were taken. """
+        self._pending.pop(key, None)
+
+    def flush(self, key):
+        """ Result for `key` from however many frames arrived, None if there were none. """
+        accumulator = self._pending.pop(key, None)
+        return accumulator.result() if accumulator is not None and accumulator.count else None
@@ -0,0 +1,113 @@
+"""
+Quality gate for projections, run in the scan loop right after each frame.
+
+A frame is checked on the crop region, every `step`-th pixel:
+
+    dark        99th percentile below `dark_level` of full scale
+    saturated   more than `max_saturated` of the pixels at full scale
+    blurred     Laplacian variance below `blur_ratio` x the median of the
+                frames accepted so far
+    duplicate   mean absolute difference to the previous angle's frame
+                below `min_difference` of its mean (stale buffer, motor
+                that didn't move)
+
+A failed frame is re-acquired at the same angle up to `max_reacquire`
+times. Metrics of every attempt go to frame_quality.csv next to the scan.
+"""
+import csv, os
+import numpy as np
+from preprocess import CROP_BOX, crop_array
+
+
+def laplacian_variance(image: np.ndarray) -> float:
+    """ Variance of the 4-neighbour Laplacian, a focus measure. """
+    lap = (image[1:-1, :-2] + image[1:-1, 2:] + image[:-2, 1:-1] + image[2:, 1:-1]) - 4.0 * image[1:-1, 1:-1]
+    return float(lap.var())
+
+
+def full_scale_of(dtype) -> float:
+    dtype = np.dtype(dtype)
+    return float(np.iinfo(dtype).max) if dtype.kind in "ui" else 1.0
+
+
+class QualityGate:
+    """ Checks frames against the thresholds and keeps the metrics of every attempt. """
+
+    def __init__(self, crop_box=CROP_BOX, step: int = 2, full_scale: float = None, dark_level: float = 0.02,
+                 max_saturated: float = 0.05, blur_ratio: float = 0.35, min_difference: float = 0.001,
+                 max_reacquire: int = 3):
+        self.crop_box = crop_box
+        self.step = step
+        self.full_scale = full_scale
+        self.dark_level = dark_level
+        self.max_saturated = max_saturated
+        self.blur_ratio = blur_ratio
+        self.min_difference = min_difference
+        self.max_reacquire = max_reacquire
+        self.previous = None        # Sampled frame of the last accepted angle
+        self.sharpness = []         # Of accepted frames, for the blur reference
+        self.rows = []
+
+    def _sample(self, frame: np.ndarray) -> np.ndarray:
+        if frame.ndim == 3:
+            frame = frame.mean(axis=2)
+        region = crop_array(frame, self.crop_box) if self.crop_box else frame
+        if region.size == 0:     # Frame smaller than the crop box
+            region = frame
+        return region[::self.step, ::self.step].astype(np.float32)
+
+    def metrics(self, frame: np.ndarray) -> dict:
+        sample = self._sample(frame)
+        full_scale = self.full_scale or full_scale_of(frame.dtype)
+        p1, p99 = np.percentile(sample, (1, 99))
+        mean = float(sample.mean())
+        metrics = {
+            "mean": mean / full_scale, "p1": float(p1) / full_scale, "p99": float(p99) / full_scale,
+            "saturated": float(np.count_nonzero(sample >= 0.995 * full_scale)) / sample.size,
+            "sharpness": laplacian_variance(sample),
+            "difference": None,
+        }
+        if self.previous is not None and self.previous.shape == sample.shape:
+            metrics["difference"] = float(np.abs(sample - self.previous).mean()) / max(mean, 1e-6)
+        return metrics, sample
+
+    def check(self, frame: np.ndarray, index: int, angle: float, filepath: str, attempt: int = 1):
+        """ (passed, reasons, sample). The sample goes to accept() if the frame is kept. """
+        metrics, sample = self.metrics(frame)
+        reasons = []
+        if metrics["p99"] < self.dark_level:
+            reasons.append("dark")
+        if metrics["saturated"] > self.max_saturated:
+            reasons.append("saturated")
+        if len(self.sharpness) >= 3 and metrics["sharpness"] < self.blur_ratio * float(np.median(self.sharpness)):
+            reasons.append("blurred")
+        if metrics["difference"] is not None and metrics["difference"] < self.min_difference:
+            reasons.append("duplicate")
+
+        self.rows.append({"index": index, "angle": angle, "file": os.path.basename(filepath), "attempt": attempt,
+                          **{k: (round(v, 6) if v is not None else "") for k, v in metrics.items()},
+                          "passed": not reasons, "reasons": " ".join(reasons)})
+        return not reasons, reasons, sample
+
+    def accept(self, sample: np.ndarray):
+        """ Frame kept for this angle: the reference for the next one. """
+        self.previous = sample
+        self.sharpness.append(self.rows[-1]["sharpness"])
+
+    def summary(self) -> str:
+        positions = {row["index"] for row in self.rows}
+        failed = [row for row in self.rows if not row["passed"]]
+        reasons = {}
+        for row in failed:
+            for reason in row["reasons"].split():
+                reasons[reason] = reasons.get(reason, 0) + 1
+        detail = ", ".join(f"{n} {reason}" for reason, n in sorted(reasons.items())) or "none"
+        return f"Quality gate: {len(self.rows)} checks over {len(positions)} positions, failed checks: {detail}"
+
+    def save(self, csv_path: str):
+        if not self.rows:
+            return
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(self.rows)
@@ -0,0 +1,111 @@
+"""
+In-memory frame streams from the camera, so projections never round-trip
+through TIFF files on the IOC side.
+
+PvaFrameStream subscribes to the NDPluginPva channel with p4p when it is
+installed, ImagePluginFrameStream falls back to the ImagePlugin ArrayData
+waveform monitor through ophyd.
+"""
+import queue, threading, time
+from collections import namedtuple
+import numpy as np
+
+try:
+    from p4p.client.thread import Context
+except ImportError:
+    Context = None
+
+Frame = namedtuple("Frame", ["array", "counter", "timestamp"])
+
+
+class FrameStream:
+    """ Queue of frames pushed by a monitor callback. """
+
+    def __init__(self, maxsize: int = 2000):
+        self._frames = queue.Queue(maxsize=maxsize)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _push(self, array: np.ndarray, timestamp: float):
+        with self._lock:
+            self._count += 1
+            counter = self._count
+        try:
+            self._frames.put_nowait(Frame(array, counter, timestamp))
+        except queue.Full:
+            print(f"--Frame queue full, dropping frame {counter}")
+
+    def mark(self) -> int:
+        """ Frame count right before a trigger. """
+        with self._lock:
+            return self._count
+
+    def next_frame(self, after: int = 0, timeout: float = 5.0) -> Frame:
+        """ First frame newer than `after`, raises TimeoutError when none arrives in time. """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Timed out waiting for a frame from the stream")
+            try:
+                frame = self._frames.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if frame.counter > after:
+                return frame
+
+    def close(self):
+        pass
+
+
+class PvaFrameStream(FrameStream):
+    """ Frames from the NDPluginPva NTNDArray channel, e.g. '13ARV1:Pva1:Image'. """
+
+    def __init__(self, pv_name: str, maxsize: int = 2000):
+        if Context is None:
+            raise ImportError("p4p is required for the PVA frame stream")
+        super().__init__(maxsize)
+        self._ctx = Context("pva")
+        self._sub = self._ctx.monitor(pv_name, self._on_update)
+
+    def _on_update(self, value):
+        if isinstance(value, Exception):   # Disconnects are delivered as exceptions
+            print(f"--PVA stream: {value}")
+            return
+        ts = getattr(value, "timestamp", None) or time.time()
+        self._push(np.asarray(value), ts)
+
+    def close(self):
+        self._sub.close()
+        self._ctx.close()
+
+
+class ImagePluginFrameStream(FrameStream):
+    """ Frames from the ImagePlugin ArrayData waveform, reshaped with the plugin's ArraySize. """
+
+    def __init__(self, image_plugin, maxsize: int = 2000):
+        super().__init__(maxsize)
+        self._plugin = image_plugin
+        self._shape = None
+        self._cid = image_plugin.array_data.subscribe(self._on_update, run=False)
+
+    def _on_update(self, value=None, timestamp=None, **kwargs):
+        if self._shape is None:
+            # ArraySize is (depth, height, width), depth is 0 for mono images
+            depth, height, width = self._plugin.array_size.get()
+            self._shape = (height, width, depth) if depth else (height, width)
+        array = np.asarray(value)
+        n = int(np.prod(self._shape))
+        self._push(array[:n].reshape(self._shape), timestamp or time.time())
+
+    def close(self):
+        self._plugin.array_data.unsubscribe(self._cid)
+
+
+def open_frame_stream(camera, pva_name: str = "13ARV1:Pva1:Image") -> FrameStream:
+    """ PVA stream when p4p is available, ImagePlugin array stream otherwise. """
+    if Context is not None:
+        print(f"Streaming frames from PVA channel {pva_name}")
+        return PvaFrameStream(pva_name)
+    print("p4p not installed, streaming frames from the ImagePlugin array")
+    return ImagePluginFrameStream(camera.image)
@@ -0,0 +1,211 @@
+"""
+Event-driven frame completion for the scan scripts.
+
+A frame is considered done when something reports it: a plugin counter
+(TIFF1:ArrayCounter / NumCaptured) moving past its value at trigger time,
+the detector busy signal dropping back to 0, or the file being closed in
+save_dir (inotify). Polling os.path.exists is only used when inotify is
+not available on the host.
+"""
+import csv, os, statistics, threading, time
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # Not installed, or not on Linux
+    INotify = None
+
+
+class SignalWatch:
+    """ Keeps the latest value of an ophyd signal up to date through its monitor. """
+
+    def __init__(self, signal):
+        self.signal = signal
+        self._cond = threading.Condition()
+        self._value = signal.get()
+        self._updates = 0
+        self._cid = signal.subscribe(self._on_value, run=False)
+
+    def _on_value(self, value=None, **kwargs):
+        with self._cond:
+            self._value = value
+            self._updates += 1
+            self._cond.notify_all()
+
+    def mark(self):
+        """ Returns (value, update sequence) to compare against after a trigger. """
+        with self._cond:
+            return self._value, self._updates
+
+    def wait_until(self, predicate, after: int = 0, timeout: float = 5.0) -> bool:
+        """ Wait for an update newer than `after` whose value satisfies predicate. """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not (self._updates > after and predicate(self._value)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        self.signal.unsubscribe(self._cid)
+
+
+class DirectoryWatch:
+    """ Waits for files to be closed in a directory, with polling as a fallback. """
+
+    def __init__(self, directory: str, poll_interval: float = 0.05):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._seen = set()
+        self._sizes = {}        # Polling mode: size of each file at the last poll
+        self._reported = set()
+        self._inotify = None
+        if INotify is not None:
+            try:
+                self._inotify = INotify()
+                self._inotify.add_watch(directory, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+            except OSError as e:
+                print(f"inotify unavailable for {directory} ({e}), falling back to polling")
+                self._inotify = None
+        # Closed before the watch started, so no event will ever come for these
+        self._existing = set(os.listdir(directory)) if self._inotify is not None else set()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._inotify is not None else "poll"
+
+    def _drain(self, timeout: float):
+        for event in self._inotify.read(timeout=int(timeout * 1000)):
+            self._seen.add(event.name)
+
+    def wait_for(self, filepath: str, timeout: float = 5.0) -> bool:
+        """
+        True once filepath has been written, False on timeout. With inotify
+        only its close or move into the directory counts: the file exists as
+        soon as the IOC opens it, long before the frame is complete.
+        """
+        name = os.path.basename(filepath)
+        deadline = time.monotonic() + timeout
+        if self._inotify is not None and name in self._existing and os.path.exists(filepath):
+            self._existing.discard(name)
+            return True
+        while True:
+            if name in self._seen or (self._inotify is None and os.path.exists(filepath)):
+                self._seen.discard(name)
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self._inotify is not None:
+                self._drain(min(remaining, 0.5))
+            else:
+                time.sleep(min(remaining, self.poll_interval))
+
+    def new_files(self, timeout: float = 0.5):
+        """
+        Names of files completed since the last call. In polling mode a file
+        counts as complete once its size is unchanged between two polls.
+        """
+        if self._inotify is not None:
+            self._drain(timeout)
+            names, self._seen = self._seen, set()
+            return sorted(names)
+
+        time.sleep(timeout)
+        sizes = {}
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                sizes[entry.name] = entry.stat().st_size
+        ready = [name for name, size in sizes.items()
+                 if name not in self._reported and self._sizes.get(name) == size]
+        self._sizes = sizes
+        self._reported.update(ready)
+        return sorted(ready)
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+
+
+class FrameWaiter:
+    """
+    Combines the available completion sources for one camera.
+
+    counter_signal: plugin counter that increments once per written frame
+    busy_signal: detector acquire-busy signal, 1 while acquiring and 0 when done
+    """
+
+    def __init__(self, save_dir: str, counter_signal=None, busy_signal=None):
+        self.counter = SignalWatch(counter_signal) if counter_signal is not None else None
+        self.busy = SignalWatch(busy_signal) if busy_signal is not None else None
+        self.files = DirectoryWatch(save_dir)
+
+    def arm(self):
+        """ Snapshot the completion sources right before triggering. """
+        return {
+            "t0": time.monotonic(),
+            "counter": self.counter.mark() if self.counter else None,
+            "busy": self.busy.mark() if self.busy else None,
+        }
+
+    def wait(self, token, filepath: str, timeout: float = 5.0) -> float:
+        """
+        Block until the frame armed by `token` is on disk.
+        Returns trigger-to-file latency in seconds, raises TimeoutError otherwise.
+        """
+        deadline = token["t0"] + timeout
+
+        if self.counter is not None:
+            count, seq = token["counter"]
+            if not self.counter.wait_until(lambda v: v is not None and count is not None and v > count,
+                                           after=seq, timeout=max(deadline - time.monotonic(), 0)):
+                print(f"--{self.counter.signal.name} did not move past {count}, waiting for {filepath} only")
+        elif self.busy is not None:
+            _, seq = token["busy"]
+            if not self.busy.wait_until(lambda v: v == 0, after=seq, timeout=max(deadline - time.monotonic(), 0)):
+                print(f"--{self.busy.signal.name} still busy, waiting for {filepath} only")
+
+        # The counters say the plugin is done, the file itself is the final word
+        if not self.files.wait_for(filepath, timeout=max(deadline - time.monotonic(), 0)):
+            raise TimeoutError(f"Timed out waiting for file: {filepath}")
+
+        return time.monotonic() - token["t0"]
+
+    def close(self):
+        for watch in (self.counter, self.busy, self.files):
+            if watch is not None:
+                watch.close()
+
+
+class LatencyLog:
+    """ Per-frame trigger-to-file latency, written as CSV next to the scan. """
+
+    def __init__(self, csv_path: str):
+        self.csv_path = csv_path
+        self.rows = []
+        self.t_start = time.monotonic()
+
+    def record(self, index: int, angle: float, filepath: str, attempt: int, latency: float):
+        self.rows.append({"index": index, "angle": angle, "file": os.path.basename(filepath),
+                          "attempt": attempt, "latency_s": round(latency, 4)})
+        print(f"  trigger→file latency {latency * 1000:.0f} ms")
+
+    def summary(self) -> str:
+        if not self.rows:
+            return "No frames recorded"
+        latencies = [row["latency_s"] for row in self.rows]
+        elapsed = time.monotonic() - self.t_start
+        return (f"{len(self.rows)} frames in {elapsed:.1f}s "
+                f"({len(self.rows) / elapsed * 60:.1f} frames/min), "
+                f"latency mean {statistics.mean(latencies) * 1000:.0f} ms, "
+                f"median {statistics.median(latencies) * 1000:.0f} ms, "
+                f"max {max(latencies) * 1000:.0f} ms")
+
+    def save(self):
+        if not self.rows:
+            return
+        with open(self.csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(self.rows)
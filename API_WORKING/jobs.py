@@ -0,0 +1,197 @@
+"""
+Background jobs for the API server.
+
+Scans and reconstructions run as subprocesses in bounded executors instead of
+inside the request. Their stdout is read line by line: progress events
+(see progress.py) update the job's progress and stage timings, everything
+else is kept as the job log. Events, status changes and (optionally) log
+lines are also numbered into a bounded event log that the streaming
+endpoints follow with wait_events(). Only the newest `keep_finished`
+finished jobs are kept.
+"""
+import os, subprocess, threading, time, uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import progress
+from progress import RECONSTRUCTION_STAGES
+
+FINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+@dataclass
+class Job:
+    kind: str
+    command: list
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "queued"          # queued, running, succeeded, failed, cancelled
+    created: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    returncode: int = None
+    progress: float = 0.0
+    stages: dict = field(default_factory=dict)
+    logs: deque = field(default_factory=lambda: deque(maxlen=5000))
+    process: subprocess.Popen = field(default=None, repr=False)
+    events: deque = field(default_factory=lambda: deque(maxlen=5000), repr=False)
+    _changed: threading.Condition = field(default_factory=threading.Condition, repr=False)
+    _seq: int = 0
+
+    def publish(self, event: dict):
+        """ Append to the event log with the next sequence number and wake the subscribers. """
+        with self._changed:
+            self._seq += 1
+            self.events.append({"seq": self._seq, "job": self.id, **event})
+            self._changed.notify_all()
+
+    def set_status(self, status: str):
+        self.status = status
+        self.publish({"event": "status", "status": status, "time": time.time(),
+                      "progress": round(self.progress, 4), "returncode": self.returncode})
+
+    def transition(self, status: str, allowed) -> bool:
+        """ set_status only from one of the `allowed` statuses, atomically with cancel(). """
+        with self._changed:
+            if self.status not in allowed:
+                return False
+            if status in FINAL_STATUSES:
+                self.finished = self.finished or time.time()
+            self.set_status(status)
+            return True
+
+    def attach(self, process: subprocess.Popen) -> bool:
+        """ Keep the job's process. False when the job was cancelled before it started: the caller stops it. """
+        with self._changed:
+            self.process = process
+            return self.status != "cancelled"
+
+    def wait_events(self, after: int = 0, timeout: float = 15.0) -> list:
+        """ Events with seq > after, waiting up to timeout for one; [] on timeout or when the job is over. """
+        with self._changed:
+            self._changed.wait_for(lambda: self._seq > after or self.status in FINAL_STATUSES, timeout)
+            return [event for event in self.events if event["seq"] > after]
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+    def handle_event(self, event: dict):
+        kind = event.get("event")
+        self._update(kind, event)
+        self.publish({**event, "progress": round(self.progress, 4)})
+
+    def _update(self, kind: str, event: dict):
+        if kind == "projection" and event.get("total"):
+            self.progress = (event["index"] + 1) / event["total"]
+        elif kind == "batch_job" and event.get("total"):
+            self.progress = event["done"] / event["total"]
+            self.stages[event["scan"]] = {"status": event["status"], "end": event["time"]}
+        elif kind == "stage_start":
+            self.stages[event["stage"]] = {"status": "running", "start": event["time"]}
+        elif kind in ("stage_end", "stage_failed"):
+            stage = self.stages.setdefault(event["stage"], {"start": event["time"]})
+            stage.update(end=event["time"], duration=event.get("duration"),
+                         status="failed" if kind == "stage_failed" else ("skipped" if event.get("skipped") else "done"))
+            if self.kind == "reconstruction":
+                done = sum(1 for s in self.stages.values() if s["status"] in ("done", "skipped"))
+                self.progress = min(done / RECONSTRUCTION_STAGES, 1.0)
+
+    def to_dict(self, log_tail: int = 0) -> dict:
+        info = {
+            "id": self.id, "kind": self.kind, "status": self.status, "command": self.command,
+            "created": self.created, "started": self.started, "finished": self.finished,
+            "returncode": self.returncode, "progress": round(self.progress, 4), "stages": self.stages,
+        }
+        if log_tail:
+            info["logs"] = list(self.logs)[-log_tail:]
+        return info
+
+
+class JobManager:
+    """
+    Runs jobs in one executor per kind. Scans share the motor and camera so
+    they default to one at a time, reconstructions of past scans run beside them.
+    """
+
+    def __init__(self, limits: dict, cwd: str = None, keep_finished: int = 200):
+        self.cwd = cwd
+        self.keep_finished = keep_finished
+        self._executors = {kind: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"{kind}-job")
+                           for kind, n in limits.items()}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, command: list) -> Job:
+        if kind not in self._executors:
+            raise ValueError(f"Unknown job kind {kind}")
+        job = Job(kind=kind, command=[str(c) for c in command])
+        job.set_status("queued")
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executors[kind].submit(self._run, job)
+        return job
+
+    def _run(self, job: Job):
+        job.started = time.time()
+        if not job.transition("running", ("queued",)):
+            return          # Cancelled while queued
+        try:
+            process = subprocess.Popen(job.command, cwd=self.cwd, stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT, text=True, bufsize=1)
+            if not job.attach(process):
+                # Cancelled between "running" and Popen, when cancel() had no process to stop
+                process.terminate()
+            for line in process.stdout:
+                line = line.rstrip("\n")
+                event = progress.parse(line)
+                if event is not None:
+                    job.handle_event(event)
+                else:
+                    job.logs.append(line)
+                    job.publish({"event": "log", "line": line, "time": time.time()})
+            job.returncode = process.wait()
+            if job.returncode == 0 and job.status == "running":
+                job.progress = 1.0
+            job.transition("succeeded" if job.returncode == 0 else "failed", ("running",))
+        except Exception as e:
+            job.logs.append(f"Error running job: {e}")
+            job.transition("failed", ("running",))
+        finally:
+            self._prune()
+
+    def _prune(self):
+        """ Forget the oldest finished jobs beyond keep_finished, with their logs and events. """
+        with self._lock:
+            finished = sorted((job for job in self._jobs.values() if job.done),
+                              key=lambda job: job.finished or job.created)
+            for job in finished[:max(len(finished) - self.keep_finished, 0)]:
+                del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, kind: str = None):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in jobs if kind is None or job.kind == kind]
+
+    def cancel(self, job_id: str) -> Job:
+        job = self.get(job_id)
+        if job is None or not job.transition("cancelled", ("queued", "running")):
+            return job
+        # No process yet: _run stops it as soon as it is attached
+        process = job.process
+        if process is not None and process.poll() is None:
+            process.terminate()
+        self._prune()
+        return job
+
+
+def limits_from_env() -> dict:
+    """ Concurrency per job kind, configurable with BOLT_MAX_SCANS / BOLT_MAX_RECONSTRUCTIONS / BOLT_MAX_BATCHES. """
+    return {
+        "scan": int(os.environ.get("BOLT_MAX_SCANS", 1)),
+        "reconstruction": int(os.environ.get("BOLT_MAX_RECONSTRUCTIONS", 2)),
+        "batch": int(os.environ.get("BOLT_MAX_BATCHES", 1)),
+    }
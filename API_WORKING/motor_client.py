@@ -0,0 +1,69 @@
+"""
+Long-lived Channel Access connection to the rotation stage.
+
+The server keeps one connected EpicsMotor for its whole lifetime instead of
+forking caget/caput per request. The readback is kept up to date by a CA
+monitor, so reading the angle is a memory read.
+"""
+import threading, time
+from functools import lru_cache
+
+MOTOR_PV = "DMC01:A"
+MOTOR_TO_DEGREES = 2.8125
+
+
+class MotorClient:
+    def __init__(self, pv: str = MOTOR_PV, connect_timeout: float = 5.0):
+        from ophyd import EpicsMotor
+
+        self.motor = EpicsMotor(pv, name="motor")
+        self.motor.wait_for_connection(timeout=connect_timeout)
+        self._lock = threading.Condition()
+        self._position = None
+        self._timestamp = None
+        self.motor.user_readback.subscribe(self._on_readback, run=True)
+
+    def _on_readback(self, value=None, timestamp=None, **kwargs):
+        with self._lock:
+            self._position = value
+            self._timestamp = timestamp
+            self._lock.notify_all()
+
+    @property
+    def position(self) -> float:
+        """ Last readback from the monitor, in motor units. """
+        with self._lock:
+            return self._position
+
+    @property
+    def angle(self) -> float:
+        return self.position * MOTOR_TO_DEGREES
+
+    def readback(self) -> dict:
+        with self._lock:
+            return {"position": self._position, "angle": self._position * MOTOR_TO_DEGREES,
+                    "timestamp": self._timestamp, "moving": bool(self.motor.moving)}
+
+    def move_to(self, position: float, wait: bool = True, timeout: float = 60.0) -> float:
+        """
+        Move to `position` (motor units), waiting for motion done unless
+        wait=False. Returns the readback after the move, the target when not waiting.
+        """
+        status = self.motor.set(position)
+        if not wait:
+            return position
+        status.wait(timeout)
+        return self.position
+
+    def move_by(self, delta: float, wait: bool = True, timeout: float = 60.0) -> float:
+        """ Move `delta` motor units from the current readback, see move_to(). """
+        return self.move_to(self.position + delta, wait=wait, timeout=timeout)
+
+
+@lru_cache(maxsize=None)
+def get_motor_client() -> MotorClient:
+    """ Connected on first use, then shared by every request. """
+    t0 = time.time()
+    client = MotorClient()
+    print(f"Connected to {MOTOR_PV} in {time.time() - t0:.2f}s")
+    return client
@@ -0,0 +1,204 @@
+"""
+Crop and encode projections in a worker pool, off the acquisition loop.
+
+Raw frames are decoded once, cropped and written as PNG (plus an optional
+cropped TIFF), either from memory (FrameEncoderPool) or as soon as the IOC
+closes them in raw_images/ (StreamingPreprocessor).
+
+Every PNG also gets 8-bit JPEG previews in <scan>/previews/<level>/, so
+the UI shows a projection without decoding the full frame.
+"""
+import os, threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from frame_wait import DirectoryWatch
+
+CROP_BOX = (800, 800, 1600, 1500)  # (left, upper, right, lower)
+PREVIEW_LEVELS = {"mid": 1200, "preview": 600}  # Level -> max width in px, largest first
+SCAN_FOLDERS = ("raw_images", "images", "images_png")
+
+
+def crop_array(frame: np.ndarray, crop_box=CROP_BOX) -> np.ndarray:
+    """ Same region as PIL's Image.crop(crop_box), without leaving NumPy. """
+    left, upper, right, lower = crop_box
+    return frame[upper:lower, left:right]
+
+
+def read_frame(path: str) -> np.ndarray:
+    """ Image file as an array at its native bit depth. """
+    with Image.open(path) as im:
+        return np.asarray(im)
+
+
+def preview_path(image_path: str, level: str = "preview") -> str:
+    """ <scan>/previews/<level>/<name>.jpg, for any projection of the scan (raw, cropped or PNG). """
+    folder = os.path.dirname(os.path.abspath(image_path))
+    if os.path.basename(folder) in SCAN_FOLDERS:
+        folder = os.path.dirname(folder)
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(folder, "previews", level, name + ".jpg")
+
+
+def _to_8bit(image: Image.Image) -> Image.Image:
+    if image.mode in ("L", "RGB"):
+        return image
+    values = np.asarray(image, dtype=np.float32)
+    lo, hi = np.percentile(values, (0.5, 99.5))     # Stretch to the frame's own range
+    scaled = (values - lo) * (255.0 / max(hi - lo, 1.0))
+    return Image.fromarray(np.clip(scaled, 0, 255).astype(np.uint8))
+
+
+def write_previews(image, image_path: str, levels=PREVIEW_LEVELS, quality: int = 85):
+    """
+    JPEG previews of an already decoded image (PIL image or array), each level
+    downsampled from the previous one. Images narrower than a level are
+    stored at their own size. Returns the written paths.
+    """
+    level_image = _to_8bit(image if isinstance(image, Image.Image) else Image.fromarray(np.ascontiguousarray(image)))
+    written = []
+    for level, width in sorted(levels.items(), key=lambda item: -item[1]):
+        if level_image.width > width:
+            height = max(1, round(level_image.height * width / level_image.width))
+            level_image = level_image.resize((width, height), Image.BILINEAR, reducing_gap=2.0)
+        out_path = preview_path(image_path, level)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        tmp_path = out_path + ".part"
+        level_image.save(tmp_path, format="JPEG", quality=quality)
+        os.replace(tmp_path, out_path)
+        written.append(out_path)
+    return written
+
+
+def best_preview(image_path: str, level: str = "preview") -> str:
+    """ The preview of image_path when it exists, else image_path itself. """
+    path = preview_path(image_path, level)
+    return path if os.path.exists(path) else image_path
+
+
+def encode_frame(frame: np.ndarray, out_path: str, crop_box=CROP_BOX, previews: bool = False) -> str:
+    """ Crop an in-memory frame and write it in the format given by out_path's extension. """
+    cropped = crop_array(frame, crop_box) if crop_box else frame
+    fmt = Image.registered_extensions()[os.path.splitext(out_path)[1].lower()]
+    tmp_path = out_path + ".part"
+    image = Image.fromarray(np.ascontiguousarray(cropped))
+    image.save(tmp_path, format=fmt)
+    os.replace(tmp_path, out_path)  # Readers never see a half written file
+    if previews:
+        write_previews(image, out_path)
+    return out_path
+
+
+class FrameEncoderPool:
+    """ Process pool that crops and encodes in-memory frames into output_dir. """
+
+    def __init__(self, output_dir: str, crop_box=CROP_BOX, workers: int = None):
+        self.output_dir = output_dir
+        self.crop_box = crop_box
+        self.futures = []
+        os.makedirs(output_dir, exist_ok=True)
+        self._pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+
+    def submit(self, frame: np.ndarray, filename: str):
+        future = self._pool.submit(encode_frame, frame, os.path.join(self.output_dir, filename), self.crop_box, True)
+        self.futures.append(future)
+        return future
+
+    def close(self):
+        """ Wait for all pending frames, returns the written paths. """
+        written = []
+        for future in self.futures:
+            try:
+                written.append(future.result())
+            except Exception as e:
+                print(f"--Failed to encode frame: {e}")
+        self._pool.shutdown()
+        return written
+
+
+def preprocess_file(src_path: str, png_path: str, crop_box=CROP_BOX, cropped_tiff_path: str = None,
+                    previews: bool = True) -> str:
+    """ One decode of a raw TIFF, cropped and written as PNG (and cropped TIFF if asked) plus its previews. """
+    with Image.open(src_path) as im:
+        cropped = im.crop(crop_box) if crop_box else im.copy()
+    for out_path, fmt in ((png_path, "PNG"), (cropped_tiff_path, "TIFF")):
+        if out_path:
+            tmp_path = out_path + ".part"
+            cropped.save(tmp_path, format=fmt)
+            os.replace(tmp_path, out_path)
+    if previews:
+        write_previews(cropped, png_path)
+    return png_path
+
+
+def _is_raw_frame(filename: str) -> bool:
+    return filename.lower().endswith((".tiff", ".tif"))
+
+
+class StreamingPreprocessor:
+    """
+    Watches raw_dir and crops/encodes every frame as soon as it is closed,
+    across a process pool sized to the host. stop() processes whatever is
+    left and waits, so preprocessing finishes together with the scan.
+    """
+
+    def __init__(self, raw_dir: str, png_dir: str, cropped_dir: str = None, crop_box=CROP_BOX, workers: int = None):
+        self.raw_dir = raw_dir
+        self.png_dir = png_dir
+        self.cropped_dir = cropped_dir
+        self.crop_box = crop_box
+        self.futures = {}
+        for path in (png_dir, cropped_dir):
+            if path:
+                os.makedirs(path, exist_ok=True)
+        self._watch = DirectoryWatch(raw_dir)
+        self._pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        print(f"Preprocessing {self.raw_dir} → {self.png_dir} ({self._watch.mode} watch)")
+        self._thread.start()
+        return self
+
+    def submit(self, filename: str):
+        if not _is_raw_frame(filename) or filename in self.futures:
+            return
+        stem = os.path.splitext(filename)[0]
+        self.futures[filename] = self._pool.submit(
+            preprocess_file,
+            os.path.join(self.raw_dir, filename),
+            os.path.join(self.png_dir, stem + ".png"),
+            self.crop_box,
+            os.path.join(self.cropped_dir, filename) if self.cropped_dir else None,
+        )
+
+    def _run(self):
+        while not self._stop.is_set():
+            for filename in self._watch.new_files(timeout=0.2):
+                self.submit(filename)
+
+    def stop(self):
+        """ Pick up frames the watch has not reported yet, then wait for the pool. """
+        self._stop.set()
+        if self._thread.ident is not None:
+            self._thread.join()
+        self._watch.close()
+        for filename in sorted(os.listdir(self.raw_dir)):
+            self.submit(filename)
+
+        written = []
+        for filename, future in self.futures.items():
+            try:
+                written.append(future.result())
+            except Exception as e:
+                print(f"--Failed to preprocess {filename}: {e}")
+        self._pool.shutdown()
+        print(f"✓ Preprocessed {len(written)} frames into {self.png_dir}")
+        return written
+
+
+def preprocess_directory(raw_dir: str, png_dir: str, cropped_dir: str = None, crop_box=CROP_BOX, workers: int = None):
+    """ Crop and encode every frame already in raw_dir, in parallel. """
+    preprocessor = StreamingPreprocessor(raw_dir, png_dir, cropped_dir, crop_box, workers)
+    return preprocessor.stop()
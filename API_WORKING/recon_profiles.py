@@ -0,0 +1,125 @@
+"""
+Reconstruction quality profiles.
+
+A profile sets, per stage, the image sizes, feature counts and OpenMVS
+resolution options, and sizes the thread count to the host: all usable
+cores for COLMAP, and for the OpenMVS stages no more threads than the
+host's memory can hold at that resolution.
+
+    fast      quick look, about a quarter of the pixels and fewer views
+    balanced  mostly COLMAP/OpenMVS defaults, undistorted images capped at 2000 px
+    high      full resolution everywhere, more features and views
+"""
+import os
+
+PROFILE_NAMES = ("fast", "balanced", "high")
+DEFAULT_PROFILE = "balanced"
+
+# Extra command line options per stage. The thread flags come from ReconstructionProfile.thread_args().
+PROFILES = {
+    "fast": {
+        "feature_extraction": ["--SiftExtraction.max_image_size", "1000", "--SiftExtraction.max_num_features", "2048"],
+        "feature_matching": ["--SiftMatching.max_num_matches", "8192"],
+        "mapper": ["--Mapper.ba_global_max_num_iterations", "20", "--Mapper.ba_local_max_num_iterations", "10"],
+        "image_undistorter": ["--max_image_size", "1000"],
+        "DensifyPointCloud": ["--resolution-level", "2", "--max-resolution", "1024", "--number-views", "3"],
+        "ReconstructMesh": ["--decimate", "0.5"],
+        "TextureMesh": ["--resolution-level", "2"],
+        "gb_per_thread": 0.5,
+        "texture_lod": "low",
+    },
+    "balanced": {
+        "feature_extraction": [],
+        "feature_matching": [],
+        "mapper": [],
+        "image_undistorter": ["--max_image_size", "2000"],
+        "DensifyPointCloud": ["--resolution-level", "1", "--max-resolution", "2560", "--number-views", "5"],
+        "ReconstructMesh": [],
+        "TextureMesh": ["--resolution-level", "1"],
+        "gb_per_thread": 1.0,
+        "texture_lod": "mid",
+    },
+    "high": {
+        "feature_extraction": ["--SiftExtraction.max_image_size", "4096", "--SiftExtraction.max_num_features", "16384",
+                               "--SiftExtraction.estimate_affine_shape", "1"],
+        "feature_matching": ["--SiftMatching.max_num_matches", "65536", "--SiftMatching.guided_matching", "1"],
+        "mapper": [],
+        "image_undistorter": [],
+        "DensifyPointCloud": ["--resolution-level", "0", "--max-resolution", "8192", "--number-views", "8"],
+        "ReconstructMesh": [],
+        "TextureMesh": ["--resolution-level", "0"],
+        "gb_per_thread": 2.0,
+        "texture_lod": "full",
+    },
+}
+
+THREAD_FLAGS = {
+    "feature_extraction": "--SiftExtraction.num_threads",
+    "feature_matching": "--SiftMatching.num_threads",
+    "mapper": "--Mapper.num_threads",
+    "DensifyPointCloud": "--max-threads",
+    "ReconstructMesh": "--max-threads",
+    "TextureMesh": "--max-threads",
+}
+MEMORY_BOUND_STAGES = ("DensifyPointCloud", "ReconstructMesh", "TextureMesh")
+
+
+def available_cores() -> int:
+    """ Cores this process may run on (CPU affinity / cgroup cpusets), not just the host total. """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def total_memory_gb() -> float:
+    """
+    Physical memory. Not MemAvailable, so the dense stages get the same
+    thread count from one run to the next whatever else is running.
+    """
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1024 ** 3)
+    except (ValueError, OSError, AttributeError):
+        return 8.0
+
+
+class ReconstructionProfile:
+    """ Stage options of one profile, resolved for this host. """
+
+    def __init__(self, name: str = DEFAULT_PROFILE, threads: int = None, cores: int = None, memory_gb: float = None):
+        if name not in PROFILES:
+            raise ValueError(f"Unknown reconstruction profile {name}, expected one of {PROFILE_NAMES}")
+        self.name = name
+        self.texture_lod = PROFILES[name]["texture_lod"]      # Mesh level TextureMesh works on, see mesh_lod.py
+        self.cores = cores or available_cores()
+        self.memory_gb = memory_gb or total_memory_gb()
+        self.threads = threads or self.cores
+        # Dense stages hold image pyramids per thread, leave them room
+        self.memory_threads = max(1, min(self.threads, int(self.memory_gb / PROFILES[name]["gb_per_thread"])))
+
+    def threads_for(self, stage: str) -> int:
+        return self.memory_threads if stage in MEMORY_BOUND_STAGES else self.threads
+
+    def args(self, stage: str, threads: bool = True) -> list:
+        """
+        Extra command line options for `stage`, with the thread count unless
+        threads=False. The stage cache keys on the options without it: the
+        result doesn't depend on how many threads computed it.
+        """
+        args = list(PROFILES[self.name].get(stage, []))
+        if threads:
+            args += self.thread_args(stage)
+        return args
+
+    def thread_args(self, stage: str) -> list:
+        if stage not in THREAD_FLAGS:
+            return []
+        return [THREAD_FLAGS[stage], str(self.threads_for(stage))]
+
+    def describe(self) -> str:
+        return (f"Profile {self.name}: {self.threads} threads ({self.cores} cores), "
+                f"{self.memory_threads} for the dense stages ({self.memory_gb:.1f} GB memory)")
+
+
+def resolve_profile(name: str = None, threads: int = None) -> ReconstructionProfile:
+    return ReconstructionProfile(name or DEFAULT_PROFILE, threads)
@@ -11,8 +11,21 @@ import numpy as np
 from datetime import datetime
 from pathlib import Path
 from PIL import Image
-import time, sys, os, subprocess
+import time, sys, os, subprocess, argparse
 from collections import defaultdict
+from frame_wait import FrameWaiter, LatencyLog
+import progress
+from fly_scan import fly_scan
+from frame_stream import open_frame_stream
+from preprocess import FrameEncoderPool, StreamingPreprocessor, preprocess_directory, encode_frame, read_frame
+from frame_averaging import AveragingReducer, METHODS as AVERAGING_METHODS
+from scan_container import ScanWriter, container_path, pack_directory
+from resource_pool import DetectorLock
+from scan_catalog import record, record_scan
+from scan_angles import build_angle_index
+from progressive_recon import QuickLook
+from frame_quality import QualityGate
+from adaptive_sampling import AdaptivePlanner
 class PvaPlugin(PluginBase):
     _suffix = 'Pva1:'
     _plugin_type = 'NDPluginPva'
@@ -69,7 +82,85 @@ def wait_for_file(filepath, timeout=5.0, poll_interval=0.1):
             raise TimeoutError(f"Timed out waiting for file: {filepath}")
         time.sleep(poll_interval)
 
-def scan_with_saves(start_pos, end_pos, num_points):
+def read_settled_frame(filepath, timeout=5.0, poll_interval=0.1):
+    """
+    Plan stub returning the frame at filepath once its size held still
+    between two polls and it decodes, None on timeout. A wait that only saw
+    the file exist may leave the IOC still writing it.
+    """
+    deadline = time.monotonic() + timeout
+    size, error = None, None
+    while time.monotonic() < deadline:
+        current = os.path.getsize(filepath) if os.path.exists(filepath) else None
+        if current is not None and current == size:
+            try:
+                return read_frame(filepath)
+            except (OSError, SyntaxError, ValueError) as e:     # PIL's errors for a truncated file
+                error = e
+        size = current
+        yield from bps.sleep(poll_interval)
+    print(f"--Could not read {filepath}: {error or 'still being written'}")
+    return None
+
+def capture_with_retries(acquire_signal, waiter, filepath, max_retries=50):
+    """
+    Trigger until filepath is saved. Returns (latency, attempt), or None when
+    every attempt timed out. waiter=None keeps the fixed sleep + wait_for_file.
+    """
+    for attempt in range(1, max_retries + 1):
+
+        try:
+            print(f"[Attempt {attempt}] Capturing → {filepath}")
+            if waiter is not None:
+                token = waiter.arm()
+                yield from bps.mv(acquire_signal, 1)  # Triggers a single image
+                latency = waiter.wait(token, filepath, timeout=5.0)
+            else:
+                t0 = time.monotonic()
+                yield from bps.mv(acquire_signal, 1)  # Triggers a single image
+                yield from bps.sleep(1)
+
+                # Wait for file to appear
+                wait_for_file(filepath, timeout=5.0)
+                latency = time.monotonic() - t0
+
+            print(f"✓ Image saved at {filepath}")
+            return latency, attempt
+
+        except TimeoutError:
+            print(f"--Timeout waiting for image at {filepath}")
+            if attempt < max_retries:
+                print("↻ Retrying acquisition...")
+                yield from bps.mv(acquire_signal, 0)  # Triggers a single image
+                yield from bps.sleep(0.5)
+
+    print(f"--Failed after {max_retries} attempts")
+    return None
+
+def scan_with_saves(start_pos, end_pos, num_points, wait_mode="event", settle_time=2.0,
+                    frames_per_position=1, average="mean", container=None, gate=None, planner=None):
+    """
+    Step scan that saves one TIFF per position.
+
+    wait_mode "event" finishes a frame as soon as the TIFF plugin counter,
+    the detector busy signal or the file watch reports it. "poll" keeps the
+    old fixed sleep followed by wait_for_file.
+
+    With frames_per_position > 1 the shots land in raw_images/frames/, are
+    reduced with `average` (mean, median or sigma_clip) as they arrive and
+    deleted, and only the averaged TIFF is written to raw_images/.
+
+    container is an optional ScanWriter that also receives every projection
+    with its angle, motor readback, timestamp and exposure.
+
+    gate is an optional QualityGate: every shot is checked before it is kept
+    and re-acquired when it fails. Shots are then staged in raw_images/frames/
+    as well and only moved to raw_images/ once they pass, so the preprocessor
+    and COLMAP never see a rejected frame.
+
+    planner is an optional AdaptivePlanner that replaces the uniform positions
+    and gets every kept projection back to choose the next ones.
+    """
     #Requirements for image capturing
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     callbacks_signal = EpicsSignal('13ARV1:image1:EnableCallbacks', name='callbacks_signal')
@@ -77,7 +168,7 @@ def scan_with_saves(start_pos, end_pos, num_points):
 
     yield from bps.mv(callbacks_signal, 0)
     max_retries = 50
-    positions = np.linspace(start_pos, end_pos, num_points)
+    positions = planner if planner is not None else np.linspace(start_pos, end_pos, num_points)
     yield from bps.open_run()
     camera.cam.array_callbacks.put(0, wait=True)
 
@@ -86,103 +177,342 @@ def scan_with_saves(start_pos, end_pos, num_points):
 
     current_number = camera.tiff.file_number.get()
 
-    NUM_IMAGES_PER_POS = 20
+    reducer = AveragingReducer(frames_per_position, average) if frames_per_position > 1 else None
+    frames_dir = save_dir
+    if reducer is not None or gate is not None:
+        # Single shots go to a subfolder, so the preprocessor only sees averaged or checked frames
+        frames_dir = os.path.join(save_dir, "frames", "")
+        os.makedirs(frames_dir, exist_ok=True)
+        camera.tiff.file_path.put(frames_dir)
+
+    waiter = FrameWaiter(frames_dir, counter_signal=camera.tiff.array_counter) if wait_mode == "event" else None
+    latency_log = LatencyLog(os.path.join(base_path, "acquisition_log.csv"))
 
     for i, pos in enumerate(positions):
         print(f"\nMoving to pos={pos}")
         yield from bps.mv(motor, pos)
-        yield from bps.sleep(2.0) 
+        progress.emit("motor", position=pos, angle=pos * 2.8125)
+        yield from bps.sleep(settle_time)
         yield from bps.mv(acquire_signal, 0)  # Triggers a single image
 
-        #for img_idx in range(NUM_IMAGES_PER_POS):
         filename = f'scan_{timestamp}_pos_{i}_shot_angle_{pos * 2.8125}'           
         current_number += 1
         filepath = os.path.join(save_dir, f"{filename}_{current_number}.tiff")
-
-        yield from bps.mv(camera.tiff.file_name, filename)
-        yield from bps.mv(camera.tiff.file_number, current_number)
-
-        for attempt in range(1, max_retries + 1):
-
-            try:
-                print(f"[Attempt {attempt}] Capturing → {filepath}")
-                yield from bps.mv(acquire_signal, 1)  # Triggers a single image
-                yield from bps.sleep(1)
-
-                # Wait for file to appear
-                wait_for_file(filepath, timeout=5.0)
-
-                print(f"✓ Image saved at {filepath}")
-                break  # Exit retry loop if successful
-
-            except TimeoutError:
-                print(f"--Timeout waiting for image at {filepath}")
-                if attempt == max_retries:
-                    print(f"--Failed after {max_retries} attempts, skipping position {pos}")
+        kept = None
+
+        for shot in range(frames_per_position):
+            shot_name = filename if reducer is None else f"{filename}_frame{shot}"
+            shot_path = os.path.join(frames_dir, f"{shot_name}_{current_number}.tiff")
+
+            frame, passed = None, True
+            for check in range(1, (gate.max_reacquire + 2) if gate is not None else 2):
+                yield from bps.mv(camera.tiff.file_name, shot_name)
+                yield from bps.mv(camera.tiff.file_number, current_number)
+
+                captured = yield from capture_with_retries(acquire_signal, waiter, shot_path, max_retries)
+                if captured is None:
+                    break
+                latency, attempt = captured
+                latency_log.record(i, pos * 2.8125, shot_path, attempt, latency)
+                if gate is None:
+                    break
+
+                frame = yield from read_settled_frame(shot_path)
+                if frame is None:
+                    # Counted as a failed check, so the shot is re-acquired like any other
+                    passed, reasons = False, ["unreadable"]
                 else:
-                    print("↻ Retrying acquisition...")
-                    yield from bps.mv(acquire_signal, 0)  # Triggers a single image
-                    yield from bps.sleep(0.5)
+                    passed, reasons, sample = gate.check(frame, i, pos * 2.8125, shot_path, check)
+                if passed:
+                    break
+                progress.emit("quality_reject", index=i, angle=pos * 2.8125, attempt=check, reasons=reasons)
+                if check <= gate.max_reacquire:
+                    print(f"↻ Frame {', '.join(reasons)}, re-acquiring at {pos * 2.8125:.2f}°")
+                    if os.path.exists(shot_path):
+                        os.remove(shot_path)    # So the next capture waits for a new file
+                    yield from bps.mv(acquire_signal, 0)
+
+            if captured is None:
+                print(f"--Skipping position {pos}")
+                break
+            if not passed:
+                # Kept aside for inspection, never handed to preprocessing
+                rejected_dir = os.path.join(save_dir, "rejected")
+                os.makedirs(rejected_dir, exist_ok=True)
+                if os.path.exists(shot_path):
+                    os.replace(shot_path, os.path.join(rejected_dir, os.path.basename(shot_path)))
+                print(f"--Frame still {', '.join(reasons)} after {gate.max_reacquire} re-acquisitions, skipping position {pos}")
+                break
+            if gate is not None and shot == frames_per_position - 1:
+                gate.accept(sample)
+
+            # Read here only when the container or planner need the frame and the gate hasn't read it
+            if frame is None and (reducer is not None or container is not None or planner is not None):
+                frame = yield from read_settled_frame(shot_path)
+                if frame is None:
+                    print(f"--Skipping position {pos}")
+                    break
+
+            averaged = None
+            if reducer is not None:
+                averaged = reducer.add(i, frame)
+                os.remove(shot_path)
+                if averaged is not None:
+                    encode_frame(averaged, filepath, crop_box=None)
+                    print(f"✓ {average} of {frames_per_position} frames saved at {filepath}")
+            elif gate is not None:
+                # Checked shot goes to raw_images/, the move is what the preprocessor picks up
+                os.replace(shot_path, filepath)
+            kept = averaged if averaged is not None else frame
+
+            if container is not None and (reducer is None or averaged is not None):
+                projection = averaged if averaged is not None else frame
+                container.append(projection, pos * 2.8125, filepath,
+                                 motor_readback=motor.user_readback.get(), timestamp=time.time(),
+                                 exposure=camera.cam.acquire_time.get())
+
+        if reducer is not None:
+            reducer.discard(i)  # A position given up keeps none of its frames
+
+        if os.path.exists(filepath):
+            progress.emit("projection", index=i, total=num_points, angle=pos * 2.8125, file=filepath)
+            record(os.path.basename(base_path), filepath, "raw", pos * 2.8125)
+        if planner is not None:
+            planner.add(pos, kept if os.path.exists(filepath) else None)
     
+    if waiter is not None:
+        waiter.close()
+    if reducer is not None or gate is not None:
+        camera.tiff.file_path.put(save_dir)
+    latency_log.save()
+    print(f"\n{latency_log.summary()}")
+    if gate is not None:
+        gate.save(os.path.join(base_path, "frame_quality.csv"))
+        print(gate.summary())
+
     print("\n--- Unstaging camera ---")
     yield from bps.unstage(camera)
 
     yield from bps.mv(motor, 0.0)
     yield from bps.close_run()
 
-def cropImages(inputDir):
-    crop_box = (800, 800, 1600, 1500)
-    output_dir = inputDir.replace('raw_images/', 'images/')
+def scan_streaming(start_pos, end_pos, num_points, output_dir, settle_time=2.0,
+                   frames_per_position=1, average="mean", container=None, gate=None, planner=None):
+    """
+    Step scan that takes frames from the PVA/ImagePlugin stream instead of TIFF files.
+    Frames are cropped and encoded in a worker pool and only the PNG is written.
+    With frames_per_position > 1 the frames of each position are averaged in memory.
+    gate (QualityGate) checks every frame in memory and re-acquires failed ones.
+    planner (AdaptivePlanner) replaces the uniform positions, as in scan_with_saves.
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    callbacks_signal = EpicsSignal('13ARV1:image1:EnableCallbacks', name='callbacks_signal')
+    acquire_signal = EpicsSignal('13ARV1:cam1:Acquire', name='acquire_signal')
 
-    os.makedirs(output_dir, exist_ok=True)
+    # Arrays go to the stream plugins only, the TIFF plugin stays idle
+    camera.stage_sigs[camera.tiff.enable] = 0
+    camera.stage_sigs[camera.tiff.auto_save] = 0
+    camera.stage_sigs[camera.pva.array_callbacks] = 1
+
+    yield from bps.mv(callbacks_signal, 1)
+    max_retries = 50
+    positions = planner if planner is not None else np.linspace(start_pos, end_pos, num_points)
+    yield from bps.open_run()
+    camera.cam.array_callbacks.put(1, wait=True)
+
+    print("\n--- Staging camera ---")
+    yield from bps.stage(camera)
 
-    for filename in os.listdir(inputDir):
-        if filename.endswith('.tiff'):
-            image_path = os.path.join(inputDir, filename)
-            img = Image.open(image_path)
-            cropped = img.crop(crop_box)
-            cropped.save(os.path.join(output_dir, filename))
+    stream = open_frame_stream(camera)
+    encoder = FrameEncoderPool(output_dir)
+    reducer = AveragingReducer(frames_per_position, average) if frames_per_position > 1 else None
+    latency_log = LatencyLog(os.path.join(base_path, "acquisition_log.csv"))
 
-def convert_image_format(image_dir: str, output_image_dir: str):
-    os.makedirs(output_image_dir, exist_ok=True)
+    for i, pos in enumerate(positions):
+        print(f"\nMoving to pos={pos}")
+        yield from bps.mv(motor, pos)
+        progress.emit("motor", position=pos, angle=pos * 2.8125)
+        yield from bps.sleep(settle_time)
+        yield from bps.mv(acquire_signal, 0)
+
+        filename = f'scan_{timestamp}_pos_{i}_shot_angle_{pos * 2.8125}'
+        kept = None
+
+        for shot in range(frames_per_position):
+            passed = True
+            for check in range(1, (gate.max_reacquire + 2) if gate is not None else 2):
+                frame = None
+                for attempt in range(1, max_retries + 1):
+                    try:
+                        print(f"[Attempt {attempt}] Capturing {filename} frame {shot}")
+                        t0 = time.monotonic()
+                        after = stream.mark()
+                        yield from bps.mv(acquire_signal, 1)  # Triggers a single image
+                        frame = stream.next_frame(after=after, timeout=5.0)
+                        print(f"✓ Frame {frame.counter} received, shape {frame.array.shape}")
+                        latency_log.record(i, pos * 2.8125, f"{filename}_{frame.counter}.png", attempt, time.monotonic() - t0)
+                        break
+
+                    except TimeoutError:
+                        print(f"--Timeout waiting for frame at pos {pos}")
+                        if attempt == max_retries:
+                            print(f"--Failed after {max_retries} attempts, skipping position {pos}")
+                        else:
+                            print("↻ Retrying acquisition...")
+                            yield from bps.mv(acquire_signal, 0)
+                            yield from bps.sleep(0.5)
+                if frame is None or gate is None:
+                    break
+
+                passed, reasons, sample = gate.check(frame.array, i, pos * 2.8125, f"{filename}_{frame.counter}.png", check)
+                if passed:
+                    break
+                progress.emit("quality_reject", index=i, angle=pos * 2.8125, attempt=check, reasons=reasons)
+                if check <= gate.max_reacquire:
+                    print(f"↻ Frame {', '.join(reasons)}, re-acquiring at {pos * 2.8125:.2f}°")
+                    yield from bps.mv(acquire_signal, 0)
+            if frame is None:
+                break
+            if not passed:
+                print(f"--Frame still {', '.join(reasons)} after {gate.max_reacquire} re-acquisitions, skipping position {pos}")
+                break
+            if gate is not None and shot == frames_per_position - 1:
+                gate.accept(sample)
+
+            # Averaged in memory, only the reduced frame goes to the encoder
+            result = reducer.add(i, frame.array) if reducer is not None else frame.array
+            if result is not None:
+                kept = result
+                encoder.submit(result, f"{filename}_{frame.counter}.png")
+                if container is not None:
+                    container.append(result, pos * 2.8125, f"{filename}_{frame.counter}",
+                                     motor_readback=motor.user_readback.get(), timestamp=frame.timestamp,
+                                     exposure=camera.cam.acquire_time.get())
+                progress.emit("projection", index=i, total=num_points, angle=pos * 2.8125,
+                              file=os.path.join(output_dir, f"{filename}_{frame.counter}.png"))
+
+        if reducer is not None:
+            reducer.discard(i)
+        if planner is not None:
+            planner.add(pos, kept)
+
+    stream.close()
+    written = encoder.close()
+    latency_log.save()
+    print(f"\n{latency_log.summary()}, {len(written)} frames encoded to {output_dir}")
+    if gate is not None:
+        gate.save(os.path.join(base_path, "frame_quality.csv"))
+        print(gate.summary())
 
-    for filename in os.listdir(image_dir):
-        if filename.lower().endswith(".tiff") or filename.lower().endswith(".tif"):
-            tiff_path = os.path.join(image_dir, filename)
-            png_filename = os.path.splitext(filename)[0] + ".png"
-            png_path = os.path.join(output_image_dir, png_filename)
+    print("\n--- Unstaging camera ---")
+    yield from bps.unstage(camera)
 
-            with Image.open(tiff_path) as im:
-                im.save(png_path, format="PNG")
+    yield from bps.mv(motor, 0.0)
+    yield from bps.close_run()
 
 if __name__ == "__main__":
     # Run scan
+    args, container, quicklook, planner, detector = None, None, None, None, None
     try:
         print("Starting script")
+        parser = argparse.ArgumentParser(description="Tomography scan with saved projections")
+        parser.add_argument("start_pos", type=float)
+        parser.add_argument("end_pos", type=float)
+        parser.add_argument("num_points", type=int)
+        parser.add_argument("save_name")
+        parser.add_argument("--wait-mode", choices=["event", "poll"], default="event",
+                            help="event: finish frames on plugin/file callbacks, poll: fixed sleep + file polling")
+        parser.add_argument("--settle-time", type=float, default=2.0, help="seconds to wait after each move")
+        parser.add_argument("--frames-per-position", type=int, default=1,
+                            help="frames taken and averaged at every angle")
+        parser.add_argument("--average", choices=AVERAGING_METHODS, default="mean",
+                            help="how the frames of one angle are combined")
+        parser.add_argument("--stream", action="store_true",
+                            help="take frames from the PVA/ImagePlugin stream and write only the cropped PNGs")
+        parser.add_argument("--container", choices=["gzip", "lzf", "none"], default=None,
+                            help="also save the scan as one HDF5 container (scan.h5), none = uncompressed and mmap-able")
+        parser.add_argument("--quality-gate", action=argparse.BooleanOptionalAction, default=False,
+                            help="check every frame (dark, saturated, blurred, duplicate) and re-acquire failures")
+        parser.add_argument("--max-reacquire", type=int, default=3, help="re-acquisitions of a frame that fails the gate")
+        parser.add_argument("--full-scale", type=float, default=None,
+                            help="detector full scale for the gate (default: range of the frame dtype, e.g. 4095 for 12 bit)")
+        parser.add_argument("--adaptive", type=int, metavar="COARSE", default=None,
+                            help="uniform pass of COARSE positions, the rest of num_points bisects the angles that change most")
+        parser.add_argument("--adaptive-noise", type=float, default=0.01,
+                            help="frame change that is only noise, such intervals are never bisected")
+        parser.add_argument("--quicklook", type=int, metavar="STRIDE", default=None,
+                            help="sparse quick-look reconstruction from every STRIDEth projection while scanning")
+        parser.add_argument("--fly", action="store_true", help="continuous rotation instead of step-and-shoot")
+        parser.add_argument("--velocity", type=float, default=1.0, help="fly scan motor velocity (motor units/s)")
+        parser.add_argument("--frame-period", type=float, default=0.1, help="fly scan seconds between frames")
+        parser.add_argument("--exposure", type=float, default=0.05, help="fly scan exposure time (s)")
+        parser.add_argument("--trigger", choices=["internal", "external"], default="internal",
+                            help="internal: camera free-runs, external: controller position-compare pulses")
+        args = parser.parse_args()
+
+        # The acquisition daemon refuses shots while this is held, they would redirect our frames
+        detector = DetectorLock(f"scan {args.save_name}")
+        if not detector.acquire(timeout=0):
+            print(f"Waiting for the detector, held by {detector.holder()}")
+            detector.acquire()
+
         # File configuration
-        base_path =  '/home/user/tmpData/AI_scan/' + sys.argv[4]
+        base_path =  '/home/user/tmpData/AI_scan/' + args.save_name
         save_dir = base_path + '/raw_images/'
 
         # Ensure the directory exists
         os.makedirs(save_dir, exist_ok=True)
         # Then set the path in EPICS
 
-        start_pos = float(sys.argv[1])
-        end_pos = float(sys.argv[2])
-        num_points = int(sys.argv[3])
+        start_pos = args.start_pos
+        end_pos = args.end_pos
+        num_points = args.num_points
 
         camera.tiff.file_path.put(save_dir)
         camera.tiff.file_template.put('%s%s_%d.tiff')
 
-        RE(scan_with_saves(start_pos, end_pos, num_points))
-
-        cropImages(save_dir)
-
         image_dir_preprocess = os.path.join(base_path, "images")
         image_dir = os.path.join(base_path, "images_png")
-
-        if ((os.path.exists(image_dir)) == 0):
-            convert_image_format(image_dir_preprocess, image_dir)
+        compression = None if args.container == "none" else args.container
+
+        if args.container and not args.fly:
+            container = ScanWriter(container_path(base_path), num_points, compression=compression,
+                                   attrs={"start_pos": start_pos, "end_pos": end_pos, "save_name": args.save_name})
+
+        gate = QualityGate(full_scale=args.full_scale, max_reacquire=args.max_reacquire) if args.quality_gate else None
+        planner = None
+        if args.adaptive and not args.fly:
+            planner = AdaptivePlanner(start_pos, end_pos, num_points, args.adaptive, noise=args.adaptive_noise)
+        elif args.adaptive:
+            print("--Adaptive sampling needs a step scan, fly scans rotate continuously")
+
+        if args.quicklook and not args.fly:
+            quicklook = QuickLook(base_path, image_dir, stride=args.quicklook, expected=num_points).start()
+        elif args.quicklook:
+            print("--Quick look needs the projections while scanning, fly scan frames are named afterwards")
+
+        if args.fly:
+            # num_points is not used, the frame count follows from velocity and frame period
+            RE(fly_scan(motor, camera, start_pos, end_pos, args.velocity, args.frame_period, args.exposure,
+                        save_dir, trigger=args.trigger, metadata_path=os.path.join(base_path, "fly_frames.csv")))
+            # Fly frames are renamed with their angle at the end of the scan, so crop them afterwards
+            preprocess_directory(save_dir, image_dir, image_dir_preprocess)
+            if args.container:
+                pack_directory(save_dir, container_path(base_path), os.path.join(base_path, "fly_frames.csv"),
+                               compression=compression)
+        elif args.stream:
+            RE(scan_streaming(start_pos, end_pos, num_points, image_dir, settle_time=args.settle_time,
+                              frames_per_position=args.frames_per_position, average=args.average,
+                              container=container, gate=gate, planner=planner))
+        else:
+            # Crop and encode each frame while the scan is still running
+            preprocessor = StreamingPreprocessor(save_dir, image_dir, image_dir_preprocess).start()
+            try:
+                RE(scan_with_saves(start_pos, end_pos, num_points, wait_mode=args.wait_mode, settle_time=args.settle_time,
+                                   frames_per_position=args.frames_per_position, average=args.average,
+                                   container=container, gate=gate, planner=planner))
+            finally:
+                preprocessor.stop()
 
         #cropped_dir = save_dir.replace('images_uncropped/', 'images/')
         #average_output_dir = os.path.join(cropped_dir, 'averaged')
@@ -193,4 +523,22 @@ if __name__ == "__main__":
         RE.stop()
     except Exception as e:
         print(f"\nError during scan: {e}")
-        #RE.stop()
\ No newline at end of file
+        #RE.stop()
+    finally:
+        if detector is not None:
+            detector.release()
+        if container is not None:
+            container.close()
+        if planner is not None:
+            planner.save(os.path.join(base_path, "adaptive_plan.csv"))
+            print(planner.summary())
+        if quicklook is not None:
+            status = quicklook.stop()
+            print(f"✓ Quick look: {status['registered']} of {status['images']} projections registered")
+        if args is not None:
+            try:
+                index = build_angle_index(base_path)
+                print(f"✓ Angle index of {len(index)} projections saved")
+            except Exception as e:
+                print(f"--Failed to build the angle index: {e}")
+            record_scan(args.save_name)
\ No newline at end of file
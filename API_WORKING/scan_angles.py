@@ -0,0 +1,192 @@
+"""
+Rotation angles of scan projections.
+
+Scans name their frames scan_<ts>_pos_<i>_shot_angle_<deg>_<n>.<ext>, so the
+angle of every projection is known without looking at the image.
+"""
+import bisect, json, os, re
+import numpy as np
+
+ANGLE_PATTERN = re.compile(r"_angle_(-?[0-9.]+(?:e-?[0-9]+)?)_\d+\.\w+$")
+
+
+def parse_angle(filename: str):
+    """ Angle in degrees encoded in a projection file name, None if there is none. """
+    match = ANGLE_PATTERN.search(os.path.basename(filename))
+    return float(match.group(1)) if match else None
+
+
+def angles_for_directory(image_dir: str):
+    """
+    {file name: angle} for every projection in image_dir that carries an angle.
+    Angles come from the scan container next to image_dir when there is one,
+    from the file names otherwise.
+    """
+    from scan_container import ScanContainer, find_container
+
+    stored = {}
+    path = find_container(os.path.dirname(os.path.normpath(image_dir)))
+    if path:
+        with ScanContainer(path) as container:
+            stored = container.angle_map()
+
+    angles = {}
+    for name in os.listdir(image_dir):
+        angle = stored.get(os.path.splitext(name)[0])
+        if angle is None:
+            angle = parse_angle(name)
+        if angle is not None:
+            angles[name] = angle
+    return angles
+
+
+def is_full_circle(angles, factor: float = 2.0) -> bool:
+    """ True when the projections wrap around 360°, i.e. the gap across 0° is no bigger than a normal step. """
+    wrapped = np.sort(np.mod(np.asarray(angles, dtype=float), 360.0))
+    if len(wrapped) < 3:
+        return False
+    steps = np.diff(wrapped)
+    step = np.median(steps[steps > 0]) if np.any(steps > 0) else 0.0
+    return 360.0 - (wrapped[-1] - wrapped[0]) <= factor * step
+
+
+def neighbor_pairs(angles: dict, neighbors: int = 4):
+    """
+    Image pairs that match each projection with its `neighbors` angular
+    neighbours on each side, wrapping around at 360° for full rotations.
+    Returns a sorted list of (name_a, name_b), linear in the number of images.
+    """
+    names = sorted(angles, key=lambda name: np.mod(angles[name], 360.0))
+    n = len(names)
+    wrap = is_full_circle(list(angles.values()))
+    pairs = set()
+    for i in range(n):
+        for k in range(1, neighbors + 1):
+            j = i + k
+            if j >= n:
+                if not wrap:
+                    break
+                j -= n
+            if j != i:
+                pairs.add(tuple(sorted((names[i], names[j]))))
+    return sorted(pairs)
+
+
+def write_match_list(image_dir: str, match_list_path: str, neighbors: int = 4) -> int:
+    """ COLMAP matches_importer pair list for image_dir, returns the number of pairs. """
+    pairs = neighbor_pairs(angles_for_directory(image_dir), neighbors)
+    with open(match_list_path, "w") as f:
+        for a, b in pairs:
+            f.write(f"{a} {b}\n")
+    return len(pairs)
+
+
+class AngleIndex:
+    """
+    Projections sorted by angle (modulo 360°), for O(log n) nearest-angle and
+    angle-range lookups. refs are whatever identifies a frame: a file path,
+    a container index.
+    """
+
+    def __init__(self, angles, refs):
+        order = sorted(range(len(refs)), key=lambda i: float(angles[i]) % 360.0)
+        self.angles = [float(angles[i]) for i in order]
+        self.refs = [refs[i] for i in order]
+        self._keys = [a % 360.0 for a in self.angles]
+
+    def __len__(self):
+        return len(self.refs)
+
+    def _nearest_position(self, angle: float) -> int:
+        target = angle % 360.0
+        pos = bisect.bisect_left(self._keys, target)
+        # Neighbours on either side, the first and last entries are neighbours across 0°
+        before, after = (pos - 1) % len(self), pos % len(self)
+        distance = lambda i: abs((self._keys[i] - target + 180.0) % 360.0 - 180.0)
+        return before if distance(before) <= distance(after) else after
+
+    def nearest(self, angle: float):
+        """ (angle, ref) of the projection closest to `angle`. """
+        if not self.refs:
+            raise ValueError("Angle index is empty")
+        i = self._nearest_position(angle)
+        return self.angles[i], self.refs[i]
+
+    def between(self, start: float, end: float):
+        """ [(angle, ref)] from `start` to `end` degrees, wrapping past 360° when end < start. """
+        lo, hi = start % 360.0, end % 360.0
+        if end - start >= 360.0:
+            lo, hi = 0.0, 360.0
+        if lo <= hi:
+            spans = [(lo, hi)]
+        else:
+            spans = [(lo, 360.0), (0.0, hi)]
+        result = []
+        for a, b in spans:
+            i, j = bisect.bisect_left(self._keys, a), bisect.bisect_right(self._keys, b)
+            result.extend(zip(self.angles[i:j], self.refs[i:j]))
+        return result
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"angles": self.angles, "refs": self.refs}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "AngleIndex":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["angles"], data["refs"])
+
+    @classmethod
+    def from_directory(cls, image_dir: str) -> "AngleIndex":
+        angles = angles_for_directory(image_dir)
+        names = list(angles)
+        return cls([angles[n] for n in names], [os.path.join(image_dir, n) for n in names])
+
+
+ANGLE_INDEX_NAME = "angle_index.json"
+# What an index is built from, in order of preference
+INDEX_SOURCES = ("images_png", "raw_images", "scan.h5")
+
+
+def build_angle_index(scan_dir: str) -> AngleIndex:
+    """
+    Index the projections of a scan folder and save it as angle_index.json.
+    Frames are the PNGs when there are any, else the raw TIFFs, else the
+    entries of scan.h5 (as "<container>#<frame name>").
+    """
+    from scan_container import ScanContainer, find_container
+
+    index = None
+    for folder in ("images_png", "raw_images"):
+        directory = os.path.join(scan_dir, folder)
+        if os.path.isdir(directory):
+            index = AngleIndex.from_directory(directory)
+            if len(index):
+                break
+    container_file = find_container(scan_dir)
+    if (index is None or not len(index)) and container_file:
+        with ScanContainer(container_file) as container:
+            index = AngleIndex(container.angles, [f"{container_file}#{name}" for name in container.names])
+    if index is None:
+        index = AngleIndex([], [])
+
+    index.save(os.path.join(scan_dir, ANGLE_INDEX_NAME))
+    return index
+
+
+def angle_index_stamp(scan_dir: str) -> tuple:
+    """ mtimes of the saved index and of what it is built from, None for missing ones. """
+    paths = [os.path.join(scan_dir, name) for name in (ANGLE_INDEX_NAME, *INDEX_SOURCES)]
+    return tuple(os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in paths)
+
+
+def load_angle_index(scan_dir: str) -> AngleIndex:
+    """
+    The saved index of a scan, rebuilt for scans that predate it and when
+    frames were added since it was saved (e.g. an index read mid-scan).
+    """
+    saved, *sources = angle_index_stamp(scan_dir)
+    if saved is not None and saved >= max((mtime for mtime in sources if mtime is not None), default=0):
+        return AngleIndex.load(os.path.join(scan_dir, ANGLE_INDEX_NAME))
+    return build_angle_index(scan_dir)
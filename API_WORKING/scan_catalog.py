@@ -0,0 +1,243 @@
+"""
+SQLite catalog of everything under the data root.
+
+The scan and reconstruction scripts record scans, projections and
+reconstruction outputs here as they write them, so the agent answers
+"which scans are there", "what angles does this one cover" and "what was
+the last projection" with indexed queries instead of walking the folders.
+
+`python scan_catalog.py --rebuild` indexes data written before the catalog
+existed (or by hand) in one walk.
+"""
+import argparse, os, sqlite3, threading, time
+
+DATA_ROOT = "/home/user/tmpData/AI_scan/"
+CATALOG_PATH = os.environ.get("BOLT_CATALOG", os.path.join(DATA_ROOT, "catalog.db"))
+
+# Folder inside a scan -> file kind
+KINDS = {"raw_images": "raw", "images": "cropped", "images_png": "png"}
+PROJECTION_KINDS = ("raw", "png")
+ARTIFACTS = ("workspace/dense/scene_dense.ply", "workspace/dense/scene_dense_mesh.ply",
+             "workspace/dense/scene_texture.ply", "workspace/sparse/0/points3D.bin", "scan.h5")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    created REAL,
+    updated REAL,
+    num_projections INTEGER DEFAULT 0,
+    angle_min REAL,
+    angle_max REAL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    scan TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    angle REAL,
+    size INTEGER,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS files_scan_kind ON files (scan, kind, angle);
+CREATE TABLE IF NOT EXISTS latest (
+    kind TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    scan TEXT NOT NULL,
+    angle REAL,
+    mtime REAL
+);
+"""
+
+
+class Catalog:
+    """ One connection per process, shared between threads. """
+
+    def __init__(self, path: str = CATALOG_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")   # Scans write while the agent reads
+        self._conn.executescript(SCHEMA)
+
+    def register_scan(self, name: str, path: str = None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO scans (name, path, created, updated) VALUES (?, ?, ?, ?)",
+                               (name, path or os.path.join(DATA_ROOT, name), now, now))
+
+    def add_file(self, scan: str, path: str, kind: str, angle: float = None):
+        """ Record a file that was just written. Projections also update the scan's count and angle range. """
+        self.add_files(scan, [(path, angle)], kind)
+
+    def add_files(self, scan: str, entries, kind: str):
+        """ entries: iterable of (path, angle or None), recorded in one transaction. """
+        self.register_scan(scan)
+        rows = []
+        for path, angle in entries:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            rows.append((path, scan, kind, angle, st.st_size, st.st_mtime))
+        if not rows:
+            return 0
+
+        with self._lock, self._conn:
+            new = 0
+            for row in rows:
+                new += self._conn.execute("INSERT OR IGNORE INTO files (path, scan, kind, angle, size, mtime) "
+                                          "VALUES (?, ?, ?, ?, ?, ?)", row).rowcount
+                self._conn.execute("UPDATE files SET size = ?, mtime = ? WHERE path = ?", (row[4], row[5], row[0]))
+            if kind in PROJECTION_KINDS:
+                self._update_projection_stats(scan)
+                latest = max(rows, key=lambda r: r[5])
+                self._conn.execute("INSERT INTO latest (kind, path, scan, angle, mtime) VALUES (?, ?, ?, ?, ?) "
+                                   "ON CONFLICT(kind) DO UPDATE SET path = excluded.path, scan = excluded.scan, "
+                                   "angle = excluded.angle, mtime = excluded.mtime WHERE excluded.mtime >= latest.mtime",
+                                   (kind, latest[0], scan, latest[3], latest[5]))
+            self._conn.execute("UPDATE scans SET updated = ? WHERE name = ?", (time.time(), scan))
+        return new
+
+    def _update_projection_stats(self, scan: str):
+        # Raw frames are the projections while a scan runs, stream scans only write PNGs
+        self._conn.execute("""
+            UPDATE scans SET (num_projections, angle_min, angle_max) = (
+                SELECT COUNT(*), MIN(angle), MAX(angle) FROM files
+                WHERE scan = ? AND kind = (
+                    SELECT kind FROM files WHERE scan = ? AND kind IN ('raw', 'png')
+                    GROUP BY kind ORDER BY COUNT(*) DESC LIMIT 1))
+            WHERE name = ?""", (scan, scan, scan))
+
+    def remove_file(self, path: str):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT scan, kind FROM files WHERE path = ?", (path,)).fetchone()
+            self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            if row and row["kind"] in PROJECTION_KINDS:
+                self._update_projection_stats(row["scan"])
+
+    def prune_missing(self, scan: str) -> int:
+        """ Forget the files of `scan` that were deleted or moved since they were recorded, returns how many. """
+        with self._lock:
+            rows = self._conn.execute("SELECT path, kind FROM files WHERE scan = ?", (scan,)).fetchall()
+        gone = [row["path"] for row in rows if not os.path.exists(row["path"])]
+        if not gone:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in gone])
+            self._update_projection_stats(scan)
+            # A latest projection that is gone falls back to the newest one still recorded
+            for kind in PROJECTION_KINDS:
+                self._conn.execute("DELETE FROM latest WHERE kind = ? AND path IN (%s)" % ",".join("?" * len(gone)),
+                                   (kind, *gone))
+                self._conn.execute("INSERT OR IGNORE INTO latest (kind, path, scan, angle, mtime) "
+                                   "SELECT kind, path, scan, angle, mtime FROM files WHERE kind = ? "
+                                   "ORDER BY mtime DESC LIMIT 1", (kind,))
+            self._conn.execute("UPDATE scans SET updated = ? WHERE name = ?", (time.time(), scan))
+        return len(gone)
+
+    def add_artifacts(self, scan: str, scan_dir: str = None) -> int:
+        """ Record the reconstruction outputs (and container) that exist for `scan`. """
+        scan_dir = scan_dir or os.path.join(DATA_ROOT, scan)
+        return self.add_files(scan, [(os.path.join(scan_dir, a), None) for a in ARTIFACTS], "artifact")
+
+    def scans(self, exclude=("measurements", "testing")):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM scans ORDER BY created").fetchall()
+        return [dict(row) for row in rows if row["name"] not in exclude]
+
+    def scan(self, name: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM scans WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+
+    def files(self, scan: str, kind: str = None):
+        """ File rows of a scan, ordered by angle. """
+        query, args = "SELECT * FROM files WHERE scan = ?", [scan]
+        if kind:
+            query += " AND kind = ?"
+            args.append(kind)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY angle, path", args).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest_projection(self, kind: str = None):
+        """ Most recently written projection of any scan (of `kind` if given), one row per kind is kept. """
+        query, args = "SELECT * FROM latest", []
+        if kind:
+            query += " WHERE kind = ?"
+            args.append(kind)
+        with self._lock:
+            row = self._conn.execute(query + " ORDER BY mtime DESC LIMIT 1", args).fetchone()
+        return dict(row) if row else None
+
+    def index_scan(self, name: str, scan_dir: str = None) -> int:
+        """ Record every file of one scan folder and forget the ones gone from it, returns the number of new files. """
+        from scan_angles import parse_angle
+
+        scan_dir = scan_dir or os.path.join(DATA_ROOT, name)
+        self.register_scan(name, scan_dir)
+        self.prune_missing(name)
+        count = 0
+        # measurements/ holds single shots directly, scans have one folder per kind
+        folders = {"": "raw"} if name == "measurements" else KINDS
+        for folder, kind in folders.items():
+            directory = os.path.join(scan_dir, folder)
+            if os.path.isdir(directory):
+                entries = [(os.path.join(directory, f), parse_angle(f)) for f in os.listdir(directory)
+                           if not f.startswith(".") and os.path.isfile(os.path.join(directory, f))]
+                count += self.add_files(name, entries, kind)
+        return count + self.add_artifacts(name, scan_dir)
+
+    def rebuild(self, root: str = DATA_ROOT) -> int:
+        """ Walk the data root once and record every scan folder and its files. """
+        return sum(self.index_scan(name, os.path.join(root, name)) for name in sorted(os.listdir(root))
+                   if os.path.isdir(os.path.join(root, name)))
+
+    def close(self):
+        self._conn.close()
+
+
+_catalog = None
+
+
+def get_catalog() -> Catalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog()
+    return _catalog
+
+
+def record(scan: str, path: str, kind: str = "raw", angle: float = None):
+    """
+    Best-effort update used by the scan scripts for every saved frame: a
+    catalog problem is printed, it never fails the acquisition.
+    """
+    try:
+        get_catalog().add_file(scan, path, kind, angle)
+    except Exception as e:
+        print(f"--Catalog update failed: {e}")
+
+
+def record_scan(scan: str):
+    """ Best-effort re-index of one scan folder once a scan or reconstruction has finished. """
+    try:
+        count = get_catalog().index_scan(scan)
+        print(f"✓ Catalog updated for {scan}, {count} new files")
+    except Exception as e:
+        print(f"--Catalog update failed: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan catalog maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="index every scan folder under the data root")
+    parser.add_argument("--root", default=DATA_ROOT)
+    args = parser.parse_args()
+
+    catalog = get_catalog()
+    if args.rebuild:
+        t0 = time.time()
+        print(f"✓ Indexed {catalog.rebuild(args.root)} new files in {time.time() - t0:.2f}s")
+    for scan in catalog.scans():
+        print(f"{scan['name']}: {scan['num_projections']} projections, {scan['angle_min']} to {scan['angle_max']} degrees")
@@ -0,0 +1,216 @@
+"""
+One HDF5 file per scan instead of loose TIFF/PNG files.
+
+scan.h5 in the scan folder holds:
+
+    projections     (n, height, width) frames at native bit depth, one chunk per frame
+    angle           degrees, per frame
+    motor_readback  motor units, per frame
+    timestamp       seconds since the epoch, per frame
+    exposure        seconds, per frame
+    name            frame name in the scan_<ts>_pos_<i>_shot_angle_<deg>_<n> scheme
+
+Frames are gzip compressed by default. With compression=None the stack is
+stored contiguously and ScanContainer.memmap() maps it straight from disk.
+"""
+import csv, glob, os
+import numpy as np
+from scan_angles import AngleIndex
+
+try:
+    import h5py
+except ImportError:  # Only needed when a scan actually uses the container
+    h5py = None
+
+CONTAINER_NAME = "scan.h5"
+FIELDS = ("angle", "motor_readback", "timestamp", "exposure")
+
+
+def _require_h5py():
+    if h5py is None:
+        raise ImportError("h5py is required for scan containers")
+
+
+def frame_name(path: str) -> str:
+    """ File name without folder and image extension. The angle's decimal point is not an extension. """
+    name = os.path.basename(path)
+    stem, ext = os.path.splitext(name)
+    return stem if ext.lower() in (".tiff", ".tif", ".png") else name
+
+
+def container_path(scan_dir: str) -> str:
+    return os.path.join(scan_dir, CONTAINER_NAME)
+
+
+def find_container(scan_dir: str):
+    """ Path of the scan's container, None for scans saved as loose files only. """
+    path = container_path(scan_dir)
+    return path if os.path.exists(path) else None
+
+
+class ScanWriter:
+    """
+    Appends frames and their metadata to a new container. The datasets are
+    created on the first frame, sized for n_frames and trimmed on close().
+    """
+
+    def __init__(self, path: str, n_frames: int, compression="gzip", compression_opts=4, attrs: dict = None):
+        _require_h5py()
+        self.path = path
+        self.n_frames = n_frames
+        self.compression = compression
+        self.compression_opts = compression_opts if compression == "gzip" else None
+        self.count = 0
+        self._file = h5py.File(path, "w")
+        self._file.attrs.update(attrs or {})
+
+    def _create(self, frame: np.ndarray):
+        if self.compression:
+            # Chunk = one frame, reading a projection decompresses only that frame
+            self._file.create_dataset("projections", shape=(self.n_frames,) + frame.shape, dtype=frame.dtype,
+                                      maxshape=(None,) + frame.shape, chunks=(1,) + frame.shape,
+                                      compression=self.compression, compression_opts=self.compression_opts,
+                                      shuffle=True)
+        else:
+            self._file.create_dataset("projections", shape=(self.n_frames,) + frame.shape, dtype=frame.dtype)
+        for field in FIELDS:
+            self._file.create_dataset(field, shape=(self.n_frames,), dtype="f8", maxshape=(None,), fillvalue=np.nan)
+        self._file.create_dataset("name", shape=(self.n_frames,), dtype=h5py.string_dtype(), maxshape=(None,))
+
+    def append(self, frame: np.ndarray, angle: float, name: str, motor_readback: float = np.nan,
+               timestamp: float = np.nan, exposure: float = np.nan) -> int:
+        """ Write the next frame, returns its index. """
+        if self.count == 0:
+            self._create(frame)
+        if self.count >= self.n_frames:
+            if not self.compression:
+                raise ValueError(f"Contiguous container is full ({self.n_frames} frames)")
+            self.n_frames = self.count + 1
+            for key in ("projections", "name") + FIELDS:
+                self._file[key].resize(self.n_frames, axis=0)
+
+        i = self.count
+        self._file["projections"][i] = frame
+        self._file["name"][i] = frame_name(name)
+        for field, value in zip(FIELDS, (angle, motor_readback, timestamp, exposure)):
+            self._file[field][i] = value
+        self.count += 1
+        return i
+
+    def close(self):
+        if self.count and self.compression:
+            for key in ("projections", "name") + FIELDS:
+                self._file[key].resize(self.count, axis=0)
+        self._file.attrs["num_frames"] = self.count
+        self._file.close()
+        print(f"✓ {self.count} frames saved in {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ScanContainer:
+    """ Read side: metadata is loaded once, frames are read one chunk at a time. """
+
+    def __init__(self, path: str):
+        _require_h5py()
+        self.path = path
+        self._file = h5py.File(path, "r")
+        if "projections" not in self._file:
+            self._file.close()
+            raise ValueError(f"No frames in {path}")
+        count = int(self._file.attrs.get("num_frames", len(self._file["name"])))
+        self.names = [n.decode() if isinstance(n, bytes) else n for n in self._file["name"][:count]]
+        self.angles = self._file["angle"][:count]
+        self.motor_readback = self._file["motor_readback"][:count]
+        self.timestamp = self._file["timestamp"][:count]
+        self.exposure = self._file["exposure"][:count]
+        self.projections = self._file["projections"]
+        self.angle_index = AngleIndex(self.angles, list(range(count)))
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def frame_shape(self):
+        return self.projections.shape[1:]
+
+    def projection(self, index: int) -> np.ndarray:
+        return self.projections[index]
+
+    def index_for_angle(self, angle: float) -> int:
+        """ Index of the frame closest to `angle`, comparing angles modulo 360°. """
+        return self.angle_index.nearest(angle)[1]
+
+    def projection_at(self, angle: float):
+        """ (angle, frame) of the projection closest to `angle`. """
+        index = self.index_for_angle(angle)
+        return float(self.angles[index]), self.projection(index)
+
+    def angle_map(self) -> dict:
+        """ {frame name: angle} """
+        return dict(zip(self.names, (float(a) for a in self.angles)))
+
+    def memmap(self) -> np.ndarray:
+        """
+        The projection stack mapped from the file without reading it. Only
+        uncompressed, contiguous containers can be mapped, chunked ones
+        return the h5py dataset, which reads lazily on slicing.
+        """
+        offset = self.projections.id.get_offset()
+        if self.projections.chunks is not None or offset is None:
+            return self.projections
+        return np.memmap(self.path, mode="r", dtype=self.projections.dtype,
+                         shape=(len(self),) + self.frame_shape, offset=offset)
+
+    def info(self) -> dict:
+        return {"path": self.path, "num_frames": len(self), "frame_shape": list(self.frame_shape),
+                "dtype": str(self.projections.dtype), "compression": self.projections.compression,
+                "angle_min": float(np.nanmin(self.angles)) if len(self) else None,
+                "angle_max": float(np.nanmax(self.angles)) if len(self) else None}
+
+    def export_images(self, output_dir: str, ext: str = ".png", crop_box=None) -> int:
+        """ Write every frame as `<name><ext>` for tools that need image files (COLMAP). """
+        from preprocess import encode_frame
+
+        os.makedirs(output_dir, exist_ok=True)
+        for i, name in enumerate(self.names):
+            encode_frame(self.projection(i), os.path.join(output_dir, name + ext), crop_box)
+        return len(self)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def pack_directory(raw_dir: str, path: str, metadata_path: str = None, compression="gzip") -> int:
+    """
+    Build a container from a folder of saved TIFFs (fly scans, or scans taken
+    before containers existed). Readback and timestamps come from the fly scan
+    CSV when there is one, angles otherwise from the file names.
+    """
+    from preprocess import read_frame
+    from scan_angles import parse_angle
+
+    rows = {}
+    if metadata_path and os.path.exists(metadata_path):
+        with open(metadata_path, newline="") as f:
+            rows = {row["file"]: row for row in csv.DictReader(f)}
+
+    files = [f for f in glob.glob(os.path.join(raw_dir, "*.tiff")) if parse_angle(f) is not None]
+    files.sort(key=parse_angle)
+    with ScanWriter(path, len(files), compression=compression) as writer:
+        for filepath in files:
+            row = rows.get(os.path.basename(filepath), {})
+            writer.append(read_frame(filepath), parse_angle(filepath), filepath,
+                          motor_readback=float(row.get("motor_readback", np.nan)),
+                          timestamp=float(row.get("timestamp", os.path.getmtime(filepath))))
+    return len(files)
@@ -1,50 +1,61 @@
-from fastapi import FastAPI
-import os
-import subprocess
+from fastapi import FastAPI, HTTPException, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+import asyncio, json, os, time
+import progress
+from jobs import JobManager, limits_from_env
+from motor_client import MOTOR_TO_DEGREES, get_motor_client
+from acquisition_daemon import request_measurement
+from preprocess import PREVIEW_LEVELS, preview_path, write_previews
+from scan_angles import load_angle_index
+from scan_catalog import DATA_ROOT
+from recon_profiles import PROFILE_NAMES, DEFAULT_PROFILE
+from progressive_recon import load_status as load_quicklook_status
+from mesh_preview import scan_previews
+from transfer import DEFAULT_GROUPS, GROUPS, etag_of, file_response, scan_files, tar_response
+from scan_container import container_path
+from PIL import Image
 
 app = FastAPI()
 
 env = "python"
 
-#Proper format
+# Scans and reconstructions started through /jobs run in the background
+job_manager = JobManager(limits_from_env(), cwd=os.path.dirname(os.path.abspath(__file__)),
+                         keep_finished=int(os.environ.get("BOLT_KEEP_FINISHED_JOBS", 200)))
 
-@app.get("/move_motor_by/{amount}")
-def move_motor_by(amount: int):
-    try:
-        #First get the current angle
-        cmd = ["/opt/epics/base-7.0.4/bin/linux-x86_64/caget", "DMC01:A"]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+def _run(cmd: list):
+    """ (returncode, last lines of output) of a script, read as it runs instead of buffered whole. """
+    returncode, tail = progress.run(cmd, cwd=job_manager.cwd)
+    return returncode, "\n".join(tail)
 
-        if result.returncode == 0:
-            value_str = result.stdout.strip().split()[-1]
-            angle = float(value_str)
-        else:
-            print("Failed to get motor value:", result.stderr)
+# Streams poll their source on the event loop rather than holding a threadpool thread per client
+POLL_INTERVAL = 0.1
+KEEP_ALIVE = 15.0
 
-        move_to_angle = amount + angle
-        degree_angle = move_to_angle * 2.8125
+def _sse(event: dict) -> str:
+    """ One server-sent event, the sequence number as its id so clients can resume. """
+    return f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
 
-        cmd1 = ["/opt/epics/base-7.0.4/bin/linux-x86_64/caput", "DMC01:A", str(move_to_angle)]
-        result1 = subprocess.run(cmd1, capture_output=True, text=True)
-        
-        if result1.returncode == 0:
-            return f"Moved motor succesfully. Current angle, with true motor angles, {degree_angle}"
-        else:
-            print("Failed to get motor value:", result.stderr)
+#Proper format
 
+@app.get("/move_motor_by/{amount}")
+def move_motor_by(amount: int, wait: bool = True):
+    try:
+        degree_angle = get_motor_client().move_by(amount, wait=wait) * MOTOR_TO_DEGREES
 
+        return f"Moved motor succesfully. Current angle, with true motor angles, {degree_angle}"
 
     except Exception as e:
-            print(f"Error getting current angle: {e}")
-            return f"Error getting current angle: {str(e)}"
+            print(f"Error moving motor: {e}")
+            return f"Error moving motor: {str(e)}"
     
 @app.get("/move_motor/{amount}")
-def move_motor(amount: int):
-    cmd = ["/opt/epics/base-7.0.4/bin/linux-x86_64/caput", "DMC01:A", str(amount)]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-
-    if result.returncode == 0:
-        return f"Failed to move motor:\n{result.stderr}"
+def move_motor(amount: int, wait: bool = True):
+    try:
+        get_motor_client().move_to(amount, wait=wait)
+    except Exception as e:
+        return f"Failed to move motor:\n{str(e)}"
 
     return {"message": f"Moved motor to true amout of {amount}"}
 
@@ -52,21 +63,20 @@ def move_motor(amount: int):
 def acquire_image():
     try:
         #First get the current angle
-        cmd = ["/opt/epics/base-7.0.4/bin/linux-x86_64/caget", "DMC01:A"]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        angle = get_motor_client().angle
 
-        if result.returncode == 0:
-            value_str = result.stdout.strip().split()[-1]
-            angle = float(value_str)
-            angle = angle * 2.8125   #Ratio
-        else:
-            print("Failed to take measurement value:", result.stderr)
+        #Resident acquisition daemon when it is running, otherwise a one-off take_measurement.py
+        try:
+            file_saved = request_measurement(float(angle))
+            return f"Measurement succesfully taken: {file_saved}"
+        except ConnectionError:
+            pass
 
         #If no errors during acquisiton, pass in the current location of the cube in order to formulate the 
         #files name properly during acquisition (Can be replaced, but visually this is better to understand)
         cmd1 = [env, "take_measurement.py", str(float(angle))]
-        result1 = subprocess.run(cmd1, capture_output=True, text=True)
-        if result1.returncode == 0:
+        returncode, _ = _run(cmd1)
+        if returncode == 0:
             return "Measurement succesfully taken"
 
     except Exception as e:
@@ -76,16 +86,8 @@ def acquire_image():
 @app.get("/get_angle")
 def get_angle():
     try:
-        #Get the current angle
-        cmd = ["/opt/epics/base-7.0.4/bin/linux-x86_64/caget", "DMC01:A"]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode == 0:
-            value_str = result.stdout.strip().split()[-1]
-            angle = float(value_str)
-            angle = angle * 2.8125   #Ratio
-        else:
-            print("Failed to get angle value:", result.stderr)
+        #Served from the monitor cache, no CA round trip
+        angle = get_motor_client().angle
 
         return f"Current angle is {angle}"
 
@@ -93,6 +95,37 @@ def get_angle():
             print(f"Error getting current angle: {e}")
             return f"Error getting current angle: {str(e)}"
 
+@app.get("/motor")
+def motor_readback():
+    try:
+        return get_motor_client().readback()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Motor unavailable: {e}")
+
+@app.get("/motor/events")
+async def stream_motor(request: Request, min_interval: float = 0.1):
+    """ Server-sent readback events whenever the motor monitor updates, at most one per min_interval seconds. """
+    try:
+        client = get_motor_client()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Motor unavailable: {e}")
+
+    async def events():
+        seq, timestamp, idle = 0, None, time.monotonic()
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            readback = client.readback()
+            if readback["timestamp"] != timestamp:
+                seq, timestamp, idle = seq + 1, readback["timestamp"], time.monotonic()
+                yield _sse({"seq": seq, "event": "motor", **readback})
+            elif time.monotonic() - idle >= KEEP_ALIVE:
+                idle = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(max(min_interval, POLL_INTERVAL))
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/run_scan/{start_angle}/{end_angle}/{num_projections}/{save_dir}")
 def run_scan_full(start_angle: int, end_angle: int, num_projections: int, save_dir: str):
     try:
@@ -103,10 +136,10 @@ def run_scan_full(start_angle: int, end_angle: int, num_projections: int, save_d
         print(f"Running tomography scan from {start_angle * 2.8125} to {end_angle * 2.8125} degrees with {num_projections} projections, saving to {save_dir}")
 
         cmd = [env, 'run_tomography_scan.py', str(start_angle), str(end_angle), str(num_projections), str(save_dir)]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        returncode, output = _run(cmd)
 
-        if result.returncode != 0:
-            return f"Scan failed:\n{result.stderr}"
+        if returncode != 0:
+            return f"Scan failed:\n{output}"
         
         result_message = {
             f"Completed tomography scan with {num_projections} projections from {start_angle} to {end_angle} degrees"
@@ -130,10 +163,10 @@ def run_scan_3(start_angle: int, end_angle: int, num_projections: int):
         print(f"Running tomography scan from {start_angle * 2.8125} to {end_angle * 2.8125} degrees with {num_projections} projections, saving to {save_dir}")
 
         cmd = [env, 'run_tomography_scan.py', str(start_angle), str(end_angle), str(num_projections), str(save_dir)]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        returncode, output = _run(cmd)
 
-        if result.returncode != 0:
-            return f"Scan failed:\n{result.stderr}"
+        if returncode != 0:
+            return f"Scan failed:\n{output}"
         
         result_message = {
             f"Completed tomography scan with {num_projections} projections from {start_angle} to {end_angle} degrees"
@@ -157,10 +190,10 @@ def run_scan_2(start_angle: int, end_angle: int):
         print(f"Running tomography scan from {start_angle * 2.8125} to {end_angle * 2.8125} degrees with {num_projections} projections, saving to {save_dir}")
 
         cmd = [env, 'run_tomography_scan.py', str(start_angle), str(end_angle), str(num_projections), str(save_dir)]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        returncode, output = _run(cmd)
 
-        if result.returncode != 0:
-            return f"Scan failed:\n{result.stderr}"
+        if returncode != 0:
+            return f"Scan failed:\n{output}"
         
         result_message = {
             f"Completed tomography scan with {num_projections} projections from {start_angle} to {end_angle} degrees"
@@ -184,10 +217,10 @@ def run_scan_1(num_projections: int):
         print(f"Running tomography scan from {start_angle * 2.8125} to {end_angle * 2.8125} degrees with {num_projections} projections, saving to {save_dir}")
 
         cmd = [env, 'run_tomography_scan.py', str(start_angle), str(end_angle), str(num_projections), str(save_dir)]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        returncode, output = _run(cmd)
 
-        if result.returncode != 0:
-            return f"Scan failed:\n{result.stderr}"
+        if returncode != 0:
+            return f"Scan failed:\n{output}"
         
         result_message = {
             f"Completed tomography scan with {num_projections} projections from {start_angle} to {end_angle} degrees"
@@ -201,15 +234,15 @@ def run_scan_1(num_projections: int):
             return f"Error getting current angle: {str(e)}"
     
 @app.get("/reconstruction/{file_name}/")
-def reconstruction(file_name: str):
+def reconstruction(file_name: str, profile: str = DEFAULT_PROFILE):
     try:
         print(f"Running reconstruction on {file_name}")
 
-        cmd = [env, 'reconstruction.py', file_name]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        cmd = [env, 'reconstruction.py', file_name, '--profile', profile]
+        returncode, output = _run(cmd)
 
-        if result.returncode != 0:
-            return f"Motor move failed:\n{result.stderr}"
+        if returncode != 0:
+            return f"Motor move failed:\n{output}"
         else:
              return f"Reconstruction succeeded"
     except Exception as e:
@@ -217,3 +250,275 @@ def reconstruction(file_name: str):
             return f"Error getting current angle: {str(e)}"
 
 
+class ScanJobRequest(BaseModel):
+    start_angle: float = 0
+    end_angle: float = 360
+    num_projections: int = 10
+    save_dir: str = "default"
+    options: list = []          # Extra run_tomography_scan.py flags, e.g. ["--fly", "--velocity", "2"]
+
+class ReconstructionJobRequest(BaseModel):
+    file_name: str
+    profile: str = DEFAULT_PROFILE  # fast, balanced or high
+    options: list = []          # Extra reconstruction.py flags, e.g. ["--matcher", "exhaustive"]
+
+class BatchJobRequest(BaseModel):
+    scans: list                 # Scan names or glob patterns, optionally "name:profile"
+    profile: str = DEFAULT_PROFILE
+    jobs: int = 3               # Reconstructions running at once
+    threads: int = None         # Threads per stage, half the cores by default
+    options: list = []          # Extra batch_reconstruct.py flags, e.g. ["--force"]
+
+@app.post("/jobs/scan")
+def submit_scan_job(request: ScanJobRequest):
+    start_angle = request.start_angle / 2.8125
+    end_angle = request.end_angle / 2.8125
+    cmd = [env, '-u', 'run_tomography_scan.py', str(start_angle), str(end_angle), str(request.num_projections),
+           request.save_dir, *request.options]
+    job = job_manager.submit("scan", cmd)
+    return {"job_id": job.id, "status": job.status, "events": f"/jobs/{job.id}/events"}
+
+@app.post("/jobs/reconstruction")
+def submit_reconstruction_job(request: ReconstructionJobRequest):
+    if request.profile not in PROFILE_NAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile {request.profile}, expected one of {list(PROFILE_NAMES)}")
+    cmd = [env, '-u', 'reconstruction.py', request.file_name, '--profile', request.profile, *request.options]
+    job = job_manager.submit("reconstruction", cmd)
+    return {"job_id": job.id, "status": job.status, "events": f"/jobs/{job.id}/events"}
+
+@app.post("/jobs/batch")
+def submit_batch_job(request: BatchJobRequest):
+    if request.profile not in PROFILE_NAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile {request.profile}, expected one of {list(PROFILE_NAMES)}")
+    cmd = [env, '-u', 'batch_reconstruct.py', *request.scans, '--profile', request.profile, '--jobs', str(request.jobs)]
+    if request.threads:
+        cmd += ['--threads', str(request.threads)]
+    job = job_manager.submit("batch", cmd + request.options)
+    return {"job_id": job.id, "status": job.status, "events": f"/jobs/{job.id}/events"}
+
+@app.get("/jobs")
+def list_jobs(kind: str = None):
+    return [job.to_dict() for job in job_manager.list(kind)]
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return job.to_dict()
+
+def _job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(request: Request, job_id: str, after: int = 0, logs: bool = False,
+                            last_event_id: str = Header(None)):
+    """
+    Server-sent events of a job as they happen: projection, motor,
+    stage_start/stage_end, status (and log lines with ?logs=true). Starts
+    with the events still in the job's log, reconnecting clients resume from
+    Last-Event-ID. The stream ends after the job's final status.
+    """
+    job = _job(job_id)
+    if last_event_id and last_event_id.isdigit():
+        after = int(last_event_id)
+
+    async def events():
+        seen, idle = after, time.monotonic()
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            # Read before the events, so the final status event is sent before the stream ends
+            done = job.done
+            batch = job.wait_events(seen, timeout=0)
+            if not batch and done:
+                return
+            if batch:
+                idle = time.monotonic()
+            elif time.monotonic() - idle >= KEEP_ALIVE:
+                idle = time.monotonic()
+                yield ": keep-alive\n\n"
+            for event in batch:
+                seen = event["seq"]
+                if logs or event["event"] != "log":
+                    yield _sse(event)
+            await asyncio.sleep(POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/jobs/{job_id}/ws")
+async def job_events_socket(websocket: WebSocket, job_id: str, after: int = 0, logs: bool = False):
+    """ The same events as /jobs/{job_id}/events, one JSON message each, closed after the final status. """
+    job = job_manager.get(job_id)
+    await websocket.accept()
+    if job is None:
+        await websocket.close(code=4404, reason=f"No job {job_id}")
+        return
+    seen, idle = after, time.monotonic()
+    try:
+        while True:
+            done = job.done
+            batch = job.wait_events(seen, timeout=0)
+            if not batch and done:
+                break
+            if batch:
+                idle = time.monotonic()
+            elif time.monotonic() - idle >= KEEP_ALIVE:
+                # Also how a client that went away without closing is noticed
+                idle = time.monotonic()
+                await websocket.send_json({"event": "keep-alive", "job": job.id, "time": time.time()})
+            for event in batch:
+                seen = event["seq"]
+                if logs or event["event"] != "log":
+                    await websocket.send_json(event)
+            await asyncio.sleep(POLL_INTERVAL)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/jobs/{job_id}/logs")
+def get_job_logs(job_id: str, tail: int = 200):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return {"id": job.id, "status": job.status, "logs": list(job.logs)[-tail:]}
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return job.to_dict()
+
+
+def _data_file(path: str) -> str:
+    """ Absolute path of a file under the data root, 404 for anything else. """
+    full = os.path.realpath(os.path.join(DATA_ROOT, path))
+    if not full.startswith(os.path.realpath(DATA_ROOT) + os.sep) or not os.path.isfile(full):
+        raise HTTPException(status_code=404, detail=f"No file {path}")
+    return full
+
+def _preview_response(request: Request, full: str, level: str):
+    if level not in PREVIEW_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Unknown preview level {level}, expected one of {list(PREVIEW_LEVELS)}")
+    preview = preview_path(full, level)
+    if not os.path.exists(preview):
+        # Files saved before previews existed get theirs on first request
+        with Image.open(full) as im:
+            write_previews(im, full)
+    return file_response(request, preview, "image/jpeg")
+
+@app.get("/preview/{path:path}")
+def get_preview(request: Request, path: str, level: str = "preview"):
+    """ JPEG preview of a projection, path relative to the data root. """
+    return _preview_response(request, _data_file(path), level)
+
+def _scan_dir(scan: str) -> str:
+    """ Folder of a scan directly under the data root, 404 for anything else. """
+    scan_dir = os.path.realpath(os.path.join(DATA_ROOT, scan))
+    if os.path.dirname(scan_dir) != os.path.realpath(DATA_ROOT) or not os.path.isdir(scan_dir):
+        raise HTTPException(status_code=404, detail=f"No scan {scan}")
+    return scan_dir
+
+@app.get("/scans/{scan}/projection")
+def get_projection_at_angle(request: Request, scan: str, angle: float, level: str = "preview"):
+    """ Preview of the scan's projection closest to `angle` degrees. """
+    index = load_angle_index(_scan_dir(scan))
+    if not len(index) or "#" in index.refs[0]:
+        raise HTTPException(status_code=404, detail=f"No projection files for {scan}")
+    found_angle, path = index.nearest(angle)
+    response = _preview_response(request, path, level)
+    response.headers["X-Projection-Angle"] = str(found_angle)
+    return response
+
+# Every view is a render of the whole model, cached per views count
+MAX_VIEWS = 36
+
+def _scan_previews(scan: str, views: int = 8) -> dict:
+    if not 1 <= views <= MAX_VIEWS:
+        raise HTTPException(status_code=400, detail=f"views must be between 1 and {MAX_VIEWS}")
+    scan_dir = _scan_dir(scan)
+    try:
+        return scan_previews(scan_dir, views=views)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"No reconstruction for {scan}")
+
+@app.get("/scans/{scan}/render")
+def get_reconstruction_render(request: Request, scan: str, view: int = None, views: int = 8):
+    """ Contact sheet of turntable snapshots of the scan's best model, or one snapshot with ?view=i. """
+    manifest = _scan_previews(scan, views)
+    if view is None:
+        return file_response(request, manifest["contact_sheet"], "image/png")
+    if not 0 <= view < len(manifest["view_files"]):
+        raise HTTPException(status_code=400, detail=f"view must be between 0 and {len(manifest['view_files']) - 1}")
+    return file_response(request, manifest["view_files"][view], "image/png")
+
+@app.get("/scans/{scan}/model.glb")
+def get_reconstruction_mesh(request: Request, scan: str):
+    """ Decimated glTF of the scan's mesh for web viewers. """
+    manifest = _scan_previews(scan)
+    if not manifest["web_mesh"]:
+        raise HTTPException(status_code=404, detail=f"The model of {scan} is a point cloud, no mesh to export")
+    return file_response(request, manifest["web_mesh"], "model/gltf-binary")
+
+@app.get("/scans/{scan}/quicklook")
+def get_quicklook_status(scan: str):
+    """ State of the quick-look reconstruction of a scan started with --quicklook. """
+    status = load_quicklook_status(_scan_dir(scan))
+    if not status:
+        raise HTTPException(status_code=404, detail=f"No quick look for {scan}")
+    return status
+
+@app.get("/scans/{scan}/quicklook.ply")
+def get_quicklook_model(request: Request, scan: str):
+    """ Current quick-look point cloud, updated while the scan runs. """
+    status = load_quicklook_status(_scan_dir(scan))
+    if not status.get("model"):
+        raise HTTPException(status_code=404, detail=f"No quick-look model for {scan} yet")
+    response = file_response(request, _data_file(os.path.relpath(status["model"], DATA_ROOT)))
+    response.headers["X-Registered-Images"] = str(status["registered"])
+    return response
+
+def _groups(groups: str) -> tuple:
+    selected = tuple(g for g in groups.split(",") if g) if groups else DEFAULT_GROUPS
+    unknown = [g for g in selected if g not in GROUPS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown groups {unknown}, expected some of {list(GROUPS)}")
+    return selected
+
+@app.get("/files/{path:path}")
+def get_file(request: Request, path: str):
+    """
+    Any file under the data root: Range requests, ETag/Last-Modified with
+    conditional GET, gzip for uncompressed formats.
+    """
+    return file_response(request, _data_file(path))
+
+@app.get("/scans/{scan}/files")
+def list_scan_files(scan: str, groups: str = None):
+    """ Files of a scan with size and ETag, e.g. ?groups=raw,mesh; each is served at its url. """
+    files = []
+    for name, path in scan_files(_scan_dir(scan), _groups(groups)):
+        stat = os.stat(path)
+        files.append({"name": name, "size": stat.st_size, "mtime": stat.st_mtime, "etag": etag_of(stat),
+                      "url": f"/files/{scan}/{name}"})
+    return {"scan": scan, "count": len(files), "size": sum(f["size"] for f in files), "files": files}
+
+@app.get("/scans/{scan}/archive")
+def get_scan_archive(scan: str, groups: str = None, gzip: bool = False):
+    """ Whole scan (or ?groups=raw,png,...) as one streamed tar, gzipped with ?gzip=true. """
+    files = scan_files(_scan_dir(scan), _groups(groups))
+    if not files:
+        raise HTTPException(status_code=404, detail=f"No files of {scan} in groups {groups}")
+    return tar_response(files, scan, gzip=gzip)
+
+@app.get("/scans/{scan}/container")
+def get_scan_container(request: Request, scan: str):
+    """ The scan's HDF5 container, resumable with Range requests. """
+    path = container_path(_scan_dir(scan))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"No container for {scan}")
+    return file_response(request, path)
@@ -0,0 +1,110 @@
+"""
+Stage-level caching for the reconstruction pipeline.
+
+Each stage records, once it succeeds, a hash of its parameters, of its
+external inputs (file contents) and of the run of the stage it depends on.
+A rerun skips stages whose hash is unchanged and whose outputs still exist,
+so it resumes right after the last stage that succeeded.
+"""
+import hashlib, json, os, shutil, time
+import progress, profiling, resource_pool
+
+
+def hash_path(path: str, h=None):
+    """ Content hash of a file, or of every file under a directory (names included). """
+    h = h or hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                h.update(os.path.relpath(file_path, path).encode())
+                hash_path(file_path, h)
+    elif os.path.exists(path):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h
+
+
+class StageCache:
+    """
+    Stage state for one workspace, stored in <workspace>/stage_cache.json.
+    force=True reruns every stage but still records the new results.
+    """
+
+    def __init__(self, workspace_dir: str, force: bool = False):
+        self.path = os.path.join(workspace_dir, "stage_cache.json")
+        self.force = force
+        self.state = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.state = json.load(f)
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def key(self, name: str, args, inputs=(), after: str = None) -> str:
+        h = hashlib.sha256()
+        h.update(name.encode())
+        h.update(repr(args).encode())
+        for path in inputs:
+            hash_path(path, h)
+        if after is not None:
+            # Depends on the upstream run itself, so a rerun upstream invalidates this stage
+            upstream = self.state.get(after, {})
+            h.update(f"{upstream.get('key')}:{upstream.get('finished')}".encode())
+        return h.hexdigest()
+
+    def run(self, name: str, func, *args, inputs=(), outputs=(), reset=(), after: str = None, cores: int = 1,
+            untracked: dict = None):
+        """
+        Run func(*args, **untracked) unless the stage is up to date.
+
+        inputs: files/directories whose content the stage reads (besides upstream outputs)
+        outputs: paths that must exist after a successful run
+        reset: files removed and directories emptied before running, so a rerun
+               doesn't append to stale results
+        after: name of the stage this one depends on
+        cores: threads the stage runs, held in the shared resource pool while it runs
+        untracked: keyword arguments that don't change the result (thread counts),
+                   left out of the key so they don't invalidate the stage
+        """
+        key = self.key(name, args, inputs, after)
+        entry = self.state.get(name)
+        if not self.force and entry and entry["key"] == key and all(os.path.exists(p) for p in outputs):
+            print(f"↷ Skipping {name}, inputs unchanged since {time.ctime(entry['finished'])}")
+            progress.emit("stage_end", stage=name, skipped=True, duration=0.0)
+            profiling.skipped(name)
+            return False
+
+        with resource_pool.hold(name, cores) as waited:
+            for path in reset:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                    os.makedirs(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+
+            print(f"→ Running {name}")
+            progress.emit("stage_start", stage=name, waited=waited)
+            self.state.pop(name, None)
+            self.save()
+            t0 = time.time()
+            try:
+                with profiling.stage(name):
+                    func(*args, **(untracked or {}))
+                missing = [p for p in outputs if not os.path.exists(p)]
+                if missing:
+                    raise RuntimeError(f"Stage {name} did not produce {', '.join(missing)}")
+            except Exception as e:
+                progress.emit("stage_failed", stage=name, duration=time.time() - t0, error=str(e))
+                raise
+
+        self.state[name] = {"key": key, "finished": time.time(), "duration": time.time() - t0}
+        self.save()
+        progress.emit("stage_end", stage=name, skipped=False, duration=self.state[name]["duration"])
+        return True
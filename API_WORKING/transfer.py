@@ -0,0 +1,191 @@
+"""
+File transfer for remote clients, so they don't have to mount the data root.
+
+file_response() serves one file with an ETag (mtime and size) and
+Last-Modified, answers conditional GETs with 304, single byte ranges with
+206, and gzips compressible types on the fly when the client accepts it
+(never for ranges, whose offsets refer to the file on disk).
+
+tar_response() streams a whole selection of a scan as one uncompressed or
+gzipped tar, header and file chunks as they are read, so nothing is
+buffered or staged on disk however large the scan is.
+"""
+import glob, mimetypes, os, tarfile, zlib
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 1 << 20
+# Scan contents by group, globs relative to the scan folder
+GROUPS = {
+    "raw": ("raw_images/*",),
+    "cropped": ("images/*",),
+    "png": ("images_png/*",),
+    "previews": ("previews/**/*",),
+    "container": ("scan.h5",),
+    "mesh": ("workspace/dense/scene_*.ply", "workspace/dense/scene_texture*.png", "workspace/dense/lods.json",
+             "workspace/quicklook/quicklook.ply"),
+    "metadata": ("*.csv", "*.json", "workspace/*.json", "workspace/quicklook/status.json"),
+}
+DEFAULT_GROUPS = ("raw", "png", "container", "mesh", "metadata")
+MEDIA_TYPES = {".ply": "application/octet-stream", ".glb": "model/gltf-binary", ".h5": "application/x-hdf5",
+               ".tif": "image/tiff", ".tiff": "image/tiff"}
+# Formats that are already compressed (JPEG, PNG, glTF, gzipped HDF5 chunks) gain nothing from gzip
+COMPRESSIBLE = {".ply", ".tif", ".tiff", ".csv", ".json", ".txt", ".log", ".obj", ".bin"}
+
+
+def media_type(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return MEDIA_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def etag_of(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def not_modified(headers, etag: str, mtime: float) -> bool:
+    """ Whether the client's copy is current: If-None-Match wins over If-Modified-Since, as in RFC 9110. """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or etag[:-1] + '-gz"' in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parse_range(header: str, size: int):
+    """
+    (start, end) inclusive of a single "bytes=" range, None for a header
+    this server ignores (other units, several ranges). ValueError when the
+    range is unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, dash, last = (part.strip() for part in spec.strip().partition("-"))
+    # Malformed (no dash, signs, last before first): ignored like any other range this server can't serve
+    if not dash or not (first or last) or not all(part.isdigit() for part in (first, last) if part) \
+            or (first and last and int(last) < int(first)):
+        return None
+    if not first:                       # bytes=-N, the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(f"Range {header} outside of {size} bytes")
+    return start, end
+
+
+def iter_file(path: str, start: int = 0, end: int = None, chunk_size: int = CHUNK_SIZE):
+    """ Chunks of path from start to end inclusive (to the end of the file by default). """
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """ gzip stream of an iterable of byte chunks. """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)     # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def accepts_gzip(headers) -> bool:
+    return any(part.split(";")[0].strip() in ("gzip", "*") for part in headers.get("accept-encoding", "").split(","))
+
+
+def file_response(request, path: str, media: str = None, compress: bool = True):
+    """ Response for one file honouring If-None-Match/If-Modified-Since, Range and Accept-Encoding. """
+    stat = os.stat(path)
+    etag = etag_of(stat)
+    headers = {"ETag": etag, "Last-Modified": formatdate(stat.st_mtime, usegmt=True), "Accept-Ranges": "bytes",
+               "Vary": "Accept-Encoding"}
+    if not_modified(request.headers, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    media = media or media_type(path)
+
+    range_header = request.headers.get("range")
+    # If-Range: only serve the range when the client's copy is still this file
+    if range_header and request.headers.get("if-range", etag) in (etag, headers["Last-Modified"]):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers.update({"Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+                            "Content-Length": str(end - start + 1)})
+            return StreamingResponse(iter_file(path, start, end), status_code=206, media_type=media, headers=headers)
+
+    if compress and stat.st_size > 1024 and os.path.splitext(path)[1].lower() in COMPRESSIBLE \
+            and accepts_gzip(request.headers):
+        # A different representation, so a different (strong) tag
+        headers.update({"ETag": etag[:-1] + '-gz"', "Content-Encoding": "gzip"})
+        return StreamingResponse(gzip_chunks(iter_file(path)), media_type=media, headers=headers)
+
+    headers["Content-Length"] = str(stat.st_size)
+    return StreamingResponse(iter_file(path), media_type=media, headers=headers)
+
+
+def scan_files(scan_dir: str, groups=DEFAULT_GROUPS) -> list:
+    """ [(path relative to the scan folder, absolute path)] of the selected groups, sorted, without duplicates. """
+    unknown = [group for group in groups if group not in GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown groups {unknown}, expected some of {list(GROUPS)}")
+    found = set()
+    for group in groups:
+        for pattern in GROUPS[group]:
+            found.update(path for path in glob.glob(os.path.join(scan_dir, pattern), recursive=True)
+                         if os.path.isfile(path))
+    return sorted((os.path.relpath(path, scan_dir), path) for path in found)
+
+
+def tar_stream(files, prefix: str = "", chunk_size: int = CHUNK_SIZE):
+    """
+    Uncompressed tar of [(name, path)], one header and the file's chunks at
+    a time. Files that vanish while streaming are left out, files still
+    being written are cut at the size they had when their header went out.
+    """
+    for name, path in files:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        info = tarfile.TarInfo(os.path.join(prefix, name))
+        info.size, info.mtime, info.mode = stat.st_size, stat.st_mtime, 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+        sent = 0
+        for chunk in iter_file(path, 0, stat.st_size - 1, chunk_size) if stat.st_size else ():
+            sent += len(chunk)
+            yield chunk
+        # Shrunk meanwhile: pad with zeros so the archive stays readable
+        if sent < stat.st_size:
+            yield bytes(stat.st_size - sent)
+        if stat.st_size % tarfile.BLOCKSIZE:
+            yield bytes(tarfile.BLOCKSIZE - stat.st_size % tarfile.BLOCKSIZE)
+    yield bytes(2 * tarfile.BLOCKSIZE)
+
+
+def tar_response(files, name: str, gzip: bool = False):
+    """ Streamed download of files as <name>.tar or <name>.tar.gz. """
+    chunks = tar_stream(files, prefix=name)
+    filename = f"{name}.tar"
+    if gzip:
+        chunks, filename = gzip_chunks(chunks, level=3), filename + ".gz"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "X-File-Count": str(len(files)),
+               "X-Total-Size": str(sum(os.path.getsize(path) for _, path in files if os.path.exists(path)))}
+    return StreamingResponse(chunks, media_type="application/gzip" if gzip else "application/x-tar", headers=headers)
@@ -0,0 +1,112 @@
+"""
+Adaptive choice of scan angles.
+
+A coarse uniform pass comes first. Every frame is reduced to a small
+normalized signature (crop region, every `step`-th pixel) and the change
+between angular neighbours is the mean absolute difference of their
+signatures. The rest of the projection budget goes, in batches, to the
+midpoints of the intervals that changed the most (above the noise level,
+widest first among equal changes), so angles where the object's
+silhouette moves quickly (threads, edges) get more projections than
+flat, redundant ones. Each batch is acquired in increasing position
+so the motor sweeps instead of jumping back and forth.
+"""
+import csv
+import numpy as np
+from preprocess import CROP_BOX, crop_array
+
+
+def signature(frame: np.ndarray, crop_box=CROP_BOX, step: int = 8) -> np.ndarray:
+    """ Downsampled crop region scaled to mean 1, so exposure drift doesn't count as change. """
+    if frame.ndim == 3:
+        frame = frame.mean(axis=2)
+    region = crop_array(frame, crop_box) if crop_box else frame
+    if region.size == 0:
+        region = frame
+    sample = region[::step, ::step].astype(np.float32)
+    return sample / max(float(sample.mean()), 1e-6)
+
+
+def frame_change(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.abs(a - b).mean())
+
+
+class AdaptivePlanner:
+    """
+    Iterable of motor positions for the scan loop. The loop reports every
+    position back with add(), the planner picks the next batch from that.
+    """
+
+    def __init__(self, start_pos: float, end_pos: float, budget: int, coarse: int, batch: int = 8,
+                 min_step: float = None, noise: float = 0.01, crop_box=CROP_BOX):
+        if not 2 <= coarse <= budget:
+            raise ValueError(f"Coarse pass of {coarse} positions does not fit a budget of {budget}")
+        self.start_pos = start_pos
+        self.end_pos = end_pos
+        self.budget = budget
+        self.coarse = coarse
+        self.batch = max(1, batch)
+        # Down to a quarter of the uniform step by default
+        self.min_step = min_step if min_step is not None else abs(end_pos - start_pos) / (4 * max(budget - 1, 1))
+        # Change between two frames of an unchanged view, signatures being scaled to mean 1
+        self.noise = noise
+        self.crop_box = crop_box
+        self.signatures = {}        # Position -> signature, None for positions that failed
+        self.plan = []              # (order, position, round, change of the bisected interval)
+        self.issued = 0
+        self.round = 0
+
+    def __len__(self):
+        return self.budget
+
+    def add(self, position: float, frame: np.ndarray = None):
+        """ Frame taken at position, None when the position was skipped. """
+        self.signatures[position] = signature(frame, self.crop_box) if frame is not None else None
+
+    def intervals(self):
+        """ [(change, left, right)] between neighbouring positions that both have a frame. """
+        positions = sorted(p for p, s in self.signatures.items() if s is not None)
+        return [(frame_change(self.signatures[a], self.signatures[b]), a, b) for a, b in zip(positions, positions[1:])
+                if abs(b - a) / 2 >= self.min_step]
+
+    def next_batch(self) -> list:
+        """ Midpoints of the intervals that changed most, skipping those within the noise. """
+        remaining = self.budget - self.issued
+        candidates = [interval for interval in self.intervals() if interval[0] > self.noise]
+        # Equal change: the widest interval has the most to gain from a bisection
+        ranked = sorted(candidates, key=lambda c: (c[0], c[2] - c[1]), reverse=True)[:min(self.batch, remaining)]
+        self.round += 1
+        batch = sorted(((a + b) / 2, change) for change, a, b in ranked)
+        for position, change in batch:
+            self.plan.append((len(self.plan), position, self.round, change))
+        return [position for position, _ in batch]
+
+    def __iter__(self):
+        for position in np.linspace(self.start_pos, self.end_pos, self.coarse):
+            self.plan.append((len(self.plan), float(position), 0, None))
+            self.issued += 1
+            yield float(position)
+        while self.issued < self.budget:
+            batch = self.next_batch()
+            if not batch:
+                print("No interval above the noise and the minimum step left, stopping early")
+                return
+            print(f"↻ Refinement round {self.round}: {len(batch)} positions")
+            for position in batch:
+                self.issued += 1
+                yield position
+
+    def save(self, csv_path: str, ratio: float = 2.8125):
+        """ Acquisition order, position, angle, round and the change that picked it. """
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["order", "position", "angle", "round", "interval_change"])
+            for order, position, rnd, change in self.plan:
+                writer.writerow([order, position, position * ratio, rnd, "" if change is None else round(change, 6)])
+
+    def summary(self) -> str:
+        changes = [change for change, _, _ in self.intervals()]
+        if not changes:
+            return f"Adaptive scan: {len(self.signatures)} positions"
+        return (f"Adaptive scan: {len(self.signatures)} positions, {self.round} refinement rounds, "
+                f"neighbour change median {np.median(changes):.3g}, max {max(changes):.3g}")
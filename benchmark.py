@@ -0,0 +1,152 @@
+"""
+Reconstruction benchmark on a fixed synthetic turntable dataset.
+
+A textured sphere is rendered at evenly spaced angles with the same camera
+and pose convention as turntable_poses.py, so the angular matcher and
+--known-poses work on it like on a real scan. The pipeline runs once per
+projection count and thread setting, each run gets its profile (see
+profiling.py) and all stages end up in one results.csv.
+
+    python benchmark.py --counts 12 24 48 --threads 1 4 8
+"""
+import argparse, csv, os, shutil, time, json
+import numpy as np
+from PIL import Image
+import profiling
+from reconstruction import run_colmap_pipeline, run_openmvs_pipeline
+from recon_profiles import PROFILE_NAMES, DEFAULT_PROFILE
+
+WIDTH, HEIGHT, FOCAL = 640, 480, 600.0
+DISTANCE, RADIUS = 4.0, 1.0
+
+
+def make_texture(seed: int = 0, size=(1024, 512)) -> np.ndarray:
+    """ Multi-scale noise plus dots, enough corners for SIFT everywhere on the sphere. """
+    rng = np.random.default_rng(seed)
+    texture = np.zeros(size[::-1], dtype=np.float32)
+    for cells, weight in ((16, 0.5), (64, 0.3), (256, 0.2)):
+        noise = Image.fromarray((rng.random((cells // 2, cells)) * 255).astype(np.uint8))
+        texture += weight * np.asarray(noise.resize(size, Image.BICUBIC), dtype=np.float32)
+    for x, y in zip(rng.integers(0, size[0], 400), rng.integers(0, size[1], 400)):
+        texture[max(0, y - 3):y + 3, max(0, x - 3):x + 3] = rng.choice((20.0, 235.0))
+    return texture
+
+
+def render_turntable(angle: float, texture: np.ndarray) -> np.ndarray:
+    """
+    8-bit view of the sphere turned by `angle` degrees. The camera looks down +z
+    at the rotation axis DISTANCE away, as in turntable_pose().
+    """
+    v, u = np.mgrid[0:HEIGHT, 0:WIDTH].astype(np.float64)
+    rays = np.stack([(u - WIDTH / 2) / FOCAL, (v - HEIGHT / 2) / FOCAL, np.ones_like(u)], axis=-1)
+    rays /= np.linalg.norm(rays, axis=-1, keepdims=True)
+
+    # Ray / sphere centred at (0, 0, DISTANCE)
+    b = rays[..., 2] * DISTANCE
+    disc = b ** 2 - (DISTANCE ** 2 - RADIUS ** 2)
+    hit = disc > 0
+    depth = np.where(hit, b - np.sqrt(np.maximum(disc, 0)), 0)
+    points = rays * depth[..., None] - np.array([0.0, 0.0, DISTANCE])
+
+    # Camera -> object frame: undo the rotation about y
+    a = np.deg2rad(angle)
+    x = np.cos(a) * points[..., 0] - np.sin(a) * points[..., 2]
+    z = np.sin(a) * points[..., 0] + np.cos(a) * points[..., 2]
+    y = points[..., 1]
+    th, tw = texture.shape
+    tu = ((np.arctan2(x, z) / (2 * np.pi) + 0.5) * (tw - 1)).astype(int)
+    tv = ((np.arcsin(np.clip(y / RADIUS, -1, 1)) / np.pi + 0.5) * (th - 1)).astype(int)
+
+    shade = np.clip(-(points * rays).sum(axis=-1) / RADIUS, 0.2, 1.0)   # Head-on light
+    image = np.where(hit, texture[tv, tu] * shade, 30.0)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def make_dataset(root: str, count: int, seed: int = 0) -> str:
+    """ <root>/turntable_<count>/images_png with `count` views over 360°, rendered once. """
+    scan_dir = os.path.join(root, f"turntable_{count}")
+    image_dir = os.path.join(scan_dir, "images_png")
+    if os.path.isdir(image_dir) and len(os.listdir(image_dir)) == count:
+        return image_dir
+
+    os.makedirs(image_dir, exist_ok=True)
+    texture = make_texture(seed)
+    for i, angle in enumerate(np.linspace(0, 360, count, endpoint=False)):
+        name = f"scan_benchmark_pos_{i}_shot_angle_{angle}_{i}.png"
+        Image.fromarray(render_turntable(angle, texture)).save(os.path.join(image_dir, name))
+
+    with open(os.path.join(scan_dir, "intrinsics.json"), "w") as f:
+        json.dump({"model": "SIMPLE_PINHOLE", "width": WIDTH, "height": HEIGHT,
+                   "params": [FOCAL, WIDTH / 2, HEIGHT / 2], "distance": DISTANCE, "direction": 1}, f)
+    print(f"✓ Rendered {count} views into {image_dir}")
+    return image_dir
+
+
+def run_case(image_dir: str, run_dir: str, count: int, threads: int, args) -> dict:
+    """ One pipeline run in a fresh workspace, returns its profile report. """
+    workspace_dir = os.path.join(run_dir, "workspace")
+    shutil.rmtree(workspace_dir, ignore_errors=True)
+    intrinsics = os.path.join(os.path.dirname(image_dir), "intrinsics.json") if args.known_poses else None
+
+    profiler = profiling.reset(benchmark=True, num_images=count, threads=threads, matcher=args.matcher,
+                               known_poses=bool(intrinsics), profile=args.profile)
+    status = "succeeded"
+    try:
+        run_colmap_pipeline(image_dir, workspace_dir, colmap_path=args.colmap, force=True, matcher=args.matcher,
+                            intrinsics_path=intrinsics, threads=threads, profile=args.profile)
+        if args.mvs:
+            run_openmvs_pipeline(run_dir, image_dir, workspace_dir, args.mvs, os.path.basename(run_dir),
+                                 force=True, threads=threads, profile=args.profile)
+    except Exception as e:
+        print(f"--Run with {count} images, {threads} threads failed: {e}")
+        status = "failed"
+    profiler.meta["status"] = status
+    profiler.save(os.path.join(run_dir, "profile.json"))
+    print(profiler.summary())
+    return profiler.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruction benchmark on a synthetic turntable dataset")
+    parser.add_argument("--counts", type=int, nargs="+", default=[12, 24, 48], help="projections per dataset")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4], help="thread settings to compare")
+    parser.add_argument("--out", default="/tmp/bolt_benchmark")
+    parser.add_argument("--matcher", choices=["angular", "exhaustive"], default="angular")
+    parser.add_argument("--profile", choices=PROFILE_NAMES, default=DEFAULT_PROFILE)
+    parser.add_argument("--known-poses", action="store_true", help="use the dataset's exact intrinsics instead of the mapper")
+    parser.add_argument("--colmap", default="colmap")
+    parser.add_argument("--mvs", metavar="OPENMVS_BIN_DIR", default=None, help="also run the OpenMVS stages")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = []
+    for count in args.counts:
+        image_dir = make_dataset(os.path.join(args.out, "data"), count, args.seed)
+        for threads in args.threads:
+            print(f"\n--- {count} projections, {threads} threads ---")
+            run_dir = os.path.join(args.out, "runs", f"n{count}_t{threads}")
+            t0 = time.time()
+            report = run_case(image_dir, run_dir, count, threads, args)
+            for stage in report["stages"]:
+                rows.append({"count": count, "threads": threads, "status": report["meta"]["status"],
+                             "stage": stage["stage"], "wall": round(stage["wall"], 3),
+                             "cpu": round(stage.get("cpu_user", 0) + stage.get("cpu_sys", 0), 3),
+                             "peak_rss_mb": round(stage.get("peak_rss_mb", 0), 1),
+                             "read_bytes": stage.get("read_bytes", 0), "write_bytes": stage.get("write_bytes", 0)})
+            rows.append({"count": count, "threads": threads, "status": report["meta"]["status"], "stage": "total",
+                         "wall": round(time.time() - t0, 3)})
+
+    results_path = os.path.join(args.out, "results.csv")
+    with open(results_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["count", "threads", "status", "stage", "wall", "cpu", "peak_rss_mb",
+                                               "read_bytes", "write_bytes"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"\n{'count':>6} {'threads':>7} {'total s':>8}  stages")
+    for row in rows:
+        if row["stage"] == "total":
+            stages = [r for r in rows if r["count"] == row["count"] and r["threads"] == row["threads"] and r["stage"] != "total"]
+            print(f"{row['count']:>6} {row['threads']:>7} {row['wall']:>8.2f}  " +
+                  ", ".join(f"{r['stage']} {r['wall']:.1f}s" for r in stages))
+    print(f"\nResults saved at {results_path}")
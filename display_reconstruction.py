@@ -1,9 +1,17 @@
 import open3d as o3d
-import sys
+import argparse
+from mesh_preview import preview_dir, render_previews
+import os
 
 def window(folder):
     mesh = o3d.io.read_triangle_mesh(folder)
-    mesh.compute_vertex_normals()
+    if mesh.has_triangles():
+        #Decimated levels (mesh_lod.py) come with their normals
+        if not mesh.has_vertex_normals():
+            mesh.compute_vertex_normals()
+    else:
+        #Sparse quick-look models are point clouds only
+        mesh = o3d.io.read_point_cloud(folder)
 
     vis = o3d.visualization.Visualizer()
     vis.create_window(window_name="Custom Background", width=1280, height=720)
@@ -17,6 +25,19 @@ def window(folder):
     vis.destroy_window()
 
 if __name__ == "__main__":
-    reconstruction_folder = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Show a reconstruction, in a window or as rendered previews")
+    parser.add_argument("reconstruction_file")
+    parser.add_argument("--headless", action="store_true", help="render turntable snapshots and a .glb instead of opening a window")
+    parser.add_argument("--views", type=int, default=8)
+    parser.add_argument("--force", action="store_true", help="render again even if the cached previews are current")
+    args = parser.parse_args()
 
-    window(reconstruction_folder)
+    if args.headless:
+        #Scan folder is three levels up from workspace/dense/<mesh>.ply
+        scan_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(args.reconstruction_file))))
+        manifest = render_previews(args.reconstruction_file, preview_dir(scan_dir, args.reconstruction_file),
+                                   views=args.views, force=args.force)
+        print(f"Contact sheet: {manifest['contact_sheet']}")
+        print(f"Web mesh: {manifest['web_mesh']}")
+    else:
+        window(args.reconstruction_file)
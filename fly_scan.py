@@ -0,0 +1,234 @@
+"""
+Fly scan: the rotation stage moves at constant velocity while the camera
+free-runs (internal trigger) or is fired by the motion controller's
+position-compare output (external trigger). Every frame is tagged with the
+motor readback at mid-exposure, interpolated from the readback monitor.
+
+Only frames exposed entirely while the stage crossed [start, end] are
+kept. Frames taken during run-up and deceleration, and files without a
+matching frame tag, are moved to rejected/ so they never reach COLMAP.
+
+Run `python fly_scan.py --sim` to try it against the simulated devices.
+"""
+import argparse, csv, glob, os, re, tempfile, threading, time
+from datetime import datetime
+import numpy as np
+import bluesky.plan_stubs as bps
+import progress
+
+MOTOR_TO_DEGREES = 2.8125
+
+
+class FrameTagger:
+    """ Collects frame and motor readback monitor updates with their EPICS timestamps. """
+
+    def __init__(self, frame_counter, readback):
+        self.frame_counter = frame_counter
+        self.readback = readback
+        self._lock = threading.Lock()
+        self._frames = []       # (counter value, timestamp)
+        self._readbacks = []    # (timestamp, position)
+        self._cids = []
+
+    def _on_frame(self, value=None, timestamp=None, **kwargs):
+        with self._lock:
+            self._frames.append((value, timestamp))
+
+    def _on_readback(self, value=None, timestamp=None, **kwargs):
+        with self._lock:
+            self._readbacks.append((timestamp, value))
+
+    def start(self):
+        self._readbacks.append((self.readback.timestamp, self.readback.get()))
+        self._cids = [
+            (self.frame_counter, self.frame_counter.subscribe(self._on_frame, run=False)),
+            (self.readback, self.readback.subscribe(self._on_readback, run=False)),
+        ]
+
+    def stop(self):
+        for signal, cid in self._cids:
+            signal.unsubscribe(cid)
+        self._cids = []
+        self._readbacks.append((self.readback.timestamp, self.readback.get()))
+
+    def tags(self, exposure: float):
+        """ List of (counter, frame timestamp, motor readback at mid-exposure). """
+        with self._lock:
+            frames = list(self._frames)
+            readbacks = sorted(self._readbacks)
+        if not frames:
+            return []
+        rb_t = np.array([t for t, _ in readbacks])
+        rb_v = np.array([v for _, v in readbacks])
+        # The counter updates when the frame is read out, the exposure started `exposure` earlier
+        mid = np.array([t for _, t in frames]) - exposure / 2
+        positions = np.interp(mid, rb_t, rb_v)
+        return [(c, t, float(p)) for (c, t), p in zip(frames, positions)]
+
+    def window(self, start_pos: float, end_pos: float):
+        """ (time, time) the readback crossed start_pos and end_pos, the constant-velocity part of the move. """
+        with self._lock:
+            readbacks = sorted(self._readbacks)
+        direction = 1 if end_pos >= start_pos else -1
+        rb_t = np.array([t for t, _ in readbacks])
+        # Monotonic along the direction of travel, as np.interp needs
+        rb_v = np.maximum.accumulate(direction * np.array([v for _, v in readbacks]))
+        return tuple(float(np.interp(direction * p, rb_v, rb_t)) for p in (start_pos, end_pos))
+
+
+def _frame_files(save_dir: str, name: str) -> dict:
+    """ {file number: path} of the files written by the TIFF plugin for `name`. """
+    pattern = re.compile(re.escape(name) + r"_(\d+)\.tiff$")
+    files = {}
+    for path in glob.glob(os.path.join(save_dir, f"{glob.escape(name)}_*.tiff")):
+        match = pattern.search(os.path.basename(path))
+        if match:
+            files[int(match.group(1))] = path
+    return files
+
+
+def _reject(path: str, save_dir: str):
+    rejected_dir = os.path.join(save_dir, "rejected")
+    os.makedirs(rejected_dir, exist_ok=True)
+    os.replace(path, os.path.join(rejected_dir, os.path.basename(path)))
+
+
+def finalize_fly_frames(save_dir: str, name: str, timestamp: str, tags, metadata_path: str, window=None,
+                        exposure: float = 0.0, first_counter: int = 1, timeout: float = 5.0):
+    """
+    Rename the fly frames to the step scan naming scheme (angle in the file name)
+    and write one CSV row per frame with its motor readback.
+
+    A tag's file is the one numbered counter - first_counter (the camera
+    counter and the file number are both reset when the fly scan starts).
+    With window=(t0, t1), frames whose exposure isn't entirely inside it
+    are rejected like files that have no tag.
+    """
+    expected = {counter - first_counter for counter, _, _ in tags}
+    # The plugin queue may still be flushing after acquisition stops
+    deadline = time.monotonic() + timeout
+    files = _frame_files(save_dir, name)
+    while not expected.issubset(files) and time.monotonic() < deadline:
+        time.sleep(0.1)
+        files = _frame_files(save_dir, name)
+
+    missing = sorted(expected - set(files))
+    if missing:
+        print(f"--Warning: {len(missing)} tagged frames have no file (first: number {missing[0]})")
+
+    rows, outside = [], 0
+    for counter, frame_time, readback in tags:
+        path = files.pop(counter - first_counter, None)
+        if path is None:
+            continue
+        if window is not None and not (window[0] <= frame_time - exposure and frame_time <= window[1]):
+            # Run-up or deceleration, not constant velocity
+            _reject(path, save_dir)
+            outside += 1
+            continue
+        i = len(rows)
+        angle = readback * MOTOR_TO_DEGREES
+        new_path = os.path.join(save_dir, f"scan_{timestamp}_pos_{i}_shot_angle_{angle}_{counter - first_counter}.tiff")
+        os.replace(path, new_path)
+        rows.append({"index": i, "file": os.path.basename(new_path), "frame_counter": counter,
+                     "timestamp": frame_time, "motor_readback": readback, "angle": angle})
+    for path in files.values():
+        _reject(path, save_dir)
+    if outside or files:
+        print(f"Moved {outside} frames outside the constant-velocity window and {len(files)} untagged files "
+              f"to {os.path.join(save_dir, 'rejected')}")
+
+    with open(metadata_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["index", "file", "frame_counter", "timestamp", "motor_readback", "angle"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    for row in rows:
+        progress.emit("projection", index=row["index"], total=len(rows), angle=row["angle"],
+                      file=os.path.join(save_dir, row["file"]))
+    print(f"✓ {len(rows)} fly frames tagged, metadata saved at {metadata_path}")
+    return rows
+
+
+def fly_scan(motor, camera, start_pos, end_pos, velocity, frame_period, exposure, save_dir,
+             trigger="internal", metadata_path=None):
+    """
+    Continuous rotation from start_pos to end_pos (motor units) at `velocity`
+    motor units/s, with the camera acquiring every `frame_period` seconds.
+
+    The camera TIFF file path must already point at save_dir. With
+    trigger="external" the camera waits for the controller's position-compare
+    pulses, which have to be configured on the controller for this velocity.
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    name = f"scan_{timestamp}_fly"
+    metadata_path = metadata_path or os.path.join(save_dir, "fly_frames.csv")
+
+    direction = 1 if end_pos >= start_pos else -1
+    runup = velocity * motor.acceleration.get()     # Distance needed to reach constant velocity
+    old_velocity = motor.velocity.get()
+
+    yield from bps.open_run()
+
+    print("\n--- Staging camera ---")
+    yield from bps.stage(camera)
+
+    print(f"Moving to run-up position {start_pos - direction * runup}")
+    yield from bps.mv(motor, start_pos - direction * runup)
+    yield from bps.mv(motor.velocity, velocity)
+
+    yield from bps.mv(camera.cam.acquire_time, exposure,
+                      camera.cam.acquire_period, frame_period,
+                      camera.cam.image_mode, 2,                     # continuous
+                      camera.cam.trigger_mode, 0 if trigger == "internal" else 1)
+    yield from bps.mv(camera.tiff.file_name, name,
+                      camera.tiff.file_number, 0,
+                      camera.tiff.auto_increment, 1)
+    # Frame n (counter value n) is then file number n - 1
+    yield from bps.mv(camera.cam.array_counter, 0)
+
+    tagger = FrameTagger(camera.cam.array_counter, motor.user_readback)
+    tagger.start()
+
+    print(f"Flying to {end_pos + direction * runup} at {velocity} units/s, frame period {frame_period}s")
+    yield from bps.abs_set(camera.cam.acquire, 1)
+    yield from bps.mv(motor, end_pos + direction * runup)
+    yield from bps.abs_set(camera.cam.acquire, 0, wait=True)
+
+    tagger.stop()
+    yield from bps.mv(motor.velocity, old_velocity)
+
+    print("\n--- Unstaging camera ---")
+    yield from bps.unstage(camera)
+
+    finalize_fly_frames(save_dir, name, timestamp, tagger.tags(exposure), metadata_path,
+                        window=tagger.window(start_pos, end_pos), exposure=exposure)
+
+    yield from bps.close_run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fly scan against the simulated motor and camera")
+    parser.add_argument("--sim", action="store_true", required=True, help="use the simulated backend")
+    parser.add_argument("--start", type=float, default=0.0)
+    parser.add_argument("--end", type=float, default=32.0)
+    parser.add_argument("--velocity", type=float, default=16.0, help="motor units per second")
+    parser.add_argument("--frame-period", type=float, default=0.05)
+    parser.add_argument("--exposure", type=float, default=0.02)
+    parser.add_argument("--save-dir", default=None)
+    args = parser.parse_args()
+
+    from bluesky import RunEngine
+    from sim_devices import SimCamera, SimRotationMotor
+
+    save_dir = args.save_dir or tempfile.mkdtemp(prefix="fly_scan_")
+    os.makedirs(save_dir, exist_ok=True)
+
+    motor = SimRotationMotor(name="motor")
+    camera = SimCamera(name="camera", motor=motor)
+    camera.tiff.file_path.put(os.path.join(save_dir, ""))
+
+    t0 = time.time()
+    RunEngine({})(fly_scan(motor, camera, args.start, args.end, args.velocity,
+                           args.frame_period, args.exposure, save_dir))
+    print(f"Fly scan finished in {time.time() - t0:.2f}s, frames in {save_dir}")
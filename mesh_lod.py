@@ -0,0 +1,51 @@
+"""
+Levels of detail of the reconstructed mesh.
+
+ReconstructMesh writes scene_dense_mesh.ply at full resolution. write_lods()
+decimates it (quadric error) to fixed face counts, each level from the one
+above it, and saves every level as binary PLY with vertex normals so
+viewers don't recompute them. TextureMesh then textures the level the
+profile asks for instead of always the full mesh.
+"""
+import json, os, time
+
+try:
+    import open3d as o3d
+except ImportError:  # Without it the full mesh is textured
+    o3d = None
+
+FULL_MESH = "scene_dense_mesh.ply"
+LOD_NAMES = ("full", "mid", "low")
+LOD_TARGETS = {"mid": 300_000, "low": 75_000}     # Faces per level
+
+
+def lod_file(level: str) -> str:
+    """ Mesh file name of a level, relative to the dense folder. """
+    if level not in LOD_NAMES:
+        raise ValueError(f"Unknown level of detail {level}, expected one of {LOD_NAMES}")
+    return FULL_MESH if level == "full" else f"scene_dense_mesh_{level}.ply"
+
+
+def write_lods(dense_dir: str, targets: dict = LOD_TARGETS) -> dict:
+    """ Decimated levels of <dense_dir>/scene_dense_mesh.ply, returns {level: faces} (also saved as lods.json). """
+    if o3d is None:
+        raise RuntimeError("open3d is not installed, can't decimate the mesh")
+    t0 = time.time()
+    mesh = o3d.io.read_triangle_mesh(os.path.join(dense_dir, FULL_MESH))
+    faces = {"full": len(mesh.triangles)}
+
+    # Largest target first, each level decimates the previous one, not the full mesh again
+    for level, target in sorted(targets.items(), key=lambda item: -item[1]):
+        if len(mesh.triangles) > target:
+            mesh = mesh.simplify_quadric_decimation(target_number_of_triangles=target)
+            mesh.remove_unreferenced_vertices()
+        mesh.compute_vertex_normals()
+        out_path = os.path.join(dense_dir, lod_file(level))
+        if not o3d.io.write_triangle_mesh(out_path, mesh, write_ascii=False):
+            raise RuntimeError(f"Could not write {out_path}")
+        faces[level] = len(mesh.triangles)
+        print(f"✓ {level}: {faces[level]} faces")
+
+    with open(os.path.join(dense_dir, "lods.json"), "w") as f:
+        json.dump({"faces": faces, "targets": targets, "duration": time.time() - t0}, f, indent=2)
+    return faces
@@ -0,0 +1,221 @@
+"""
+Headless previews of a reconstruction.
+
+Turntable snapshots and a decimated glTF (.glb) of the scan's mesh, written
+once to <scan>/previews/reconstruction/<mesh>/ and served from there as long
+as the mesh is unchanged, so the agent and the API never open a window.
+
+Snapshots come from a small numpy z-buffer that splats points sampled on
+the mesh, which needs no display or GPU. With BOLT_RENDERER=open3d they
+are rendered by Open3D's OffscreenRenderer instead (needs EGL or OSMesa).
+"""
+import json, os, time
+import numpy as np
+from PIL import Image
+
+try:
+    import open3d as o3d
+except ImportError:  # Only needed to read meshes, not to serve cached previews
+    o3d = None
+
+RENDERER = os.environ.get("BOLT_RENDERER", "software")
+PREVIEW_DIR = os.path.join("previews", "reconstruction")
+# Best model first: textured mesh, untextured mesh, quick-look point cloud
+MODEL_FILES = (
+    os.path.join("workspace", "dense", "scene_texture.ply"),
+    os.path.join("workspace", "dense", "scene_dense_mesh.ply"),
+    os.path.join("workspace", "quicklook", "quicklook.ply"),
+)
+BACKGROUND = (26, 26, 26)
+
+
+def find_model(scan_dir: str):
+    """ Path of the best reconstruction of a scan, None when there is none. """
+    for name in MODEL_FILES:
+        path = os.path.join(scan_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def preview_dir(scan_dir: str, model_path: str) -> str:
+    return os.path.join(scan_dir, PREVIEW_DIR, os.path.splitext(os.path.basename(model_path))[0])
+
+
+def load_geometry(model_path: str):
+    """ Triangle mesh, or point cloud for models without faces (quick look). """
+    if o3d is None:
+        raise RuntimeError("open3d is not installed, can't read " + model_path)
+    mesh = o3d.io.read_triangle_mesh(model_path)
+    if mesh.has_triangles():
+        if not mesh.has_vertex_normals():
+            mesh.compute_vertex_normals()
+        return mesh
+    return o3d.io.read_point_cloud(model_path)
+
+
+def orbit_eyes(center, extent: float, views: int, elevation: float = 20.0):
+    """ Camera positions around the y axis through center, which is the turntable axis in scan models. """
+    radius = 1.4 * extent
+    el = np.deg2rad(elevation)
+    eyes = []
+    for az in np.linspace(0, 2 * np.pi, views, endpoint=False):
+        offset = radius * np.array([np.cos(el) * np.sin(az), -np.sin(el), np.cos(el) * np.cos(az)])
+        eyes.append(center + offset)
+    return eyes
+
+
+def _surface_points(geometry, count: int):
+    """ (points, colors, normals) sampled on the surface, or the cloud itself. """
+    if isinstance(geometry, o3d.geometry.TriangleMesh):
+        cloud = geometry.sample_points_uniformly(number_of_points=count)
+    else:
+        cloud = geometry
+    points = np.asarray(cloud.points)
+    colors = np.asarray(cloud.colors) if cloud.has_colors() else np.full_like(points, 0.75)
+    normals = np.asarray(cloud.normals) if cloud.has_normals() else None
+    return points, colors, normals
+
+
+def splat(points, colors, normals, eye, center, size=(800, 600), fov: float = 40.0) -> np.ndarray:
+    """ 8-bit RGB image of the points seen from eye, nearest point per pixel, headlight shading. """
+    width, height = size
+    forward = (center - eye) / np.linalg.norm(center - eye)
+    right = np.cross(forward, [0.0, -1.0, 0.0])
+    right /= np.linalg.norm(right)
+    down = np.cross(forward, right)
+
+    rel = points - eye
+    z = rel @ forward
+    focal = 0.5 * height / np.tan(np.deg2rad(fov) / 2)
+    u = np.round(focal * (rel @ right) / np.maximum(z, 1e-9) + width / 2).astype(np.int64)
+    v = np.round(focal * (rel @ down) / np.maximum(z, 1e-9) + height / 2).astype(np.int64)
+    visible = (z > 0) & (u >= 0) & (u < width) & (v >= 0) & (v < height)
+
+    shade = np.ones(len(points))
+    if normals is not None:
+        shade = 0.25 + 0.75 * np.abs(np.sum(normals * forward, axis=1))
+    rgb = np.clip(colors * shade[:, None] * 255, 0, 255)
+
+    # Nearest point per pixel: sort by pixel then depth, keep the first of each pixel
+    pixel = (v * width + u)[visible]
+    order = np.lexsort((z[visible], pixel))
+    pixel, first = np.unique(pixel[order], return_index=True)
+    image = np.empty((height * width, 3), dtype=np.float64)
+    image[:] = BACKGROUND
+    image[pixel] = rgb[visible][order[first]]
+    image = image.reshape(height, width, 3)
+
+    # Close the pinholes between samples with their neighbours
+    hit = np.zeros(height * width, dtype=bool)
+    hit[pixel] = True
+    hit = hit.reshape(height, width)
+    filled = image.copy()
+    for dy, dx in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+        neighbour = np.roll(hit, (dy, dx), axis=(0, 1))
+        take = ~hit & neighbour
+        filled[take] = np.roll(image, (dy, dx), axis=(0, 1))[take]
+    return filled.astype(np.uint8)
+
+
+def render_views(geometry, eyes, center, size=(800, 600)):
+    """ One image per eye, with the configured renderer. """
+    if RENDERER == "open3d":
+        from open3d.visualization import rendering
+        renderer = rendering.OffscreenRenderer(*size)
+        material = rendering.MaterialRecord()
+        material.shader = "defaultLit" if isinstance(geometry, o3d.geometry.TriangleMesh) else "defaultUnlit"
+        renderer.scene.add_geometry("model", geometry, material)
+        renderer.scene.set_background([c / 255 for c in BACKGROUND] + [1.0])
+        images = []
+        for eye in eyes:
+            renderer.setup_camera(40.0, center, eye, [0.0, -1.0, 0.0])
+            images.append(np.asarray(renderer.render_to_image()))
+        return images
+
+    points, colors, normals = _surface_points(geometry, count=3 * size[0] * size[1])
+    return [splat(points, colors, normals, eye, center, size) for eye in eyes]
+
+
+def contact_sheet(images, columns: int = 4) -> Image.Image:
+    rows = (len(images) + columns - 1) // columns
+    h, w = images[0].shape[:2]
+    sheet = Image.new("RGB", (columns * w, rows * h), BACKGROUND)
+    for i, image in enumerate(images):
+        sheet.paste(Image.fromarray(image), ((i % columns) * w, (i // columns) * h))
+    return sheet
+
+
+def export_web_mesh(geometry, out_path: str, target_triangles: int = 100_000) -> str:
+    """ Decimated binary glTF for web viewers; textures don't survive decimation, vertex colours do. """
+    mesh = geometry
+    if len(mesh.triangles) > target_triangles:
+        mesh = mesh.simplify_quadric_decimation(target_number_of_triangles=target_triangles)
+        mesh.compute_vertex_normals()
+    if not o3d.io.write_triangle_mesh(out_path, mesh):
+        raise RuntimeError(f"Could not write {out_path}")
+    return out_path
+
+
+def _source_stamp(model_path: str) -> dict:
+    stat = os.stat(model_path)
+    return {"model": model_path, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def load_manifest(out_dir: str):
+    path = os.path.join(out_dir, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def render_previews(model_path: str, out_dir: str, views: int = 8, size=(800, 600), web_mesh: bool = True,
+                    force: bool = False) -> dict:
+    """
+    Turntable snapshots, contact sheet and glTF of a model, rendered only if
+    the model changed since the last time. Returns the manifest.
+    """
+    manifest = load_manifest(out_dir)
+    stamp = _source_stamp(model_path)
+    if not force and manifest and all(manifest.get(k) == v for k, v in stamp.items()) \
+            and manifest["views"] == views and manifest["size"] == list(size):
+        return manifest
+
+    t0 = time.time()
+    os.makedirs(out_dir, exist_ok=True)
+    geometry = load_geometry(model_path)
+    bounds = geometry.get_axis_aligned_bounding_box()
+    center = bounds.get_center()
+    extent = float(np.linalg.norm(bounds.get_extent())) or 1.0
+
+    images = render_views(geometry, orbit_eyes(center, extent, views), center, size)
+    view_files = []
+    for i, image in enumerate(images):
+        path = os.path.join(out_dir, f"view_{i:03d}.png")
+        Image.fromarray(image).save(path)
+        view_files.append(path)
+    sheet_path = os.path.join(out_dir, "contact.png")
+    contact_sheet(images).save(sheet_path)
+
+    mesh_path = None
+    if web_mesh and isinstance(geometry, o3d.geometry.TriangleMesh):
+        mesh_path = export_web_mesh(geometry, os.path.join(out_dir, "model.glb"))
+
+    manifest = dict(stamp, views=views, size=list(size), renderer=RENDERER, view_files=view_files,
+                    contact_sheet=sheet_path, web_mesh=mesh_path, render_time=time.time() - t0)
+    # Written last: a manifest means every file it lists is complete
+    tmp_path = os.path.join(out_dir, "manifest.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, "manifest.json"))
+    print(f"✓ Rendered {views} views of {model_path} in {manifest['render_time']:.1f}s")
+    return manifest
+
+
+def scan_previews(scan_dir: str, **kwargs) -> dict:
+    """ Previews of the best model of a scan, from the cache when it is current. """
+    model_path = find_model(scan_dir)
+    if model_path is None:
+        raise FileNotFoundError(f"No reconstruction in {scan_dir}")
+    return render_previews(model_path, preview_dir(scan_dir, model_path), **kwargs)
@@ -0,0 +1,143 @@
+"""
+Per-stage resource profile of the reconstruction pipeline.
+
+Every COLMAP/OpenMVS child goes through run(), which reaps it with wait4
+to get that child's own CPU time and peak RSS, and samples
+/proc/<pid>/io while it runs for the bytes it read and wrote. Processes
+are attributed to the stage that StageCache is running, and the whole run
+is saved as one JSON report.
+"""
+import json, os, platform, subprocess, sys, time
+from contextlib import contextmanager
+
+
+def _read_io(pid: int):
+    """ /proc/<pid>/io as a dict, None where it is not available (not Linux, process gone). """
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            return {key: int(value) for key, value in (line.split(":") for line in f)}
+    except (OSError, ValueError):
+        return None
+
+
+def _label(args) -> str:
+    """ colmap feature_extractor -> "colmap feature_extractor", /path/DensifyPointCloud -> "DensifyPointCloud" """
+    name = os.path.basename(str(args[0]))
+    if name == "colmap" and len(args) > 1:
+        return f"{name} {args[1]}"
+    return name
+
+
+class Profiler:
+    """ Collects the stages and child processes of one pipeline run. """
+
+    def __init__(self, **meta):
+        self.meta = dict(meta, started=time.time(), host=platform.node(), cpu_count=os.cpu_count(),
+                         python=sys.version.split()[0])
+        self.stages = []
+        self._stage = None
+
+    @contextmanager
+    def stage(self, name: str):
+        entry = {"stage": name, "status": "running", "wall": 0.0, "processes": []}
+        self.stages.append(entry)
+        previous, self._stage = self._stage, entry
+        t0 = time.perf_counter()
+        try:
+            yield entry
+            entry["status"] = "done"
+        except BaseException:
+            entry["status"] = "failed"
+            raise
+        finally:
+            entry["wall"] = time.perf_counter() - t0
+            self._stage = previous
+            self._summarize(entry)
+
+    def skipped(self, name: str):
+        self.stages.append({"stage": name, "status": "skipped", "wall": 0.0, "processes": []})
+
+    @staticmethod
+    def _summarize(entry: dict):
+        processes = entry["processes"]
+        entry["cpu_user"] = sum(p["cpu_user"] for p in processes)
+        entry["cpu_sys"] = sum(p["cpu_sys"] for p in processes)
+        entry["peak_rss_mb"] = max((p["peak_rss_mb"] for p in processes), default=0.0)
+        for key in ("read_bytes", "write_bytes", "rchar", "wchar"):
+            entry[key] = sum(p.get(key) or 0 for p in processes)
+
+    def run(self, args, check: bool = False, cwd: str = None, poll_interval: float = 0.05):
+        """ subprocess.run() replacement that records the child's resource use. """
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(args, cwd=cwd)
+        io = None
+        while True:
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                break
+            io = _read_io(proc.pid) or io       # Last sample before exit
+            time.sleep(poll_interval)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+        record = {
+            "process": _label(args), "args": [str(a) for a in args], "returncode": proc.returncode,
+            "wall": time.perf_counter() - t0, "cpu_user": usage.ru_utime, "cpu_sys": usage.ru_stime,
+            # ru_maxrss is in KiB on Linux, bytes on macOS
+            "peak_rss_mb": usage.ru_maxrss / (1024 if sys.platform != "darwin" else 1024 * 1024),
+        }
+        if io:
+            record.update(read_bytes=io.get("read_bytes"), write_bytes=io.get("write_bytes"),
+                          rchar=io.get("rchar"), wchar=io.get("wchar"))
+        else:
+            # Block counts from rusage, 512 byte units
+            record.update(read_bytes=usage.ru_inblock * 512, write_bytes=usage.ru_oublock * 512)
+        if self._stage is not None:
+            self._stage["processes"].append(record)
+        else:
+            self.stages.append({"stage": record["process"], "status": "done", "wall": record["wall"],
+                                "processes": [record]})
+            self._summarize(self.stages[-1])
+
+        if check and proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, args)
+        return subprocess.CompletedProcess(args, proc.returncode)
+
+    def report(self) -> dict:
+        return {"meta": dict(self.meta, finished=time.time()), "stages": self.stages,
+                "total_wall": sum(s["wall"] for s in self.stages)}
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<20} {'status':<8} {'wall s':>8} {'cpu s':>8} {'rss MB':>8} {'read MB':>9} {'write MB':>9}"]
+        for s in self.stages:
+            cpu = s.get("cpu_user", 0.0) + s.get("cpu_sys", 0.0)
+            lines.append(f"{s['stage']:<20} {s['status']:<8} {s['wall']:>8.2f} {cpu:>8.2f} {s.get('peak_rss_mb', 0.0):>8.1f} "
+                         f"{s.get('read_bytes', 0) / 1e6:>9.1f} {s.get('write_bytes', 0) / 1e6:>9.1f}")
+        return "\n".join(lines)
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+
+current = Profiler()
+
+
+def reset(**meta) -> Profiler:
+    """ Start a new run, returns its profiler. """
+    global current
+    current = Profiler(**meta)
+    return current
+
+
+def run(args, check: bool = False, cwd: str = None):
+    return current.run(args, check=check, cwd=cwd)
+
+
+def stage(name: str):
+    return current.stage(name)
+
+
+def skipped(name: str):
+    current.skipped(name)
@@ -0,0 +1,59 @@
+"""
+Structured progress events on stdout.
+
+Scan and reconstruction scripts print one line per event, e.g.
+
+    @progress {"event": "projection", "index": 3, "total": 36, "angle": 30.0, "time": ...}
+
+so whoever runs them as a subprocess (the API job runner) can follow
+progress without scraping the human-readable output. run() does that for
+one-off callers: events go to a callback as they arrive and only the tail
+of the rest of the output is kept.
+"""
+import json, subprocess, time
+from collections import deque
+
+PREFIX = "@progress "
+# Stages reported by reconstruction.py, used to turn stage events into a fraction done
+RECONSTRUCTION_STAGES = 9
+
+
+def emit(event: str, **fields):
+    """ Print one progress event. """
+    print(PREFIX + json.dumps({"event": event, "time": time.time(), **fields}, default=str), flush=True)
+
+
+def parse(line: str):
+    """ The event dict for a progress line, None for any other output. """
+    if not line.startswith(PREFIX):
+        return None
+    try:
+        return json.loads(line[len(PREFIX):])
+    except ValueError:
+        return None
+
+
+def run(command: list, on_event=None, on_line=None, cwd: str = None, tail: int = 200):
+    """
+    Run command with stdout and stderr merged, read line by line. Progress
+    events go to on_event(event), other lines to on_line(line) and into a
+    bounded tail. Returns (returncode, tail lines).
+    """
+    lines = deque(maxlen=tail)
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, bufsize=1)
+    try:
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            event = parse(line)
+            if event is None:
+                lines.append(line)
+                if on_line is not None:
+                    on_line(line)
+            elif on_event is not None:
+                on_event(event)
+    finally:
+        # When a callback raised the child gets EPIPE on its next line instead of blocking on a full pipe
+        process.stdout.close()
+        returncode = process.wait()
+    return returncode, list(lines)
@@ -0,0 +1,281 @@
+"""
+Quick-look sparse reconstruction while a scan is running.
+
+Every `stride`-th projection (by position index) goes into a separate
+low-resolution COLMAP workspace, <scan>/workspace/quicklook. Once
+`min_images` of them exist the mapper builds a first model; projections
+arriving after that are extracted, matched against their angular neighbours
+and added with image_registrator + point_triangulator instead of mapping
+everything again. After each update the model is exported as
+quicklook.ply, and status.json says how many projections it holds.
+
+The quick look never touches <scan>/workspace itself, so the full
+reconstruction afterwards is unaffected.
+
+    python progressive_recon.py <scan_name> --stride 8 --expected 128
+"""
+import argparse, json, os, re, shutil, struct, threading, time
+import profiling, progress
+from frame_wait import DirectoryWatch
+from recon_profiles import available_cores, resolve_profile
+from reconstruction import ensure_directories, feature_extraction, sparse_reconstruction
+from scan_angles import neighbor_pairs, parse_angle
+from scan_catalog import DATA_ROOT
+
+QUICKLOOK_DIR = os.path.join("workspace", "quicklook")
+POSITION_PATTERN = re.compile(r"_pos_(\d+)_")
+
+
+def quicklook_dir(scan_dir: str) -> str:
+    return os.path.join(scan_dir, QUICKLOOK_DIR)
+
+
+def load_status(scan_dir: str) -> dict:
+    """ Contents of the scan's quick-look status.json, {} when there is no quick look. """
+    path = os.path.join(quicklook_dir(scan_dir), "status.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def registered_images(model_dir: str) -> int:
+    """ Number of registered images in a binary COLMAP model, 0 when there is none. """
+    try:
+        with open(os.path.join(model_dir, "images.bin"), "rb") as f:
+            return struct.unpack("<Q", f.read(8))[0]
+    except (OSError, struct.error):
+        return 0
+
+
+class QuickLook:
+    """
+    Follows image_dir as the scan writes it and keeps the quick-look model
+    up to date from a background thread. Runs on the fast profile with half
+    the cores by default, the rest stay with acquisition and preprocessing.
+    """
+
+    def __init__(self, scan_dir: str, image_dir: str = None, stride: int = 8, min_images: int = 6,
+                 expected: int = None, colmap_path: str = "colmap", threads: int = None, neighbors: int = 2,
+                 ba_every: int = 4):
+        self.scan_dir = scan_dir
+        self.image_dir = image_dir or os.path.join(scan_dir, "images_png")
+        self.stride = max(1, stride)
+        self.min_images = min_images
+        self.expected = expected
+        self.colmap_path = colmap_path
+        self.neighbors = neighbors
+        self.ba_every = ba_every
+        self.settings = resolve_profile("fast", threads or max(1, available_cores() // 2))
+
+        self.workspace_dir = quicklook_dir(scan_dir)
+        self.database_path = os.path.join(self.workspace_dir, "database.db")
+        self.model_dir = os.path.join(self.workspace_dir, "sparse", "0")
+        self.ply_path = os.path.join(self.workspace_dir, "quicklook.ply")
+        self.status_path = os.path.join(self.workspace_dir, "status.json")
+
+        self.seen = 0                # Projections seen so far, for scans without position indices
+        self.selected = []           # Quick-look images in the database
+        self.pending = []            # Selected, not yet in the model
+        self._tried = 0              # Pending projections at the last failed update
+        self.updates = 0
+        self.state = "waiting"
+
+        # Previous runs of this scan are not continued
+        shutil.rmtree(self.workspace_dir, ignore_errors=True)
+        ensure_directories(self.workspace_dir, self.image_dir)
+        self._watch = DirectoryWatch(self.image_dir)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        print(f"Quick look on every {self.stride}th projection of {self.image_dir}, {self.settings.describe()}")
+        self._write_status()
+        self._thread.start()
+        return self
+
+    def add(self, filename: str):
+        """ Queue a new projection if it is one of the quick-look subset. """
+        if not filename.lower().endswith(".png"):
+            return
+        match = POSITION_PATTERN.search(filename)
+        index = int(match.group(1)) if match else self.seen
+        self.seen += 1
+        if index % self.stride == 0 and filename not in self.selected and filename not in self.pending:
+            self.pending.append(filename)
+
+    def _run(self):
+        while not self._stop.is_set():
+            for filename in self._watch.new_files(timeout=0.5):
+                self.add(filename)
+            # A failed update is tried again once more projections came in
+            if len(self.pending) > self._tried:
+                self.update()
+
+    def stop(self) -> dict:
+        """ Pick up the last projections, update and bundle adjust once more. """
+        self._stop.set()
+        if self._thread.ident is not None:
+            self._thread.join()
+        self._watch.close()
+        for filename in sorted(os.listdir(self.image_dir)):
+            self.add(filename)
+        self.update(final=True)
+        self.state = "done" if registered_images(self.model_dir) else "failed"
+        return self._write_status()
+
+    def update(self, final: bool = False):
+        """ Add the pending projections: first model once there are enough, registration after that. """
+        have_model = registered_images(self.model_dir) > 0
+        new = list(self.pending)
+        # Extracted by an earlier update that failed later on
+        unextracted = [name for name in new if name not in self.selected]
+        if not have_model and len(self.selected) + len(unextracted) < self.min_images:
+            return
+        try:
+            if unextracted:
+                self._extract(unextracted)
+            if new:
+                self._match(new)
+            if not have_model:
+                self.state = "mapping"
+                self._map()
+            elif new:
+                self.state = "registering"
+                self._register()
+            self.updates += 1
+            if registered_images(self.model_dir) and (final or self.updates % self.ba_every == 0):
+                self._bundle_adjust()
+            self._export()
+            # Only now are they in the model, a failure above keeps them for the next try
+            self.pending, self._tried = self.pending[len(new):], 0
+            self.state = "running"
+        except Exception as e:
+            # Not enough overlap yet, the next projections get another try
+            print(f"--Quick look update failed: {e}")
+            self._tried = len(self.pending)
+            self.state = "retrying"
+        self._write_status()
+
+    def _extract(self, names: list):
+        list_path = os.path.join(self.workspace_dir, "new_images.txt")
+        with open(list_path, "w") as f:
+            f.write("\n".join(names) + "\n")
+        feature_extraction(self.image_dir, self.database_path, self.colmap_path,
+                           ["--image_list_path", list_path, *self.settings.args("feature_extraction")])
+        self.selected += names
+
+    def _match(self, names: list):
+        """ New images against their angular neighbours within the subset. """
+        # Angles from the names: the scan container is still open for writing
+        angles = {name: parse_angle(name) for name in self.selected if parse_angle(name) is not None}
+        new = set(names)
+        pairs = [pair for pair in neighbor_pairs(angles, self.neighbors) if new.intersection(pair)]
+        if len(angles) < len(self.selected):
+            # No angles in the names, match the new images against everything
+            pairs = sorted({tuple(sorted((a, b))) for a in names for b in self.selected if a != b})
+        if not pairs:
+            return
+        pairs_path = os.path.join(self.workspace_dir, "new_pairs.txt")
+        with open(pairs_path, "w") as f:
+            f.writelines(f"{a} {b}\n" for a, b in pairs)
+        profiling.run([
+            self.colmap_path, "matches_importer",
+            "--database_path", self.database_path,
+            "--match_list_path", pairs_path,
+            "--match_type", "pairs",
+            "--SiftMatching.use_gpu", "0",
+            *self.settings.args("feature_matching"),
+        ], check=True)
+
+    def _map(self):
+        sparse_dir = os.path.dirname(self.model_dir)
+        shutil.rmtree(sparse_dir, ignore_errors=True)
+        ensure_directories(sparse_dir)
+        sparse_reconstruction(self.image_dir, self.database_path, self.colmap_path, sparse_dir,
+                              self.settings.args("mapper"))
+
+    def _register(self):
+        """ image_registrator adds the poses, point_triangulator the points they see; swapped in when both worked. """
+        registered = os.path.join(self.workspace_dir, "sparse", "registered")
+        triangulated = os.path.join(self.workspace_dir, "sparse", "triangulated")
+        for path in (registered, triangulated):
+            shutil.rmtree(path, ignore_errors=True)
+        ensure_directories(registered, triangulated)
+        profiling.run([
+            self.colmap_path, "image_registrator",
+            "--database_path", self.database_path,
+            "--input_path", self.model_dir,
+            "--output_path", registered,
+            *self.settings.args("mapper"),
+        ], check=True)
+        profiling.run([
+            self.colmap_path, "point_triangulator",
+            "--database_path", self.database_path,
+            "--image_path", self.image_dir,
+            "--input_path", registered,
+            "--output_path", triangulated,
+        ], check=True)
+        shutil.rmtree(self.model_dir)
+        os.replace(triangulated, self.model_dir)
+        shutil.rmtree(registered, ignore_errors=True)
+
+    def _bundle_adjust(self):
+        profiling.run([
+            self.colmap_path, "bundle_adjuster",
+            "--input_path", self.model_dir,
+            "--output_path", self.model_dir,
+        ], check=True)
+
+    def _export(self):
+        """ Point cloud of the current model, replaced atomically so readers never see half a file. """
+        tmp_path = os.path.join(self.workspace_dir, "quicklook.tmp.ply")
+        profiling.run([
+            self.colmap_path, "model_converter",
+            "--input_path", self.model_dir,
+            "--output_path", tmp_path,
+            "--output_type", "PLY",
+        ], check=True)
+        os.replace(tmp_path, self.ply_path)
+
+    def _write_status(self) -> dict:
+        status = {
+            "state": self.state, "stride": self.stride, "expected": self.expected,
+            "images": len(self.selected), "registered": registered_images(self.model_dir),
+            "updates": self.updates, "model": self.ply_path if os.path.exists(self.ply_path) else None,
+            "updated": time.time(),
+        }
+        tmp_path = self.status_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(status, f, indent=2)
+        os.replace(tmp_path, self.status_path)
+        progress.emit("quicklook", **status)
+        return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quick-look reconstruction that follows a running scan")
+    parser.add_argument("scan_name", help="scan folder under /home/user/tmpData/AI_scan/")
+    parser.add_argument("--stride", type=int, default=8, help="use every Nth projection")
+    parser.add_argument("--min-images", type=int, default=6, help="projections needed for the first model")
+    parser.add_argument("--expected", type=int, default=None, help="stop once the scan has this many projections")
+    parser.add_argument("--idle-timeout", type=float, default=120.0, help="stop after this many seconds without new projections")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--colmap", default="colmap")
+    args = parser.parse_args()
+
+    quicklook = QuickLook(os.path.join(DATA_ROOT, args.scan_name), stride=args.stride, min_images=args.min_images,
+                          expected=args.expected, colmap_path=args.colmap, threads=args.threads).start()
+    last_count, last_change = -1, time.time()
+    try:
+        while time.time() - last_change < args.idle_timeout:
+            count = len([name for name in os.listdir(quicklook.image_dir) if name.endswith(".png")])
+            if count != last_count:
+                last_count, last_change = count, time.time()
+            if args.expected and count >= args.expected:
+                break
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        print("\nQuick look interrupted by user")
+    status = quicklook.stop()
+    print(f"✓ Quick look: {status['registered']} of {status['images']} projections registered, model at {status['model']}")
@@ -1,53 +1,120 @@
-import shutil, sys, subprocess, os, time 
+import glob, shutil, sys, subprocess, os, time, argparse
 from PIL import Image
+from stage_cache import StageCache
+import profiling
+from recon_profiles import PROFILE_NAMES, DEFAULT_PROFILE, resolve_profile
+from scan_angles import angles_for_directory, write_match_list
+from turntable_poses import load_intrinsics, write_turntable_model
+from scan_container import ScanContainer, find_container
+from preprocess import CROP_BOX
+from scan_catalog import record_scan
+from mesh_preview import scan_previews
+import mesh_lod
 
 def ensure_directories(*paths: str) -> None:
     """ Create directories if they don't exist."""
     for path in paths:
         os.makedirs(path, exist_ok=True)
 
-def feature_extraction(imageDir: str, databasePath: str, colmapPath: str):
-    """ Run feature extraction. """
-    subprocess.run([
+def feature_extraction(imageDir: str, databasePath: str, colmapPath: str, options: list = (), threads: list = ()):
+    """ Run feature extraction. options: extra COLMAP flags from the reconstruction profile. """
+    profiling.run([
         colmapPath, "feature_extractor",
         "--database_path", databasePath,
         "--image_path", imageDir,
         "--SiftExtraction.use_gpu", "0",
-        "--SiftExtraction.num_threads", "6"  # or 1 to be safe
+        *options, *threads,
     ], check=True)
 
-def feature_matching(databasePath: str, colmapPath: str):
+def feature_matching(databasePath: str, colmapPath: str, options: list = (), threads: list = ()):
     """ 
     Run feature matching. 
     """
-    subprocess.run([
+    profiling.run([
         colmapPath, "exhaustive_matcher",
         "--database_path", databasePath,
         "--SiftMatching.use_gpu", "0",
+        *options, *threads,
     ], check=True)
 
-def sparse_reconstruction(imageDir: str, databasePath: str, colmapPath: str, sparseDir: str):
+def angular_feature_matching(imageDir: str, databasePath: str, colmapPath: str, matchListPath: str, neighbors: int = 4,
+                             options: list = (), threads: list = ()):
+    """ 
+    Match each projection only with its angular neighbours (angles come from 
+    the file names), so matching cost grows linearly with the number of angles.
+    """
+    num_pairs = write_match_list(imageDir, matchListPath, neighbors)
+    print(f"Matching {num_pairs} neighbour pairs ({neighbors} neighbours per side)")
+    profiling.run([
+        colmapPath, "matches_importer",
+        "--database_path", databasePath,
+        "--match_list_path", matchListPath,
+        "--match_type", "pairs",
+        "--SiftMatching.use_gpu", "0",
+        *options, *threads,
+    ], check=True)
+
+def sparse_reconstruction(imageDir: str, databasePath: str, colmapPath: str, sparseDir: str, options: list = (),
+                          threads: list = ()):
     """ 
     Run sparse reconstruction. 
     """
-    subprocess.run([
+    profiling.run([
         colmapPath, "mapper",
         "--database_path", databasePath,
         "--image_path", imageDir,
-        "--output_path", sparseDir
+        "--output_path", sparseDir,
+        *options, *threads,
     ], check=True)
 
-def image_undistorter(imageDir: str, denseDir: str, colmapPath: str, sparseDir: str):
+def known_pose_reconstruction(imageDir: str, databasePath: str, colmapPath: str, sparseDir: str,
+                              intrinsicsPath: str, bundleAdjust: bool = False, options: list = (), threads: list = ()):
+    """ 
+    Sparse model from the scan angles and a calibrated intrinsic: poses are 
+    written directly and only the points are triangulated, instead of running
+    the incremental mapper. Optionally refines the poses with bundle adjustment.
+    """
+    known_dir = os.path.join(sparseDir, "known")
+    output_dir = os.path.join(sparseDir, "0")
+    ensure_directories(known_dir, output_dir)
+
+    num_images = write_turntable_model(databasePath, load_intrinsics(intrinsicsPath), known_dir, imageDir)
+    print(f"Wrote turntable model with {num_images} posed images")
+
+    profiling.run([
+        colmapPath, "point_triangulator",
+        "--database_path", databasePath,
+        "--image_path", imageDir,
+        "--input_path", known_dir,
+        "--output_path", output_dir,
+        "--Mapper.ba_refine_focal_length", "0",
+        "--Mapper.ba_refine_principal_point", "0",
+        "--Mapper.ba_refine_extra_params", "0",
+        *options, *threads,
+    ], check=True)
+
+    if bundleAdjust:
+        profiling.run([
+            colmapPath, "bundle_adjuster",
+            "--input_path", output_dir,
+            "--output_path", output_dir,
+            "--BundleAdjustment.refine_focal_length", "0",
+            "--BundleAdjustment.refine_principal_point", "0",
+            "--BundleAdjustment.refine_extra_params", "0",
+        ], check=True)
+
+def image_undistorter(imageDir: str, denseDir: str, colmapPath: str, sparseDir: str, options: list = ()):
     """ 
     Run image undistorter, which outputs acccording 
     to quality of point detection.
     """
-    subprocess.run([
+    profiling.run([
         colmapPath, "image_undistorter",
         "--image_path", imageDir,
         "--input_path", sparseDir, "0",
         "--output_path", denseDir,
-        "--output_type", "COLMAP"
+        "--output_type", "COLMAP",
+        *options,
     ], check=True)
 
 def interface_colmap(workspace_dir: str, imageDir: str, basePath: str, sceneMVS: str, denseDir: str, mvs_bin_dir: str):
@@ -56,48 +123,69 @@ def interface_colmap(workspace_dir: str, imageDir: str, basePath: str, sceneMVS:
     colmap and output scene_mvs, containing necessary scene 
     for next reconstruction steps. 
     """
-    subprocess.run([
+    profiling.run([
         os.path.join(mvs_bin_dir, "InterfaceCOLMAP"),
         "-i", os.path.join(workspace_dir, "dense"),       #Needed for manual colmap
         #"-i", os.path.join(workspace_dir, "dense", "0"),  Needed for automaticReconstruction combo     
         "-o", sceneMVS,
         "--image-folder", imageDir
-    ],cwd=denseDir)
+    ], check=True, cwd=denseDir)
 
-def densify_point_cloud(sceneMVS: str, denseDir: str, mvs_bin_dir: str):
+def densify_point_cloud(sceneMVS: str, denseDir: str, mvs_bin_dir: str, options: list = (), threads: list = ()):
     """ 
     Densify point cloud connects points by creating more points
     in between already created points. """
-    subprocess.run([
+    profiling.run([
         os.path.join(mvs_bin_dir, "DensifyPointCloud"),
-        sceneMVS
-    ], cwd=denseDir)
+        sceneMVS,
+        *options, *threads,
+    ], check=True, cwd=denseDir)
 
-def reconstruct_mesh(denseMVS: str, denseDir: str, mvs_bin_dir: str):
+def reconstruct_mesh(denseMVS: str, denseDir: str, mvs_bin_dir: str, options: list = (), threads: list = ()):
     """ 
     Creates mesh of object, lacking color but connecting points.
     """
-    subprocess.run([
+    profiling.run([
         os.path.join(mvs_bin_dir, "ReconstructMesh"),
-        denseMVS
-    ], cwd=denseDir)
+        denseMVS,
+        *options, *threads,
+    ], check=True, cwd=denseDir)
 
-def texture_mesh(denseDir: str, sceneMVS: str, mvs_bin_dir: str):
+def decimate_mesh(denseDir: str, targets: dict):
+    """ 
+    Levels of detail of the dense mesh, binary with vertex normals (see mesh_lod.py).
+    """
+    mesh_lod.write_lods(denseDir, targets)
+
+def texture_mesh(denseDir: str, sceneMVS: str, mvs_bin_dir: str, options: list = (), meshFile: str = mesh_lod.FULL_MESH,
+                 threads: list = ()):
     """ 
     Texture mesh mixes data from both sceneMVS and the mesh 
     
-    Note: This is time consuming and should be skipped if mesh quality is subpar
+    Note: This is time consuming and should be skipped if mesh quality is subpar,
+    texturing a decimated level (meshFile) keeps it proportional to the faces we need
     """
 
-    subprocess.run([
+    profiling.run([
         os.path.join(mvs_bin_dir, "TextureMesh"), 
         sceneMVS,
-        "-m", "scene_dense_mesh.ply"
-    ],cwd=denseDir)
-
-def run_colmap_pipeline(image_dir: str, workspace_dir: str, colmap_path: str = "colmap") -> None:
+        "-m", meshFile,
+        *options, *threads,
+    ], check=True, cwd=denseDir)
+
+def run_colmap_pipeline(image_dir: str, workspace_dir: str, colmap_path: str = "colmap", force: bool = False,
+                        matcher: str = "angular", neighbors: int = 4,
+                        intrinsics_path: str = None, bundle_adjust: bool = False, threads: int = None,
+                        profile: str = DEFAULT_PROFILE) -> None:
     """
     Full COLMAP pipeline: feature extraction → matching → sparse reconstruction → undistortion.
+    Stages whose inputs are unchanged since their last successful run are skipped.
+
+    matcher "angular" pairs each image with its `neighbors` closest angles on each side,
+    "exhaustive" matches every pair. Angular falls back to exhaustive for images without angles.
+    With intrinsics_path the poses come from the scan angles (point_triangulator)
+    instead of the incremental mapper. profile (fast/balanced/high) sets the image
+    sizes and feature counts, threads overrides its core count.
     """
     print(f"Running COLMAP pipeline on {image_dir} -> {workspace_dir}")
     database_path = os.path.join(workspace_dir, "database.db")
@@ -105,28 +193,99 @@ def run_colmap_pipeline(image_dir: str, workspace_dir: str, colmap_path: str = "
     dense_dir = os.path.join(workspace_dir, "dense")
 
     ensure_directories(workspace_dir, sparse_dir, dense_dir)
-
-    feature_extraction(image_dir, database_path, colmap_path)
-    feature_matching(database_path, colmap_path)
-    sparse_reconstruction(image_dir, database_path, colmap_path, sparse_dir)
-    image_undistorter(image_dir, dense_dir, colmap_path, os.path.join(sparse_dir, "0"))
+    cache = StageCache(workspace_dir, force=force)
+    settings = resolve_profile(profile, threads)
+    print(settings.describe())
+
+    cache.run("feature_extraction", feature_extraction, image_dir, database_path, colmap_path,
+              settings.args("feature_extraction", threads=False),
+              inputs=[image_dir], outputs=[database_path], reset=[database_path],
+              cores=settings.threads_for("feature_extraction"),
+              untracked={"threads": settings.thread_args("feature_extraction")})
+    image_names = [name for name in os.listdir(image_dir) if not name.startswith(".")]
+    if matcher == "angular" and len(angles_for_directory(image_dir)) < len(image_names):
+        print("Not every image carries an angle in its name, using exhaustive matching")
+        matcher = "exhaustive"
+
+    if matcher == "angular":
+        match_list_path = os.path.join(workspace_dir, "match_list.txt")
+        cache.run("feature_matching", angular_feature_matching, image_dir, database_path, colmap_path,
+                  match_list_path, neighbors, settings.args("feature_matching", threads=False),
+                  outputs=[database_path], after="feature_extraction",
+                  cores=settings.threads_for("feature_matching"),
+                  untracked={"threads": settings.thread_args("feature_matching")})
+    else:
+        cache.run("feature_matching", feature_matching, database_path, colmap_path,
+                  settings.args("feature_matching", threads=False),
+                  outputs=[database_path], after="feature_extraction",
+                  cores=settings.threads_for("feature_matching"),
+                  untracked={"threads": settings.thread_args("feature_matching")})
+    if intrinsics_path:
+        cache.run("mapper", known_pose_reconstruction, image_dir, database_path, colmap_path, sparse_dir,
+                  intrinsics_path, bundle_adjust, settings.args("mapper", threads=False), inputs=[intrinsics_path],
+                  outputs=[os.path.join(sparse_dir, "0", "images.bin")], reset=[sparse_dir], after="feature_matching",
+                  cores=settings.threads_for("mapper"),
+                  untracked={"threads": settings.thread_args("mapper")})
+    else:
+        cache.run("mapper", sparse_reconstruction, image_dir, database_path, colmap_path, sparse_dir,
+                  settings.args("mapper", threads=False),
+                  outputs=[os.path.join(sparse_dir, "0")], reset=[sparse_dir], after="feature_matching",
+                  cores=settings.threads_for("mapper"),
+                  untracked={"threads": settings.thread_args("mapper")})
+    cache.run("image_undistorter", image_undistorter, image_dir, dense_dir, colmap_path, os.path.join(sparse_dir, "0"),
+              settings.args("image_undistorter"),
+              outputs=[os.path.join(dense_dir, "sparse")],
+              reset=[os.path.join(dense_dir, d) for d in ("images", "sparse", "stereo")], after="mapper")
 
     print("COLMAP pipeline completed.")
 
-def run_openmvs_pipeline(base_path: str, image_dir: str, workspace_dir: str, mvs_bin_dir: str, image_file_name: str) -> None:
+def run_openmvs_pipeline(base_path: str, image_dir: str, workspace_dir: str, mvs_bin_dir: str, image_file_name: str,
+                         force: bool = False, threads: int = None, profile: str = DEFAULT_PROFILE,
+                         texture_lod: str = None) -> None:
     """
     Run OpenMVS conversion and mesh reconstruction from COLMAP output.
+    Resumes after the last stage that succeeded with unchanged inputs.
+    texture_lod (full/mid/low) overrides the mesh level the profile textures.
     """
 
     dense_dir = os.path.join(workspace_dir, "dense")
     scene_mvs = os.path.join(dense_dir, "scene.mvs")
     dense_mvs = os.path.join(dense_dir, "scene_dense.mvs")
+    dense_mesh = os.path.join(dense_dir, "scene_dense_mesh.ply")
+    texture_ply = os.path.join(dense_dir, "scene_texture.ply")
     ensure_directories(dense_dir)
-
-    interface_colmap(workspace_dir, image_dir, base_path, scene_mvs, dense_dir, mvs_bin_dir)
-    densify_point_cloud(scene_mvs, dense_dir, mvs_bin_dir)
-    reconstruct_mesh(dense_mvs, dense_dir, mvs_bin_dir)
-    texture_mesh(dense_dir, scene_mvs, mvs_bin_dir)
+    cache = StageCache(workspace_dir, force=force)
+    settings = resolve_profile(profile, threads)
+
+    cache.run("InterfaceCOLMAP", interface_colmap, workspace_dir, image_dir, base_path, scene_mvs, dense_dir, mvs_bin_dir,
+              outputs=[scene_mvs], reset=[scene_mvs], after="image_undistorter")
+    cache.run("DensifyPointCloud", densify_point_cloud, scene_mvs, dense_dir, mvs_bin_dir,
+              settings.args("DensifyPointCloud", threads=False),
+              outputs=[dense_mvs], reset=[dense_mvs, os.path.join(dense_dir, "scene_dense.ply")], after="InterfaceCOLMAP",
+              cores=settings.threads_for("DensifyPointCloud"),
+              untracked={"threads": settings.thread_args("DensifyPointCloud")})
+    cache.run("ReconstructMesh", reconstruct_mesh, dense_mvs, dense_dir, mvs_bin_dir,
+              settings.args("ReconstructMesh", threads=False),
+              outputs=[dense_mesh], reset=[dense_mesh], after="DensifyPointCloud",
+              cores=settings.threads_for("ReconstructMesh"),
+              untracked={"threads": settings.thread_args("ReconstructMesh")})
+    texture_lod = texture_lod or settings.texture_lod
+    if mesh_lod.o3d is None and texture_lod != "full":
+        print(f"--open3d not installed, texturing the full mesh instead of the {texture_lod} level")
+        texture_lod = "full"
+    texture_after = "ReconstructMesh"
+    if mesh_lod.o3d is not None:
+        lod_files = [os.path.join(dense_dir, mesh_lod.lod_file(level)) for level in mesh_lod.LOD_TARGETS]
+        cache.run("DecimateMesh", decimate_mesh, dense_dir, mesh_lod.LOD_TARGETS,
+                  outputs=lod_files, reset=lod_files, after="ReconstructMesh")
+        texture_after = "DecimateMesh"
+    cache.run("TextureMesh", texture_mesh, dense_dir, scene_mvs, mvs_bin_dir,
+              settings.args("TextureMesh", threads=False),
+              mesh_lod.lod_file(texture_lod),
+              outputs=[texture_ply], reset=[texture_ply, *glob.glob(os.path.join(dense_dir, "scene_texture*.png"))],
+              after=texture_after,
+              cores=settings.threads_for("TextureMesh"),
+              untracked={"threads": settings.thread_args("TextureMesh")})
 
     print("OpenMVS pipeline completed.")
 
@@ -168,8 +327,24 @@ def automatic_reconstruction(image_dir: str, workspace_dir: str, colmap_path: st
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="COLMAP + OpenMVS reconstruction of a scan folder")
+    parser.add_argument("image_file_name", help="scan folder under /home/user/tmpData/AI_scan/")
+    parser.add_argument("--force", action="store_true", help="ignore the stage cache and rerun every stage")
+    parser.add_argument("--matcher", choices=["angular", "exhaustive"], default="angular",
+                        help="angular: match angular neighbours only, exhaustive: every image pair")
+    parser.add_argument("--neighbors", type=int, default=4, help="angular neighbours matched on each side")
+    parser.add_argument("--known-poses", metavar="INTRINSICS_JSON", default=None,
+                        help="skip the mapper: pose images from their scan angle with these calibrated intrinsics")
+    parser.add_argument("--bundle-adjust", action="store_true", help="refine the known poses with bundle adjustment")
+    parser.add_argument("--profile", choices=PROFILE_NAMES, default=DEFAULT_PROFILE,
+                        help="fast: quick look at reduced resolution, balanced: defaults, high: full resolution")
+    parser.add_argument("--threads", type=int, default=None, help="threads per stage (default: all usable cores)")
+    parser.add_argument("--texture-lod", choices=mesh_lod.LOD_NAMES, default=None,
+                        help="mesh level to texture (default: low for fast, mid for balanced, full for high)")
+    args = parser.parse_args()
+
     #File path names
-    image_file_name = sys.argv[1]
+    image_file_name = args.image_file_name
 
     #Where reconstructions and image data is stored
     base_path = "/home/user/tmpData/AI_scan/"
@@ -179,25 +354,48 @@ if __name__ == "__main__":
 
     image_dir = os.path.join(base_path, image_file_name, "images_png")
 
-    if ((os.path.exists(image_dir)) == 0):
+    # Scans saved only as a container get their COLMAP images exported once
+    container_file = find_container(os.path.join(base_path, image_file_name))
+    if container_file and not (os.path.isdir(image_dir) and os.listdir(image_dir)):
+        with ScanContainer(container_file) as container:
+            print(f"Exporting {len(container)} projections from {container_file}")
+            container.export_images(image_dir, ".png", CROP_BOX)
+
+    if (os.path.exists(image_dir)):
         #Default images folder
 
         #Default workspace folder
         workspace_dir = os.path.join(base_path, image_file_name, "workspace")
         print("Made it here")
+        profiler = profiling.reset(scan=image_file_name, num_images=len(os.listdir(image_dir)), matcher=args.matcher,
+                                   known_poses=bool(args.known_poses), threads=args.threads, profile=args.profile)
+        report_path = os.path.join(workspace_dir, "profiles", time.strftime("%Y%m%d_%H%M%S") + ".json")
         t0 = time.time()
-        run_colmap_pipeline(image_dir, workspace_dir)
-        #automatic_reconstruction(image_dir, workspace_dir)
-        t1 = time.time()
-
-        t2 = time.time()
-        run_openmvs_pipeline(base_path, image_dir, workspace_dir, mvs_bin_path, image_file_name)
-        t3= time.time()
+        try:
+            run_colmap_pipeline(image_dir, workspace_dir, force=args.force, matcher=args.matcher, neighbors=args.neighbors,
+                                intrinsics_path=args.known_poses, bundle_adjust=args.bundle_adjust, threads=args.threads,
+                                profile=args.profile)
+            #automatic_reconstruction(image_dir, workspace_dir)
+            t1 = time.time()
+
+            t2 = time.time()
+            run_openmvs_pipeline(base_path, image_dir, workspace_dir, mvs_bin_path, image_file_name, force=args.force,
+                                 threads=args.threads, profile=args.profile, texture_lod=args.texture_lod)
+            t3= time.time()
+        finally:
+            # Saved for failed runs too, the failing stage is marked in the report
+            print(profiler.summary())
+            print(f"Profile saved at {profiler.save(report_path)}")
 
         #Timing check
         print(f"COLMAP time: {t1 - t0:.2f}s")
         print(f"OpenMVS time: {t3 - t2:.2f}s")
         print(f"Total time: {t3 - t0:.2f}s")
+        record_scan(image_file_name)
+        # Snapshots rendered now, so showing the result later is just reading files
+        try:
+            scan_previews(os.path.join(base_path, image_file_name))
+        except Exception as e:
+            print(f"--Failed to render reconstruction previews: {e}")
     else:
         print("This did not work")
-
@@ -0,0 +1,151 @@
+"""
+Host-wide core and IO slots shared by concurrent reconstructions.
+
+The pool is a directory of lock files, one per core and one per IO slot.
+A stage holds flock()s on as many core files as it runs threads, so
+reconstructions started side by side (batch_reconstruct.py, API jobs)
+never run more CPU-heavy stages at once than the host has cores. IO-heavy
+stages take an IO slot instead, so undistortion of one scan overlaps with
+SIFT of another. Locks belong to the process and go away with it.
+
+Enabled by BOLT_RESOURCE_DIR (plus BOLT_RESOURCE_CORES / BOLT_RESOURCE_IO),
+without it hold() does nothing.
+
+DetectorLock is the same kind of lock for the one camera: a scan holds it
+for its whole run, the acquisition daemon for each shot, so neither
+repoints the TIFF plugin under the other.
+"""
+import fcntl, os, random, tempfile, time
+from contextlib import contextmanager, nullcontext
+
+# Stages that mostly read and write images rather than compute
+IO_STAGES = ("image_undistorter", "InterfaceCOLMAP")
+
+
+class ResourcePool:
+    def __init__(self, directory: str, cores: int, io_slots: int = 2):
+        self.directory = directory
+        self.cores = max(1, cores)
+        self.io_slots = max(1, io_slots)
+        os.makedirs(directory, exist_ok=True)
+
+    def _lock_all(self, prefix: str, slots: int, count: int, poll_interval: float = 0.5):
+        """
+        File descriptors holding `count` of the `slots` locks. The gate lock
+        makes waiters take turns, so a stage that needs many cores is not
+        starved by stages needing few.
+        """
+        count = min(count, slots)
+        gate = os.open(os.path.join(self.directory, f"{prefix}_gate.lock"), os.O_CREAT | os.O_RDWR)
+        fcntl.flock(gate, fcntl.LOCK_EX)
+        held = []
+        try:
+            while True:
+                for i in random.sample(range(slots), slots):
+                    if len(held) == count:
+                        return held
+                    fd = os.open(os.path.join(self.directory, f"{prefix}_{i:03d}.lock"), os.O_CREAT | os.O_RDWR)
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        held.append(fd)
+                    except BlockingIOError:
+                        os.close(fd)
+                if len(held) == count:
+                    return held
+                time.sleep(poll_interval)
+        except BaseException:
+            self._release(held)
+            raise
+        finally:
+            fcntl.flock(gate, fcntl.LOCK_UN)
+            os.close(gate)
+
+    @staticmethod
+    def _release(held):
+        for fd in held:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    @contextmanager
+    def hold(self, name: str, cores: int = 1):
+        """ Cores for a CPU stage, an IO slot for an IO stage. Prints when it had to wait. """
+        prefix, slots, count = ("io", self.io_slots, 1) if name in IO_STAGES else ("core", self.cores, max(1, cores))
+        t0 = time.time()
+        held = self._lock_all(prefix, slots, count)
+        waited = time.time() - t0
+        if waited > 1.0:
+            print(f"↻ {name} waited {waited:.1f}s for {count} {prefix} slot(s)")
+        try:
+            yield waited
+        finally:
+            self._release(held)
+
+
+DETECTOR_LOCK_PATH = os.environ.get("BOLT_DETECTOR_LOCK", os.path.join(tempfile.gettempdir(), "bolt_detector.lock"))
+
+
+class DetectorLock:
+    """ Exclusive use of the detector across processes. The file says who holds it. """
+
+    def __init__(self, owner: str, path: str = DETECTOR_LOCK_PATH, poll_interval: float = 0.5):
+        self.owner = owner
+        self.path = path
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    def acquire(self, timeout: float = None) -> bool:
+        """ True once held, False when still taken after timeout seconds (None waits for good). """
+        if self._fd is not None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o666)
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(self.poll_interval if deadline is None else
+                           max(min(self.poll_interval, deadline - time.monotonic()), 0))
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{self.owner} (pid {os.getpid()})".encode())
+        self._fd = fd
+        return True
+
+    def holder(self) -> str:
+        try:
+            with open(self.path) as f:
+                return f.read().strip() or "another process"
+        except OSError:
+            return "another process"
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def from_env():
+    """ The pool configured in the environment, None when there is none. """
+    directory = os.environ.get("BOLT_RESOURCE_DIR")
+    if not directory:
+        return None
+    return ResourcePool(directory, int(os.environ.get("BOLT_RESOURCE_CORES", os.cpu_count() or 1)),
+                        int(os.environ.get("BOLT_RESOURCE_IO", 2)))
+
+
+current = from_env()
+
+
+def hold(name: str, cores: int = 1):
+    return current.hold(name, cores) if current is not None else nullcontext(0.0)
@@ -0,0 +1,130 @@
+"""
+Simulated rotation stage and camera for running scan plans without the beamline.
+
+They expose the same attribute names the plans use on EpicsMotor('DMC01:A')
+and MyCamera('13ARV1:'), so a plan written against the real devices can be
+run with these instead.
+"""
+import threading, time
+import numpy as np
+from PIL import Image
+from ophyd import Component as Cpt, Device, Signal
+from ophyd.status import DeviceStatus
+
+MOTOR_TO_DEGREES = 2.8125
+
+
+def render_projection(angle: float, shape=(480, 640)) -> np.ndarray:
+    """ Synthetic bolt-like projection (uint16) whose outline and thread pattern change with angle. """
+    rows, cols = shape
+    y, x = np.mgrid[0:rows, 0:cols]
+    theta = np.deg2rad(angle)
+    centre = cols / 2
+    half_width = cols * (0.08 + 0.04 * abs(np.cos(theta)))
+    shaft = np.abs(x - centre) < half_width
+    head = (y < rows * 0.25) & (np.abs(x - centre) < half_width * (1.6 + 0.3 * np.sin(2 * theta)))
+    threads = 0.5 + 0.5 * np.sin((y / rows) * 60 + theta * 4)
+    img = np.where(head, 40000, np.where(shaft, 20000 + 15000 * threads, 2000))
+    return img.astype(np.uint16)
+
+
+class SimRotationMotor(Device):
+    """ Rotation stage that moves at `velocity` motor units/s and updates its readback while moving. """
+
+    user_readback = Cpt(Signal, value=0.0, kind='hinted')
+    user_setpoint = Cpt(Signal, value=0.0)
+    velocity = Cpt(Signal, value=1.0, kind='config')
+    acceleration = Cpt(Signal, value=0.1, kind='config')
+
+    update_period = 0.005
+
+    @property
+    def position(self):
+        return self.user_readback.get()
+
+    def set(self, position):
+        status = DeviceStatus(self)
+        self.user_setpoint.put(position)
+
+        def move():
+            pos = self.user_readback.get()
+            last = time.monotonic()
+            while abs(position - pos) > 1e-9:
+                time.sleep(self.update_period)
+                now = time.monotonic()
+                step = self.velocity.get() * (now - last)
+                last = now
+                pos = position if abs(position - pos) <= step else pos + np.sign(position - pos) * step
+                self.user_readback.put(pos)
+            status.set_finished()
+
+        threading.Thread(target=move, daemon=True).start()
+        return status
+
+
+class SimCam(Device):
+    acquire = Cpt(Signal, value=0)
+    image_mode = Cpt(Signal, value=0)      # single multiple continuous
+    trigger_mode = Cpt(Signal, value=0)    # internal external
+    acquire_time = Cpt(Signal, value=0.01)
+    acquire_period = Cpt(Signal, value=0.05)
+    array_counter = Cpt(Signal, value=0)
+
+
+class SimTiff(Device):
+    file_path = Cpt(Signal, value="")
+    file_name = Cpt(Signal, value="")
+    file_number = Cpt(Signal, value=0)
+    file_template = Cpt(Signal, value="%s%s_%d.tiff")
+    auto_increment = Cpt(Signal, value=1)
+    array_counter = Cpt(Signal, value=0)
+
+
+class SimCamera(Device):
+    """
+    Camera that renders the simulated object at the motor's current angle.
+
+    External trigger mode is emulated by free-running at acquire_period,
+    the way a position-compare output would fire at a constant rotation speed.
+    """
+
+    cam = Cpt(SimCam, "")
+    tiff = Cpt(SimTiff, "")
+
+    def __init__(self, *args, motor=None, shape=(480, 640), **kwargs):
+        super().__init__(*args, **kwargs)
+        self._motor = motor
+        self._shape = shape
+        self._thread = None
+        self.cam.acquire.subscribe(self._on_acquire, run=False)
+
+    def _on_acquire(self, value=None, **kwargs):
+        if value == 1 and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._acquire_loop, daemon=True)
+            self._thread.start()
+
+    def _acquire_loop(self):
+        while self.cam.acquire.get() == 1:
+            time.sleep(max(self.cam.acquire_period.get(), self.cam.acquire_time.get()))
+            if self.cam.acquire.get() != 1:
+                break
+            angle = self._motor.position * MOTOR_TO_DEGREES if self._motor is not None else 0.0
+            frame = render_projection(angle, self._shape)
+            self.cam.array_counter.put(self.cam.array_counter.get() + 1)
+            self._write(frame)
+            if self.cam.image_mode.get() == 0:
+                self.cam.acquire.put(0)
+
+    def _write(self, frame):
+        number = self.tiff.file_number.get()
+        filepath = self.tiff.file_template.get() % (self.tiff.file_path.get(), self.tiff.file_name.get(), number)
+        Image.fromarray(frame).save(filepath)
+        if self.tiff.auto_increment.get():
+            self.tiff.file_number.put(number + 1)
+        self.tiff.array_counter.put(self.tiff.array_counter.get() + 1)
+
+    def unstage(self):
+        self.cam.acquire.put(0)
+        if self._thread is not None:
+            self._thread.join()
+        return super().unstage()
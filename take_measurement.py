@@ -13,6 +13,8 @@ from pathlib import Path
 from PIL import Image
 import time, sys, os, subprocess
 from collections import defaultdict
+from resource_pool import DetectorLock
+from scan_catalog import record
 class PvaPlugin(PluginBase):
     _suffix = 'Pva1:'
     _plugin_type = 'NDPluginPva'
@@ -110,6 +112,7 @@ def acquire(angle):
             wait_for_file(filepath, timeout=5.0)
 
             print(f"✓ Image saved at {filepath}")
+            record("measurements", filepath, "raw", angle)
             break  # Exit retry loop if successful
 
         except TimeoutError:
@@ -153,6 +156,10 @@ if __name__ == "__main__":
 
         angle = float(sys.argv[1])
 
+        # Lock released when the process exits
+        detector = DetectorLock("take_measurement.py")
+        if not detector.acquire(timeout=0):
+            sys.exit(f"Detector in use by {detector.holder()}")
         camera.tiff.file_path.put(save_dir)
         camera.tiff.file_template.put('%s%s_%d.tiff')
 
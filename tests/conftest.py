@@ -0,0 +1,6 @@
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Scripts import each other as top-level modules; server-only modules (jobs, transfer) live in API_WORKING
+sys.path.insert(0, ROOT)
+sys.path.append(os.path.join(ROOT, "API_WORKING"))
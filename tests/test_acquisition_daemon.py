@@ -0,0 +1,38 @@
+import threading, types
+import pytest
+
+pytest.importorskip("bluesky")
+from ophyd.sim import Signal
+import bluesky.plan_stubs as bps
+from acquisition_daemon import AcquisitionService
+from resource_pool import DetectorLock
+
+
+def test_every_shot_points_the_tiff_plugin_at_the_daemon_folder():
+    names = ("file_path", "file_template", "file_name", "file_number")
+    tiff = types.SimpleNamespace(**{name: Signal(name=name) for name in names})
+    service = AcquisitionService.__new__(AcquisitionService)
+    service.bps, service.save_dir = bps, "/data/measurements/"
+    service.hw = types.SimpleNamespace(camera=types.SimpleNamespace(tiff=tiff))
+    service.acquire_signal = Signal(name="acquire")
+    service.waiter = types.SimpleNamespace(arm=lambda: None)
+
+    # A scan left the plugin pointing at its own raw_images/
+    tiff.file_path.put("/data/scan/raw_images/")
+    sets = [(msg.obj.name, msg.args[0]) for msg in service._snap("shot", 7) if msg.command == "set"]
+    order = [name for name, _ in sets]
+    assert dict(sets)["file_path"] == "/data/measurements/"
+    assert order.index("file_path") < order.index("file_name") < order.index("file_number") < order.index("acquire")
+    assert order.index("file_template") < order.index("file_name")
+
+
+def test_shots_are_refused_while_a_scan_holds_the_detector(tmp_path):
+    service = AcquisitionService.__new__(AcquisitionService)
+    service._lock = threading.Lock()
+    service.detector = DetectorLock("acquisition daemon", str(tmp_path / "detector.lock"))
+    service._measure = lambda angle: {"ok": True, "file": f"shot_{angle}.tiff"}
+
+    with DetectorLock("scan bunny", str(tmp_path / "detector.lock")):
+        reply = service.measure(45.0)
+    assert not reply["ok"] and reply["error"].startswith("Detector in use by scan bunny")
+    assert service.measure(45.0) == {"ok": True, "file": "shot_45.0.tiff"}
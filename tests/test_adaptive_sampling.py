@@ -0,0 +1,36 @@
+import numpy as np
+from adaptive_sampling import AdaptivePlanner
+
+
+def frame(bright_columns: int, shape=(16, 64)):
+    image = np.full(shape, 100.0)
+    image[:, :bright_columns] = 200.0
+    return image
+
+
+def planner(**kwargs):
+    kwargs.setdefault("min_step", 0.01)
+    return AdaptivePlanner(0.0, 4.0, budget=10, coarse=3, batch=1, crop_box=None, **kwargs)
+
+
+def test_largest_change_is_bisected_first():
+    p = planner()
+    for position, columns in ((0.0, 0), (2.0, 8), (4.0, 48)):
+        p.add(position, frame(columns))
+    assert p.next_batch() == [3.0]
+
+
+def test_equal_change_prefers_the_wider_interval():
+    p = planner()
+    for position, columns in ((0.0, 0), (3.0, 16), (4.0, 0)):
+        p.add(position, frame(columns))
+    assert p.next_batch() == [1.5]
+
+
+def test_changes_within_the_noise_are_not_refined():
+    p = planner(noise=0.05)
+    positions = iter(p)
+    for seed in range(3):
+        p.add(next(positions), frame(0) + np.random.default_rng(seed).normal(0, 1, (16, 64)))
+    assert list(positions) == []
+    assert p.round == 1 and p.issued == 3
@@ -0,0 +1,36 @@
+import os, signal, threading, time
+from batch_reconstruct import BatchScheduler
+
+
+def test_interrupt_cancels_queued_scans(tmp_path):
+    scheduler = BatchScheduler([(f"scan{i}", "fast") for i in range(5)], str(tmp_path), jobs=2, cores=2)
+    started, both_running = [], threading.Barrier(2)
+
+    def run_job(job):
+        started.append(job.scan)
+        both_running.wait(5)
+        if job.scan == "scan0":
+            os.kill(os.getpid(), signal.SIGINT)     # Ctrl-C, delivered to the main thread waiting in run()
+        # A reconstruction runs until stop() terminates it
+        deadline = time.monotonic() + 5
+        while not scheduler._stopped and time.monotonic() < deadline:
+            time.sleep(0.01)
+        job.status = "cancelled" if scheduler._stopped else "succeeded"
+
+    scheduler.run_job = run_job
+    # Python's own handler, whatever an earlier import installed
+    previous = signal.signal(signal.SIGINT, signal.default_int_handler)
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    else:
+        raise AssertionError("the interrupt was swallowed")
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+    assert scheduler._stopped
+    # The two running scans were stopped, the queued ones never started
+    assert sorted(started) == ["scan0", "scan1"]
+    assert [job.status for job in scheduler.jobs[2:]] == ["cancelled"] * 3
+    assert (tmp_path / "summary.json").exists()
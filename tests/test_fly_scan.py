@@ -0,0 +1,26 @@
+import csv, os
+import pytest
+
+pytest.importorskip("bluesky")
+from fly_scan import finalize_fly_frames
+
+
+def test_frames_matched_by_number_and_trimmed_to_constant_velocity(tmp_path):
+    name = "scan_x_fly"
+    for number in range(7):          # File 6 was written after the tagger stopped
+        (tmp_path / f"{name}_{number}.tiff").write_bytes(b"")
+    # Counter n is file n - 1. Frame 3 (file 2) was lost by the plugin, its tag is skipped.
+    tags = [(1, 10.0, -0.5), (2, 11.0, 0.5), (4, 13.0, 2.5), (5, 14.0, 3.5), (6, 15.0, 4.5)]
+    metadata = str(tmp_path / "fly_frames.csv")
+    (tmp_path / f"{name}_2.tiff").unlink()
+
+    rows = finalize_fly_frames(str(tmp_path), name, "x", tags, metadata, window=(10.5, 14.0), exposure=0.2,
+                               timeout=0.1)
+
+    assert [(row["frame_counter"], row["motor_readback"]) for row in rows] == [(2, 0.5), (4, 2.5), (5, 3.5)]
+    assert [row["file"].rsplit("_", 1)[-1] for row in rows] == ["1.tiff", "3.tiff", "4.tiff"]
+    # Run-up, deceleration and the untagged file are out of the scan folder
+    assert sorted(os.listdir(tmp_path / "rejected")) == [f"{name}_{n}.tiff" for n in (0, 5, 6)]
+    assert not [f for f in os.listdir(tmp_path) if f.startswith(name)]
+    with open(metadata, newline="") as f:
+        assert [row["file"] for row in csv.DictReader(f)] == [row["file"] for row in rows]
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from frame_averaging import AveragingReducer, FrameAccumulator
+
+
+def frames_with_outliers(n, outliers, value=1000, outlier=60000, noise=5, shape=(4, 6), seed=0):
+    rng = np.random.default_rng(seed)
+    frames = [np.clip(rng.normal(value, noise, shape), 0, 65535).astype(np.uint16) for _ in range(n)]
+    for i in range(outliers):
+        frames[i][...] = outlier
+    return frames
+
+
+def reduce(frames, method, **kwargs):
+    acc = FrameAccumulator(frames[0].shape, frames[0].dtype, len(frames), method, **kwargs)
+    for frame in frames:
+        acc.add(frame)
+    return acc.result()
+
+
+def test_mean_rounds_in_native_dtype():
+    frames = [np.full((2, 3), v, dtype=np.uint16) for v in (1, 2, 2)]
+    result = reduce(frames, "mean")
+    assert result.dtype == np.uint16
+    assert (result == 2).all()
+
+
+def test_median():
+    frames = [np.full((2, 2), v, dtype=np.uint16) for v in (5, 60000, 7)]
+    assert (reduce(frames, "median") == 7).all()
+
+
+@pytest.mark.parametrize("n, outliers", [(5, 1), (20, 3)])
+def test_sigma_clip_rejects_injected_outliers(n, outliers):
+    frames = frames_with_outliers(n, outliers)
+    clipped = reduce(frames, "sigma_clip").astype(float)
+    assert np.abs(clipped - 1000).max() < 10
+    # The plain mean is dragged far off by the same frames
+    assert reduce(frames, "mean").astype(float).mean() > 5000
+
+
+def test_sigma_clip_keeps_identical_frames():
+    frames = [np.full((3, 3), 1234, dtype=np.uint16) for _ in range(4)]
+    assert (reduce(frames, "sigma_clip") == 1234).all()
+
+
+def test_sigma_clip_float_frames():
+    frames = [np.full((2, 2), 0.5, dtype=np.float32) for _ in range(6)]
+    frames[0][...] = 100.0
+    assert np.allclose(reduce(frames, "sigma_clip"), 0.5)
+
+
+def test_reducer_returns_on_last_frame_and_flushes_partial():
+    reducer = AveragingReducer(3)
+    frame = np.ones((2, 2), dtype=np.uint16)
+    assert reducer.add(0, frame) is None
+    assert reducer.add(0, frame) is None
+    assert (reducer.add(0, frame) == 1).all()
+    reducer.add(1, frame * 4)
+    assert (reducer.flush(1) == 4).all()
+    assert reducer.flush(1) is None
+
+
+def test_discarded_position_starts_over():
+    reducer = AveragingReducer(3)
+    reducer.add(0, np.full((2, 2), 100, dtype=np.uint16))
+    reducer.add(0, np.full((2, 2), 100, dtype=np.uint16))
+    reducer.discard(0)
+    reducer.discard(0)      # Nothing left, nothing to do
+    for _ in range(2):
+        assert reducer.add(0, np.full((2, 2), 10, dtype=np.uint16)) is None
+    assert (reducer.add(0, np.full((2, 2), 10, dtype=np.uint16)) == 10).all()
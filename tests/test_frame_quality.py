@@ -0,0 +1,43 @@
+import numpy as np
+from frame_quality import QualityGate
+
+
+def textured(level=2000, seed=0, shape=(64, 64)):
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.normal(level, 300, shape), 0, 4095).astype(np.uint16)
+
+
+def gate(**kwargs):
+    return QualityGate(crop_box=None, full_scale=4095, **kwargs)
+
+
+def check(g, frame, index=0):
+    passed, reasons, sample = g.check(frame, index, index * 2.8125, f"frame_{index}.tiff")
+    if passed:
+        g.accept(sample)
+    return reasons
+
+
+def test_dark_and_saturated_frames():
+    g = gate()
+    assert check(g, np.full((64, 64), 20, dtype=np.uint16)) == ["dark"]
+    assert check(g, np.full((64, 64), 4095, dtype=np.uint16)) == ["saturated"]
+    assert check(g, textured()) == []
+
+
+def test_duplicate_of_the_previous_angle():
+    g = gate()
+    frame = textured()
+    assert check(g, frame, 0) == []
+    assert check(g, frame, 1) == ["duplicate"]
+    assert check(g, textured(seed=1), 1) == []
+
+
+def test_blur_is_judged_against_accepted_frames():
+    g = gate()
+    for i in range(3):
+        assert check(g, textured(seed=i), i) == []
+    flat = np.full((64, 64), 2000, dtype=np.uint16)
+    flat[:, 32:] = 2100     # Some change to the previous frame, but no texture
+    assert check(g, flat, 3) == ["blurred"]
+    assert "1 blurred" in g.summary()
@@ -0,0 +1,45 @@
+import threading
+import pytest
+import frame_wait
+from frame_wait import DirectoryWatch, FrameWaiter
+
+
+@pytest.fixture
+def polling(monkeypatch):
+    monkeypatch.setattr(frame_wait, "INotify", None)
+
+
+def test_polling_watch_waits_for_the_file(tmp_path, polling):
+    watch = DirectoryWatch(str(tmp_path))
+    assert watch.mode == "poll"
+    assert not watch.wait_for(str(tmp_path / "frame_1.tiff"), timeout=0.1)
+    threading.Timer(0.1, (tmp_path / "frame_1.tiff").write_bytes, [b"data"]).start()
+    assert watch.wait_for(str(tmp_path / "frame_1.tiff"), timeout=2.0)
+
+
+def test_inotify_watch_waits_for_the_close(tmp_path):
+    pytest.importorskip("inotify_simple")
+    (tmp_path / "old.tiff").write_bytes(b"data")
+    watch = DirectoryWatch(str(tmp_path))
+    assert watch.mode == "inotify"
+    # Already there before the watch started
+    assert watch.wait_for(str(tmp_path / "old.tiff"), timeout=0.1)
+
+    path = tmp_path / "frame_1.tiff"
+    with open(path, "wb") as f:
+        f.write(b"half a frame")
+        f.flush()
+        assert not watch.wait_for(str(path), timeout=0.2)
+    assert watch.wait_for(str(path), timeout=1.0)
+    watch.close()
+
+
+def test_counter_timeout_is_logged(tmp_path, polling, capsys):
+    ophyd = pytest.importorskip("ophyd")
+    counter = ophyd.Signal(name="TIFF1_ArrayCounter", value=0)
+    waiter = FrameWaiter(str(tmp_path), counter_signal=counter)
+    token = waiter.arm()
+    (tmp_path / "frame_1.tiff").write_bytes(b"data")
+    waiter.wait(token, str(tmp_path / "frame_1.tiff"), timeout=0.2)
+    assert "--TIFF1_ArrayCounter did not move past 0" in capsys.readouterr().out
+    waiter.close()
@@ -0,0 +1,64 @@
+import subprocess, sys, time
+import jobs
+from jobs import JobManager
+
+SLEEP = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+
+def wait_done(job, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not job.done and time.monotonic() < deadline:
+        job.wait_events(job.events[-1]["seq"], timeout=0.1)
+    return job.done
+
+
+def test_cancel_running_job_terminates_it():
+    manager = JobManager({"scan": 1})
+    job = manager.submit("scan", SLEEP)
+    while job.process is None:
+        time.sleep(0.01)
+    manager.cancel(job.id)
+    assert job.process.wait(timeout=5) != 0
+    assert job.status == "cancelled"
+
+
+def test_cancel_before_the_process_exists(monkeypatch):
+    manager = JobManager({"scan": 1})
+    started, real_popen = [], subprocess.Popen
+
+    def popen(*args, **kwargs):
+        # The cancel lands after "running" was set, before there is a process to stop
+        manager.cancel(manager.list()[0].id)
+        process = real_popen(*args, **kwargs)
+        started.append(process)
+        return process
+
+    monkeypatch.setattr(jobs.subprocess, "Popen", popen)
+    job = manager.submit("scan", SLEEP)
+    assert wait_done(job)
+    while not started:
+        time.sleep(0.01)
+    assert started[0].wait(timeout=5) != 0
+    assert job.status == "cancelled"
+
+
+def test_cancelled_while_queued_never_runs():
+    manager = JobManager({"scan": 1})
+    first = manager.submit("scan", SLEEP)
+    queued = manager.submit("scan", [sys.executable, "-c", "print('ran')"])
+    manager.cancel(queued.id)
+    manager.cancel(first.id)
+    manager._executors["scan"].shutdown(wait=True)
+    assert queued.status == "cancelled" and queued.process is None
+    # Not overwritten by "running" once a worker picks it up
+    assert [event["status"] for event in queued.events if event["event"] == "status"] == ["queued", "cancelled"]
+
+
+def test_only_the_newest_finished_jobs_are_kept():
+    manager = JobManager({"reconstruction": 2}, keep_finished=2)
+    submitted = [manager.submit("reconstruction", [sys.executable, "-c", "pass"]) for _ in range(5)]
+    manager._executors["reconstruction"].shutdown(wait=True)
+    assert all(job.status == "succeeded" for job in submitted)
+    kept = manager.list()
+    assert len(kept) == 2
+    assert {job.id for job in kept} == {job.id for job in sorted(submitted, key=lambda job: job.finished)[-2:]}
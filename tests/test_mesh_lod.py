@@ -0,0 +1,46 @@
+import json, os, types
+import pytest
+import mesh_lod
+
+
+class FakeMesh:
+    def __init__(self, faces):
+        self.triangles = [None] * faces
+
+    def simplify_quadric_decimation(self, target_number_of_triangles):
+        return FakeMesh(target_number_of_triangles)
+
+    def remove_unreferenced_vertices(self):
+        pass
+
+    def compute_vertex_normals(self):
+        pass
+
+
+def fake_open3d(fail_on=None):
+    """ open3d stand-in: writes the face count, write_triangle_mesh returns False for `fail_on` like open3d does. """
+    def write_triangle_mesh(path, mesh, write_ascii=False):
+        if fail_on and path.endswith(fail_on):
+            return False
+        with open(path, "w") as f:
+            f.write(str(len(mesh.triangles)))
+        return True
+
+    return types.SimpleNamespace(io=types.SimpleNamespace(read_triangle_mesh=lambda path: FakeMesh(1000),
+                                                           write_triangle_mesh=write_triangle_mesh))
+
+
+def test_levels_decimate_in_turn(tmp_path, monkeypatch):
+    monkeypatch.setattr(mesh_lod, "o3d", fake_open3d())
+    faces = mesh_lod.write_lods(str(tmp_path), {"mid": 400, "low": 100})
+    assert faces == {"full": 1000, "mid": 400, "low": 100}
+    assert (tmp_path / mesh_lod.lod_file("low")).read_text() == "100"
+    assert json.load(open(tmp_path / "lods.json"))["faces"] == faces
+
+
+def test_failed_write_raises_and_is_not_recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(mesh_lod, "o3d", fake_open3d(fail_on=mesh_lod.lod_file("low")))
+    with pytest.raises(RuntimeError, match="Could not write"):
+        mesh_lod.write_lods(str(tmp_path), {"mid": 400, "low": 100})
+    assert not os.path.exists(tmp_path / "lods.json")
+    assert not os.path.exists(tmp_path / mesh_lod.lod_file("low"))
@@ -0,0 +1,101 @@
+import sys, threading, time, types
+import pytest
+import motor_client
+
+
+class FakeStatus:
+    def __init__(self):
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise TimeoutError("move did not finish")
+
+
+class FakeSignal:
+    """ user_readback: subscribers get every new value, like a CA monitor. """
+
+    def __init__(self, value):
+        self.value = value
+        self.callbacks = []
+
+    def subscribe(self, callback, run=True):
+        self.callbacks.append(callback)
+        if run:
+            callback(value=self.value, timestamp=time.time())
+
+    def put(self, value):
+        self.value = value
+        for callback in self.callbacks:
+            callback(value=value, timestamp=time.time())
+
+
+class FakeEpicsMotor:
+    """ Moves in a background thread, the readback monitor fires on the way and at the end. """
+    instances = []
+
+    def __init__(self, pv, name=None):
+        self.pv = pv
+        self.user_readback = FakeSignal(10.0)
+        self.moving = False
+        self.targets = []
+        FakeEpicsMotor.instances.append(self)
+
+    def wait_for_connection(self, timeout=None):
+        pass
+
+    def set(self, position):
+        self.targets.append(position)
+        status = FakeStatus()
+        self.moving = True
+
+        def move():
+            start = self.user_readback.value
+            for step in (0.5, 1.0):
+                time.sleep(0.02)
+                self.user_readback.put(start + (position - start) * step)
+            self.moving = False
+            status.done.set()
+
+        threading.Thread(target=move, daemon=True).start()
+        return status
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(sys.modules, "ophyd", types.SimpleNamespace(EpicsMotor=FakeEpicsMotor))
+    FakeEpicsMotor.instances.clear()
+    return motor_client.MotorClient("TEST:MOTOR")
+
+
+def test_readback_follows_the_monitor(client):
+    assert FakeEpicsMotor.instances[0].pv == "TEST:MOTOR"
+    assert client.position == 10.0
+    assert client.readback()["angle"] == 10.0 * motor_client.MOTOR_TO_DEGREES
+    FakeEpicsMotor.instances[0].user_readback.put(12.0)
+    assert client.angle == 12.0 * motor_client.MOTOR_TO_DEGREES
+
+
+def test_move_by_is_relative_to_the_readback(client):
+    assert client.move_by(4.0) == 14.0
+    assert client.move_by(-2.0) == 12.0
+    assert FakeEpicsMotor.instances[0].targets == [14.0, 12.0]
+    assert not client.readback()["moving"]
+
+
+def test_move_by_without_waiting_returns_the_target(client):
+    assert client.move_by(4.0, wait=False) == 14.0
+    assert client.position < 14.0
+    assert client.readback()["moving"]
+
+
+def test_move_motor_by_endpoint(client, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    import server
+
+    monkeypatch.setattr(server, "get_motor_client", lambda: client)
+    response = TestClient(server.app).get("/move_motor_by/3")
+    assert response.json().endswith(str(13.0 * motor_client.MOTOR_TO_DEGREES))
+    assert client.position == 13.0
@@ -0,0 +1,85 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+import preprocess
+from preprocess import crop_array, encode_frame, preprocess_directory, read_frame
+
+CROP_BOX = (2, 1, 7, 5)     # (left, upper, right, lower)
+
+
+def frame(shape=(8, 10)):
+    return (np.arange(shape[0] * shape[1], dtype=np.uint16) * 300).reshape(shape)
+
+
+def test_crop_array_matches_pil_crop():
+    cropped = crop_array(frame(), CROP_BOX)
+    assert cropped.shape == (4, 5)
+    assert (cropped == np.asarray(Image.fromarray(frame()).crop(CROP_BOX))).all()
+
+
+def test_encode_frame_replaces_the_file_atomically(tmp_path, monkeypatch):
+    replaced = []
+    real_replace = os.replace
+
+    def replace(src, dst):
+        # The final name only appears once the file is complete
+        assert not os.path.exists(dst) and os.path.getsize(src) > 0
+        replaced.append((src, dst))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(preprocess.os, "replace", replace)
+    out_path = str(tmp_path / "frame_1.png")
+    assert encode_frame(frame(), out_path, CROP_BOX) == out_path
+    assert replaced == [(out_path + ".part", out_path)]
+    assert os.listdir(tmp_path) == ["frame_1.png"]
+    # 16-bit values survive the round trip
+    assert (read_frame(out_path) == crop_array(frame(), CROP_BOX)).all()
+
+
+def test_preprocess_directory_writes_png_and_cropped_tiff(tmp_path):
+    raw_dir, png_dir, cropped_dir = (str(tmp_path / name) for name in ("raw_images", "images_png", "images"))
+    os.makedirs(raw_dir)
+    for i in range(3):
+        Image.fromarray(frame() + i).save(os.path.join(raw_dir, f"frame_{i}.tiff"))
+    open(os.path.join(raw_dir, "notes.txt"), "w").close()
+
+    written = preprocess_directory(raw_dir, png_dir, cropped_dir, crop_box=CROP_BOX, workers=1)
+    assert sorted(os.path.basename(p) for p in written) == ["frame_0.png", "frame_1.png", "frame_2.png"]
+    assert sorted(os.listdir(cropped_dir)) == ["frame_0.tiff", "frame_1.tiff", "frame_2.tiff"]
+    for name, folder in (("frame_2.png", png_dir), ("frame_2.tiff", cropped_dir)):
+        assert (read_frame(os.path.join(folder, name)) == crop_array(frame() + 2, CROP_BOX)).all()
+    assert not [name for name in os.listdir(png_dir) if name.endswith(".part")]
+
+
+def test_previews_are_written_per_level(tmp_path):
+    png_path = str(tmp_path / "images_png" / "frame_1.png")
+    os.makedirs(os.path.dirname(png_path))
+    wide = np.tile(frame(), (10, 200))          # 80 x 2000, 16-bit
+    written = preprocess.write_previews(wide, png_path)
+
+    assert written == [str(tmp_path / "previews" / level / "frame_1.jpg") for level in ("mid", "preview")]
+    sizes = {}
+    for path in written:
+        with Image.open(path) as im:
+            assert im.format == "JPEG" and im.mode == "L"
+            sizes[os.path.basename(os.path.dirname(path))] = im.size
+    assert sizes == {"mid": (1200, 48), "preview": (600, 24)}
+    assert not [name for name in os.listdir(tmp_path / "previews" / "mid") if name.endswith(".part")]
+
+
+def test_small_images_keep_their_size(tmp_path):
+    png_path = str(tmp_path / "images_png" / "frame_1.png")
+    os.makedirs(os.path.dirname(png_path))
+    encode_frame(frame(), png_path, CROP_BOX, previews=True)
+    with Image.open(preprocess.preview_path(png_path, "preview")) as im:
+        assert im.size == (5, 4)
+
+
+def test_best_preview_falls_back_to_the_image(tmp_path):
+    raw_path = str(tmp_path / "raw_images" / "frame_1.tiff")
+    assert preprocess.best_preview(raw_path) == raw_path
+    preprocess.write_previews(frame(), str(tmp_path / "images_png" / "frame_1.png"), levels={"preview": 600})
+    # Any projection of the scan maps to the same preview
+    assert preprocess.best_preview(raw_path) == str(tmp_path / "previews" / "preview" / "frame_1.jpg")
+    assert preprocess.best_preview(raw_path, "mid") == raw_path
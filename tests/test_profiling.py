@@ -0,0 +1,46 @@
+import json, os, subprocess, sys
+import pytest
+from profiling import Profiler
+
+# Burns CPU, holds ~50 MB and writes 1 MB, then stays up long enough for /proc/<pid>/io to be sampled
+CHILD = """
+import sys, time
+block = bytearray(50 * 1024 * 1024)
+sum(i * i for i in range(300000))
+with open(sys.argv[1], "wb") as f:
+    f.write(b"x" * 1024 * 1024)
+time.sleep(0.3)
+sys.exit(int(sys.argv[2]))
+"""
+
+
+def test_run_records_the_child_in_the_current_stage(tmp_path):
+    profiler = Profiler(scan="bunny")
+    with profiler.stage("dense"):
+        result = profiler.run([sys.executable, "-c", CHILD, str(tmp_path / "out.bin"), "0"], poll_interval=0.01)
+    assert result.returncode == 0
+
+    stage = profiler.stages[0]
+    record = stage["processes"][0]
+    assert stage["status"] == "done" and record["process"] == os.path.basename(sys.executable)
+    assert record["args"][-1] == "0" and record["returncode"] == 0
+    assert 0.3 <= record["wall"] <= stage["wall"]
+    assert record["cpu_user"] > 0 and stage["cpu_user"] == record["cpu_user"]
+    assert 50 <= record["peak_rss_mb"] < 1000
+    if os.path.exists("/proc/self/io"):
+        assert record["wchar"] >= 1024 * 1024
+
+    report = json.load(open(profiler.save(str(tmp_path / "profile" / "report.json"))))
+    assert report["meta"]["scan"] == "bunny"
+    assert report["stages"][0]["processes"][0]["peak_rss_mb"] == record["peak_rss_mb"]
+
+
+def test_failed_child_outside_a_stage(tmp_path):
+    profiler = Profiler()
+    args = [sys.executable, "-c", CHILD, str(tmp_path / "out.bin"), "3"]
+    assert profiler.run(args, poll_interval=0.01).returncode == 3
+    # A process outside any stage becomes its own stage
+    assert profiler.stages[0]["stage"] == os.path.basename(sys.executable)
+    assert profiler.stages[0]["processes"][0]["returncode"] == 3
+    with pytest.raises(subprocess.CalledProcessError):
+        profiler.run(args, check=True, poll_interval=0.01)
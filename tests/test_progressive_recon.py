@@ -0,0 +1,55 @@
+import os, struct
+import pytest
+from progressive_recon import QuickLook
+
+
+class FakeColmap:
+    """ Stands in for the COLMAP steps of a QuickLook, failing the mapper `failures` times. """
+
+    def __init__(self, quicklook, failures=1):
+        self.quicklook = quicklook
+        self.failures = failures
+        self.extracted = []
+        quicklook._extract = self.extract
+        quicklook._match = lambda names: None
+        quicklook._map = self.map
+        quicklook._register = lambda: None
+        quicklook._bundle_adjust = lambda: None
+        quicklook._export = lambda: None
+
+    def extract(self, names):
+        self.extracted += names
+        self.quicklook.selected += names
+
+    def map(self):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("mapper found no initial pair")
+        os.makedirs(self.quicklook.model_dir, exist_ok=True)
+        with open(os.path.join(self.quicklook.model_dir, "images.bin"), "wb") as f:
+            f.write(struct.pack("<Q", len(self.quicklook.selected)))
+
+
+@pytest.fixture
+def quicklook(tmp_path):
+    (tmp_path / "images_png").mkdir()
+    quicklook = QuickLook(str(tmp_path), stride=1, min_images=2, threads=1)
+    yield quicklook
+    quicklook._watch.close()
+
+
+def test_failed_update_keeps_its_projections(quicklook):
+    colmap = FakeColmap(quicklook)
+    for i in range(2):
+        quicklook.add(f"scan_1_pos_{i}_shot_angle_{i * 2.8125}_{i + 1}.png")
+
+    quicklook.update()
+    assert quicklook.state == "retrying"
+    assert len(quicklook.pending) == 2 and quicklook._tried == 2
+
+    quicklook.add("scan_1_pos_2_shot_angle_5.625_3.png")
+    quicklook.update()
+    assert quicklook.state == "running"
+    assert quicklook.pending == [] and quicklook._tried == 0
+    # Extracted once each, the retry only extracts the newcomer
+    assert sorted(colmap.extracted) == sorted(quicklook.selected) and len(quicklook.selected) == 3
@@ -0,0 +1,81 @@
+import os, stat
+import pytest
+import mesh_lod
+import recon_profiles
+import reconstruction
+from recon_profiles import PROFILE_NAMES, ReconstructionProfile, available_cores
+
+
+@pytest.mark.parametrize("name, undistorted, level", [("fast", ["--max_image_size", "1000"], "2"),
+                                                       ("balanced", ["--max_image_size", "2000"], "1"),
+                                                       ("high", [], "0")])
+def test_profile_sets_the_stage_options(name, undistorted, level):
+    settings = ReconstructionProfile(name, cores=4, memory_gb=64)
+    assert settings.args("image_undistorter") == undistorted
+    dense = settings.args("DensifyPointCloud", threads=False)
+    assert dense[dense.index("--resolution-level") + 1] == level
+    assert settings.args("TextureMesh", threads=False) == ["--resolution-level", level]
+    assert settings.texture_lod == {"fast": "low", "balanced": "mid", "high": "full"}[name]
+    # Thread flags only when asked for, and only for stages that take one
+    assert settings.args("DensifyPointCloud") == dense + ["--max-threads", "4"]
+    assert settings.args("feature_extraction")[-2:] == ["--SiftExtraction.num_threads", "4"]
+    assert settings.thread_args("image_undistorter") == []
+
+
+def test_dense_stages_get_the_threads_memory_holds():
+    # high wants 2 GB per dense thread: 8 GB hold 4 of the 16 threads
+    settings = ReconstructionProfile("high", cores=16, memory_gb=8)
+    assert settings.threads == 16
+    assert settings.threads_for("feature_matching") == 16
+    assert settings.threads_for("DensifyPointCloud") == settings.threads_for("TextureMesh") == 4
+    assert ReconstructionProfile("fast", cores=16, memory_gb=8).threads_for("DensifyPointCloud") == 16
+    assert ReconstructionProfile("high", cores=16, memory_gb=1).threads_for("ReconstructMesh") == 1
+    # --threads overrides the core count
+    assert ReconstructionProfile("balanced", threads=2, cores=16, memory_gb=64).threads_for("mapper") == 2
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        ReconstructionProfile("ultra")
+    assert set(PROFILE_NAMES) == set(recon_profiles.PROFILES)
+
+
+def test_available_cores_follows_the_affinity(monkeypatch):
+    monkeypatch.setattr(recon_profiles.os, "sched_getaffinity", lambda pid: {0, 2, 5}, raising=False)
+    assert available_cores() == 3
+    assert ReconstructionProfile("balanced", memory_gb=64).threads == 3
+    monkeypatch.delattr(recon_profiles.os, "sched_getaffinity")
+    monkeypatch.setattr(recon_profiles.os, "cpu_count", lambda: 6)
+    assert available_cores() == 6
+
+
+def fake_tool(bin_dir, name, output):
+    """ Stands in for an OpenMVS binary: logs its arguments and writes `output` in its working directory. """
+    path = os.path.join(bin_dir, name)
+    with open(path, "w") as f:
+        f.write(f'#!/bin/sh\necho "{name} $*" >> "{bin_dir}/calls.log"\ntouch {output}\n')
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+
+def test_thread_count_does_not_rerun_the_openmvs_pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(mesh_lod, "o3d", None)      # No DecimateMesh, TextureMesh takes the full mesh
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake_tool(str(bin_dir), "InterfaceCOLMAP", "scene.mvs")
+    fake_tool(str(bin_dir), "DensifyPointCloud", "scene_dense.mvs")
+    fake_tool(str(bin_dir), "ReconstructMesh", "scene_dense_mesh.ply")
+    fake_tool(str(bin_dir), "TextureMesh", "scene_texture.ply")
+    workspace = str(tmp_path / "workspace")
+
+    def run(threads, profile="balanced"):
+        reconstruction.run_openmvs_pipeline(str(tmp_path), str(tmp_path / "images"), workspace, str(bin_dir), "scan",
+                                            threads=threads, profile=profile)
+        with open(bin_dir / "calls.log") as f:
+            return [line.split()[0] for line in f]
+
+    assert run(threads=2) == ["InterfaceCOLMAP", "DensifyPointCloud", "ReconstructMesh", "TextureMesh"]
+    assert "--max-threads 2" in (bin_dir / "calls.log").read_text().splitlines()[1]
+    # Same profile on fewer threads: nothing to redo
+    assert len(run(threads=1)) == 4
+    # Another profile changes the dense options, and everything after them
+    assert run(threads=1, profile="fast")[4:] == ["DensifyPointCloud", "ReconstructMesh", "TextureMesh"]
@@ -0,0 +1,48 @@
+import os, subprocess, sys, threading, time
+import resource_pool
+from resource_pool import DetectorLock, ResourcePool
+
+
+def test_cpu_stages_never_oversubscribe_the_cores(tmp_path):
+    pool = ResourcePool(str(tmp_path), cores=2)
+    events = []
+
+    def second_stage():
+        with pool.hold("feature_extraction", cores=1):
+            events.append("second")
+
+    with pool.hold("patch_match_stereo", cores=2):
+        thread = threading.Thread(target=second_stage)
+        thread.start()
+        time.sleep(0.3)
+        events.append("first done")
+    thread.join(timeout=5)
+    assert events == ["first done", "second"]
+
+
+def test_io_stage_runs_beside_cpu_stages(tmp_path):
+    pool = ResourcePool(str(tmp_path), cores=1, io_slots=1)
+    with pool.hold("mapper", cores=4):      # Capped at the pool's cores
+        with pool.hold("image_undistorter") as waited:
+            assert waited < 0.5
+
+
+def test_detector_lock_is_exclusive_across_processes(tmp_path):
+    path = str(tmp_path / "detector.lock")
+    holder = subprocess.Popen([sys.executable, "-c", f"""
+import sys, time
+from resource_pool import DetectorLock
+DetectorLock("scan bunny", {path!r}).acquire()
+print("held", flush=True)
+sys.stdin.read()
+"""], cwd=os.path.dirname(resource_pool.__file__), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    assert holder.stdout.readline().strip() == "held"
+
+    daemon = DetectorLock("acquisition daemon", path, poll_interval=0.01)
+    assert not daemon.acquire(timeout=0.1)
+    assert daemon.holder().startswith("scan bunny (pid ")
+
+    holder.communicate("")          # Exits, which releases the lock
+    assert daemon.acquire(timeout=2.0)
+    assert daemon.holder().startswith("acquisition daemon")
+    daemon.release()
@@ -0,0 +1,55 @@
+import os
+from scan_angles import ANGLE_INDEX_NAME, angle_index_stamp, load_angle_index, neighbor_pairs
+
+
+def _frame(directory, angle, number):
+    path = directory / f"scan_1_pos_{number}_shot_angle_{angle}_{number}.png"
+    path.write_bytes(b"")
+    return path
+
+
+def test_index_is_rebuilt_when_frames_were_added_since(tmp_path):
+    png_dir = tmp_path / "images_png"
+    png_dir.mkdir()
+    _frame(png_dir, 0.0, 1)
+    _frame(png_dir, 90.0, 2)
+    assert len(load_angle_index(str(tmp_path))) == 2
+    stamp = angle_index_stamp(str(tmp_path))
+    assert stamp[0] is not None
+
+    _frame(png_dir, 45.0, 3)
+    mtime = os.stat(tmp_path / ANGLE_INDEX_NAME).st_mtime + 1
+    os.utime(png_dir, (mtime, mtime))
+    assert angle_index_stamp(str(tmp_path)) != stamp
+    index = load_angle_index(str(tmp_path))
+    assert len(index) == 3
+    assert index.nearest(44.0)[0] == 45.0
+
+
+def test_current_index_is_loaded_as_saved(tmp_path):
+    png_dir = tmp_path / "images_png"
+    png_dir.mkdir()
+    _frame(png_dir, 10.0, 1)
+    load_angle_index(str(tmp_path))
+    # Saved after the frames: a frame removed behind its back is not noticed
+    os.remove(next(png_dir.iterdir()))
+    mtime = os.stat(tmp_path / ANGLE_INDEX_NAME).st_mtime - 1
+    os.utime(png_dir, (mtime, mtime))
+    assert len(load_angle_index(str(tmp_path))) == 1
+
+
+def test_neighbor_pairs_wrap_around_a_full_rotation():
+    angles = {f"f{i}.png": i * 45.0 for i in range(8)}
+    pairs = neighbor_pairs(angles, neighbors=1)
+    assert len(pairs) == 8
+    assert ("f0.png", "f7.png") in pairs
+
+
+def test_neighbor_pairs_of_a_partial_rotation_do_not_wrap():
+    angles = {f"f{i}.png": 10.0 * i for i in range(10)}
+    pairs = neighbor_pairs(angles, neighbors=2)
+    assert len(pairs) == 9 + 8
+    assert ("f0.png", "f9.png") not in pairs
+    # Sorted by angle, not by name
+    shuffled = {"b.png": 20.0, "a.png": 0.0, "c.png": 10.0}
+    assert neighbor_pairs(shuffled, neighbors=1) == [("a.png", "c.png"), ("b.png", "c.png")]
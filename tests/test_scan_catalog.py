@@ -0,0 +1,59 @@
+import os, time
+import pytest
+from scan_catalog import Catalog
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = Catalog(str(tmp_path / "catalog.db"))
+    yield catalog
+    catalog.close()
+
+
+def write_frames(directory, angles, ext="tiff", mtime=None):
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, angle in enumerate(angles):
+        path = directory / f"scan_1_pos_{i}_shot_angle_{angle}_{i + 1}.{ext}"
+        path.write_bytes(b"frame")
+        if mtime is not None:
+            os.utime(path, (mtime + i, mtime + i))
+        paths.append(str(path))
+    return paths
+
+
+def test_index_scan_counts_and_angles(catalog, tmp_path):
+    scan_dir = tmp_path / "scan_a"
+    write_frames(scan_dir / "raw_images", [0.0, 2.8125, 5.625, 8.4375])
+    write_frames(scan_dir / "images_png", [0.0, 2.8125], ext="png")
+    assert catalog.index_scan("scan_a", str(scan_dir)) == 6
+    assert catalog.index_scan("scan_a", str(scan_dir)) == 0     # Nothing new the second time
+
+    scan = catalog.scan("scan_a")
+    assert scan["num_projections"] == 4
+    assert (scan["angle_min"], scan["angle_max"]) == (0.0, 8.4375)
+    assert [row["angle"] for row in catalog.files("scan_a", "png")] == [0.0, 2.8125]
+
+
+def test_reindex_forgets_deleted_files(catalog, tmp_path):
+    scan_dir = tmp_path / "scan_a"
+    paths = write_frames(scan_dir / "raw_images", [0.0, 90.0, 180.0], mtime=time.time() - 100)
+    catalog.index_scan("scan_a", str(scan_dir))
+    assert catalog.latest_projection("raw")["path"] == paths[-1]
+
+    os.remove(paths[-1])
+    catalog.index_scan("scan_a", str(scan_dir))
+    scan = catalog.scan("scan_a")
+    assert scan["num_projections"] == 2 and scan["angle_max"] == 90.0
+    assert catalog.latest_projection("raw")["path"] == paths[1]
+
+
+def test_latest_projection_across_scans(catalog, tmp_path):
+    now = time.time()
+    old = write_frames(tmp_path / "scan_a" / "raw_images", [0.0], mtime=now - 100)
+    new = write_frames(tmp_path / "scan_b" / "images_png", [45.0], ext="png", mtime=now - 10)
+    catalog.index_scan("scan_b", str(tmp_path / "scan_b"))
+    catalog.index_scan("scan_a", str(tmp_path / "scan_a"))
+    assert catalog.latest_projection()["path"] == new[0]
+    assert catalog.latest_projection("raw")["path"] == old[0]
+    assert catalog.latest_projection("raw")["angle"] == 0.0
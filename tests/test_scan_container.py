@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("h5py")
+from PIL import Image
+from scan_container import ScanContainer, ScanWriter, pack_directory
+
+
+def frames(n, shape=(6, 8)):
+    return [np.full(shape, 100 * i, dtype=np.uint16) + np.arange(shape[1], dtype=np.uint16) for i in range(n)]
+
+
+@pytest.mark.parametrize("compression", ["gzip", None])
+def test_round_trip(tmp_path, compression):
+    path = str(tmp_path / "scan.h5")
+    angles = [0.0, 2.8125, 5.625]
+    with ScanWriter(path, 5, compression=compression, attrs={"save_name": "bunny"}) as writer:
+        for i, (frame, angle) in enumerate(zip(frames(3), angles)):
+            writer.append(frame, angle, f"/x/scan_1_pos_{i}_shot_angle_{angle}_{i + 1}.tiff",
+                          motor_readback=angle / 2.8125, timestamp=1000.0 + i, exposure=0.1)
+
+    with ScanContainer(path) as container:
+        # Sized for 5, only 3 written
+        assert len(container) == 3
+        assert container.names[1] == "scan_1_pos_1_shot_angle_2.8125_2"
+        assert list(container.angles) == angles
+        assert list(container.motor_readback) == [0.0, 1.0, 2.0]
+        assert (container.projection(2) == frames(3)[2]).all()
+        angle, frame = container.projection_at(359.0)     # Closer to 0° across the wrap
+        assert angle == 0.0 and (frame == frames(3)[0]).all()
+        assert container.angle_map()["scan_1_pos_2_shot_angle_5.625_3"] == 5.625
+
+
+def test_memmap_only_for_contiguous_stacks(tmp_path):
+    for compression in (None, "gzip"):
+        path = str(tmp_path / f"scan_{compression}.h5")
+        with ScanWriter(path, 3, compression=compression) as writer:
+            for i, frame in enumerate(frames(3)):
+                writer.append(frame, float(i), f"f_{i}.tiff")
+        with ScanContainer(path) as container:
+            stack = container.memmap()
+            assert isinstance(stack, np.memmap) == (compression is None)
+            assert (np.asarray(stack[1]) == frames(3)[1]).all()
+
+
+def test_contiguous_container_is_not_resized(tmp_path):
+    with ScanWriter(str(tmp_path / "scan.h5"), 1, compression=None) as writer:
+        writer.append(frames(1)[0], 0.0, "f_0.tiff")
+        with pytest.raises(ValueError):
+            writer.append(frames(1)[0], 1.0, "f_1.tiff")
+
+
+def test_pack_directory_of_tiffs(tmp_path):
+    raw_dir = tmp_path / "raw_images"
+    raw_dir.mkdir()
+    for i, angle in enumerate([90.0, 0.0, 45.0]):
+        Image.fromarray(frames(3)[i]).save(raw_dir / f"scan_1_pos_{i}_shot_angle_{angle}_{i + 1}.tiff")
+    (raw_dir / "notes.tiff").write_bytes(b"")       # No angle, left out
+    (tmp_path / "fly.csv").write_text("file,motor_readback,timestamp\n"
+                                      "scan_1_pos_1_shot_angle_0.0_2.tiff,0.01,5.0\n")
+
+    path = str(tmp_path / "scan.h5")
+    assert pack_directory(str(raw_dir), path, metadata_path=str(tmp_path / "fly.csv")) == 3
+    with ScanContainer(path) as container:
+        assert list(container.angles) == [0.0, 45.0, 90.0]
+        assert (container.projection(0) == frames(3)[1]).all()
+        assert container.motor_readback[0] == 0.01 and container.timestamp[0] == 5.0
+        assert np.isnan(container.motor_readback[1])
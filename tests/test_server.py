@@ -0,0 +1,103 @@
+import asyncio, json, os, threading
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+import server
+
+
+@pytest.fixture
+def data_root(tmp_path, monkeypatch):
+    root = tmp_path / "data"
+    (root / "scan_a" / "workspace" / "quicklook").mkdir(parents=True)
+    (tmp_path / "outside" / "workspace" / "quicklook").mkdir(parents=True)
+    for scan_dir in (root / "scan_a", tmp_path / "outside"):
+        with open(scan_dir / "workspace" / "quicklook" / "status.json", "w") as f:
+            json.dump({"registered": 3, "model": None}, f)
+    monkeypatch.setattr(server, "DATA_ROOT", str(root))
+    return root
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+@pytest.mark.parametrize("endpoint", ["projection?angle=0", "render", "model.glb", "quicklook", "quicklook.ply"])
+def test_scan_endpoints_stay_inside_the_data_root(data_root, client, endpoint):
+    # %2E%2E reaches the route as "..", the scan name itself
+    response = client.get(f"/scans/%2E%2E/{endpoint}")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "No scan .."
+
+
+def test_quicklook_of_a_scan(data_root, client):
+    assert client.get("/scans/scan_a/quicklook").json()["registered"] == 3
+    assert client.get("/scans/missing/quicklook").status_code == 404
+
+
+@pytest.mark.parametrize("views", [0, server.MAX_VIEWS + 1, 10_000])
+def test_render_caps_the_number_of_views(data_root, client, views):
+    response = client.get(f"/scans/scan_a/render?views={views}")
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def job(monkeypatch):
+    from jobs import Job
+    job = Job("scan", ["true"])
+    monkeypatch.setitem(server.job_manager._jobs, job.id, job)
+    monkeypatch.setattr(server, "POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(server, "KEEP_ALIVE", 0.05)
+    return job
+
+
+def test_job_events_stream_until_the_final_status(client, job):
+    job.set_status("running")
+    job.publish({"event": "log", "line": "hidden"})
+    threading.Timer(0.2, job.set_status, ["succeeded"]).start()
+    with client.stream("GET", f"/jobs/{job.id}/events") as response:
+        body = "".join(response.iter_text())
+    assert "event: log" not in body
+    assert ": keep-alive" in body
+    assert '"status": "succeeded"' in body.rstrip().splitlines()[-1]
+
+
+def test_job_socket_keeps_alive_while_waiting(client, job):
+    job.set_status("running")
+    threading.Timer(0.2, job.set_status, ["failed"]).start()
+    with client.websocket_connect(f"/jobs/{job.id}/ws") as websocket:
+        messages = []
+        while not messages or messages[-1].get("status") != "failed":
+            messages.append(websocket.receive_json())
+    kinds = [message["event"] for message in messages]
+    assert kinds[0] == "status" and kinds[-1] == "status"
+    assert "keep-alive" in kinds
+
+
+def test_motor_events_stop_when_the_client_leaves(monkeypatch):
+    class FakeMotor:
+        calls = 0
+
+        def readback(self):
+            FakeMotor.calls += 1
+            return {"position": 1.0, "angle": 2.8125, "timestamp": float(FakeMotor.calls // 3), "moving": False}
+
+    class LeavingRequest:
+        polls = 0
+
+        async def is_disconnected(self):
+            LeavingRequest.polls += 1
+            return LeavingRequest.polls > 9
+
+    async def collect():
+        response = await server.stream_motor(LeavingRequest(), min_interval=0.001)
+        return [chunk async for chunk in response.body_iterator]
+
+    monkeypatch.setattr(server, "get_motor_client", FakeMotor)
+    monkeypatch.setattr(server, "POLL_INTERVAL", 0.001)
+    chunks = asyncio.run(collect())
+    assert LeavingRequest.polls == 10
+    # A new timestamp every third readback
+    assert sum(chunk.startswith("id: ") for chunk in chunks) == 4
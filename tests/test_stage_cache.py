@@ -0,0 +1,90 @@
+import os, stat, subprocess
+import pytest
+import reconstruction
+from stage_cache import StageCache
+
+
+def fake_tool(bin_dir, name, body):
+    """ Executable shell script standing in for an OpenMVS binary. """
+    os.makedirs(bin_dir, exist_ok=True)
+    path = os.path.join(bin_dir, name)
+    with open(path, "w") as f:
+        f.write("#!/bin/sh\n" + body + "\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def write(path, text="x"):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_skips_unchanged_stage_and_reruns_on_new_args(tmp_path):
+    calls = []
+    cache = StageCache(str(tmp_path))
+    out = tmp_path / "out.txt"
+
+    def stage(value):
+        calls.append(value)
+        write(out, value)
+
+    assert cache.run("stage", stage, "a", outputs=[str(out)])
+    assert not StageCache(str(tmp_path)).run("stage", stage, "a", outputs=[str(out)])
+    assert StageCache(str(tmp_path)).run("stage", stage, "b", outputs=[str(out)])
+    assert calls == ["a", "b"]
+
+
+def test_upstream_rerun_invalidates_downstream(tmp_path):
+    calls = []
+    cache = StageCache(str(tmp_path))
+    cache.run("first", calls.append, "first")
+    cache.run("second", calls.append, "second", after="first")
+    cache.run("second", calls.append, "second", after="first")
+    StageCache(str(tmp_path), force=True).run("first", calls.append, "first")
+    StageCache(str(tmp_path)).run("second", calls.append, "second", after="first")
+    assert calls == ["first", "second", "first", "second"]
+
+
+def test_failed_openmvs_stage_does_not_cache_stale_output(tmp_path):
+    dense_dir = tmp_path / "dense"
+    dense_dir.mkdir()
+    scene_mvs, dense_mvs = str(dense_dir / "scene.mvs"), str(dense_dir / "scene_dense.mvs")
+    write(scene_mvs)
+    write(dense_mvs, "from the last run")
+    bin_dir = str(tmp_path / "bin")
+    fake_tool(bin_dir, "DensifyPointCloud", "exit 1")
+
+    cache = StageCache(str(tmp_path))
+    with pytest.raises(subprocess.CalledProcessError):
+        cache.run("DensifyPointCloud", reconstruction.densify_point_cloud, scene_mvs, str(dense_dir), bin_dir, ["--x"],
+                  outputs=[dense_mvs], reset=[dense_mvs])
+    assert not os.path.exists(dense_mvs)
+    assert "DensifyPointCloud" not in StageCache(str(tmp_path)).state
+
+    # Fixed tool: the stage runs again instead of being skipped
+    fake_tool(bin_dir, "DensifyPointCloud", "echo dense > scene_dense.mvs")
+    assert StageCache(str(tmp_path)).run("DensifyPointCloud", reconstruction.densify_point_cloud, scene_mvs,
+                                         str(dense_dir), bin_dir, ["--x"], outputs=[dense_mvs], reset=[dense_mvs])
+    assert open(dense_mvs).read().strip() == "dense"
+
+
+def test_missing_output_fails_the_stage(tmp_path):
+    cache = StageCache(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        cache.run("stage", lambda: None, outputs=[str(tmp_path / "never_written")])
+    assert "stage" not in cache.state
+
+
+def test_thread_count_does_not_invalidate_stage(tmp_path):
+    from recon_profiles import ReconstructionProfile
+    calls = []
+
+    def stage(options, threads=()):
+        calls.append(list(options) + list(threads))
+
+    # Interactive run on all cores, then a batch run on half of them
+    for threads in (16, 8):
+        settings = ReconstructionProfile("balanced", threads=threads, cores=16, memory_gb=64)
+        StageCache(str(tmp_path)).run("feature_extraction", stage, settings.args("feature_extraction", threads=False),
+                                      untracked={"threads": settings.thread_args("feature_extraction")})
+    assert calls == [["--SiftExtraction.num_threads", "16"]]
@@ -0,0 +1,85 @@
+import io, os, tarfile
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from transfer import parse_range, scan_files, tar_stream, file_response
+
+DATA = bytes(range(256)) * 16       # 4 KiB, compressible type below so gzip is on offer
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=4000-", (4000, 4095)),
+    ("bytes=-96", (4000, 4095)),
+    ("bytes=0-99999", (0, 4095)),
+    ("bytes=-99999", (0, 4095)),
+    # Not served as ranges: the whole file goes out instead
+    ("bytes=0-1,4-5", None),
+    ("items=0-9", None),
+    ("bytes=9-0", None),
+    ("bytes=--5", None),
+    ("bytes=abc", None),
+    ("bytes=-", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(DATA)) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=4096-", "bytes=-0"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(ValueError):
+        parse_range(header, len(DATA))
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "frame.tiff"
+    path.write_bytes(DATA)
+    app = FastAPI()
+
+    @app.get("/file")
+    def get_file(request: Request):
+        return file_response(request, str(path))
+
+    return TestClient(app)
+
+
+def test_range_and_if_range(client):
+    etag = client.get("/file", headers={"Accept-Encoding": "identity"}).headers["etag"]
+    response = client.get("/file", headers={"Range": "bytes=10-19", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.content == DATA[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(DATA)}"
+
+    # The client's copy is another version: the whole file, not a piece of this one
+    response = client.get("/file", headers={"Range": "bytes=10-19", "If-Range": '"stale"',
+                                            "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+    assert client.get("/file", headers={"Range": "bytes=5000-"}).status_code == 416
+    assert client.get("/file", headers={"Range": "bytes=9-0", "Accept-Encoding": "identity"}).status_code == 200
+
+
+def test_conditional_get_and_gzip(client):
+    response = client.get("/file", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == DATA     # Decoded by the client
+    assert client.get("/file", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+
+def test_tar_stream_of_a_scan(tmp_path):
+    for name, size in (("raw_images/a.tiff", 700), ("raw_images/b.tiff", 0), ("scan.h5", 1024), ("notes.txt", 3)):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(os.urandom(size))
+    files = scan_files(str(tmp_path), ("raw", "container"))
+    assert [name for name, _ in files] == ["raw_images/a.tiff", "raw_images/b.tiff", "scan.h5"]
+
+    os.remove(tmp_path / "raw_images" / "b.tiff")       # Gone before it is streamed
+    archive = tarfile.open(fileobj=io.BytesIO(b"".join(tar_stream(files, prefix="scan"))))
+    assert archive.getnames() == ["scan/raw_images/a.tiff", "scan/scan.h5"]
+    assert archive.extractfile("scan/scan.h5").read() == (tmp_path / "scan.h5").read_bytes()
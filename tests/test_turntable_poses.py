@@ -0,0 +1,69 @@
+import math, sqlite3
+import numpy as np
+import pytest
+from turntable_poses import CAMERA_MODEL_IDS, write_turntable_model
+
+INTRINSICS = {"model": "PINHOLE", "width": 800, "height": 700, "params": [1000.0, 1000.0, 400.0, 350.0],
+              "distance": 10.0, "direction": 1}
+
+
+def colmap_database(path, names):
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE cameras (camera_id INTEGER PRIMARY KEY, model INTEGER, width INTEGER, height INTEGER,
+                              params BLOB, prior_focal_length INTEGER);
+        CREATE TABLE images (image_id INTEGER PRIMARY KEY, name TEXT, camera_id INTEGER);
+        INSERT INTO cameras VALUES (1, 2, 640, 480, x'00', 0);
+    """)
+    connection.executemany("INSERT INTO images (image_id, name, camera_id) VALUES (?, ?, 1)",
+                           [(i + 1, name) for i, name in enumerate(names)])
+    connection.commit()
+    connection.close()
+
+
+def read_images_txt(model_dir):
+    with open(model_dir / "images.txt") as f:
+        rows = [line.split() for line in f if line.strip()]
+    return {row[-1]: [float(v) for v in row[1:8]] for row in rows}
+
+
+def test_poses_from_file_names(tmp_path):
+    names = ["scan_1_pos_0_shot_angle_0.0_1.png", "scan_1_pos_1_shot_angle_90.0_2.png", "no_angle.png"]
+    colmap_database(str(tmp_path / "database.db"), names)
+    assert write_turntable_model(str(tmp_path / "database.db"), INTRINSICS, str(tmp_path / "model")) == 2
+
+    poses = read_images_txt(tmp_path / "model")
+    assert poses[names[0]] == [1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 10.0]
+    qw, qx, qy, qz, *translation = poses[names[1]]
+    assert (qw, qy) == pytest.approx((math.sqrt(0.5), math.sqrt(0.5)))
+    assert (qx, qz) == (0.0, 0.0) and translation == [0.0, 0.0, 10.0]
+    assert "no_angle.png" not in poses
+
+    connection = sqlite3.connect(str(tmp_path / "database.db"))
+    model, width, height, params = connection.execute("SELECT model, width, height, params FROM cameras").fetchone()
+    connection.close()
+    assert (model, width, height) == (CAMERA_MODEL_IDS["PINHOLE"], 800, 700)
+    assert list(np.frombuffer(params, dtype=np.float64)) == INTRINSICS["params"]
+    assert (tmp_path / "model" / "cameras.txt").read_text().startswith("1 PINHOLE 800 700 1000.0")
+
+
+def test_poses_from_the_scan_container(tmp_path):
+    pytest.importorskip("h5py")
+    from scan_container import ScanWriter
+
+    # Names without angles, as exported from a container
+    names = ["frame_0.png", "frame_1.png"]
+    image_dir = tmp_path / "images_png"
+    image_dir.mkdir()
+    for name in names:
+        (image_dir / name).write_bytes(b"")
+    with ScanWriter(str(tmp_path / "scan.h5"), 2) as writer:
+        for name, angle in zip(names, (180.0, 45.0)):
+            writer.append(np.zeros((2, 2), dtype=np.uint16), angle, name)
+
+    colmap_database(str(tmp_path / "database.db"), names)
+    assert write_turntable_model(str(tmp_path / "database.db"), INTRINSICS, str(tmp_path / "model"),
+                                 str(image_dir)) == 2
+    poses = read_images_txt(tmp_path / "model")
+    assert poses["frame_0.png"][:4] == pytest.approx([0.0, 0.0, 1.0, 0.0], abs=1e-12)
+    assert poses["frame_1.png"][2] == pytest.approx(math.sin(math.radians(22.5)))
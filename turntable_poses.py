@@ -0,0 +1,81 @@
+"""
+COLMAP sparse model built from the rotation stage instead of estimated by the mapper.
+
+The camera is fixed and the object turns about the vertical axis, which is the
+same as the camera orbiting the object. Every image gets the pose given by its
+scan angle and every camera the same calibrated intrinsics, read from a JSON file:
+
+    {"model": "PINHOLE", "width": 800, "height": 700,
+     "params": [fx, fy, cx, cy], "distance": 10.0, "direction": 1}
+
+distance (camera to rotation axis) only sets the scale of the model, direction
+flips the sense of rotation if the motor turns the other way. Angles come
+from the scan container when there is one, from the file names otherwise.
+"""
+import json, os, sqlite3
+import numpy as np
+from scan_angles import angles_for_directory, parse_angle
+
+# COLMAP camera model ids, as stored in the database
+CAMERA_MODEL_IDS = {"SIMPLE_PINHOLE": 0, "PINHOLE": 1, "SIMPLE_RADIAL": 2, "RADIAL": 3, "OPENCV": 4}
+
+
+def load_intrinsics(path: str) -> dict:
+    with open(path) as f:
+        intrinsics = json.load(f)
+    if intrinsics["model"] not in CAMERA_MODEL_IDS:
+        raise ValueError(f"Unsupported camera model {intrinsics['model']}")
+    intrinsics.setdefault("distance", 10.0)
+    intrinsics.setdefault("direction", 1)
+    return intrinsics
+
+
+def turntable_pose(angle: float, distance: float, direction: int = 1):
+    """ World-to-camera quaternion (qw, qx, qy, qz) and translation for a rotation of `angle` degrees. """
+    half = np.deg2rad(direction * angle) / 2
+    return (float(np.cos(half)), 0.0, float(np.sin(half)), 0.0), (0.0, 0.0, float(distance))
+
+
+def write_turntable_model(database_path: str, intrinsics: dict, model_dir: str, image_dir: str = None) -> int:
+    """
+    Write cameras.txt / images.txt / points3D.txt for every image in the database
+    and store the same intrinsics in the database cameras. Returns the image count.
+    image_dir is where the database images are, for the angles of its container.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    model = intrinsics["model"]
+    width, height = intrinsics["width"], intrinsics["height"]
+    params = [float(p) for p in intrinsics["params"]]
+
+    connection = sqlite3.connect(database_path)
+    try:
+        images = connection.execute("SELECT image_id, name, camera_id FROM images ORDER BY image_id").fetchall()
+        camera_ids = sorted({camera_id for _, _, camera_id in images})
+
+        # Keep the database consistent with the model, otherwise the extractor's guess is used
+        connection.executemany(
+            "UPDATE cameras SET model=?, width=?, height=?, params=?, prior_focal_length=1 WHERE camera_id=?",
+            [(CAMERA_MODEL_IDS[model], width, height, np.array(params, dtype=np.float64).tobytes(), camera_id)
+             for camera_id in camera_ids])
+        connection.commit()
+    finally:
+        connection.close()
+
+    with open(os.path.join(model_dir, "cameras.txt"), "w") as f:
+        for camera_id in camera_ids:
+            f.write(f"{camera_id} {model} {width} {height} {' '.join(repr(p) for p in params)}\n")
+
+    angles = angles_for_directory(image_dir) if image_dir and os.path.isdir(image_dir) else {}
+    written = 0
+    with open(os.path.join(model_dir, "images.txt"), "w") as f:
+        for image_id, name, camera_id in images:
+            angle = angles.get(name, parse_angle(name))
+            if angle is None:
+                print(f"--No angle in {name}, leaving it out of the model")
+                continue
+            (qw, qx, qy, qz), (tx, ty, tz) = turntable_pose(angle, intrinsics["distance"], intrinsics["direction"])
+            f.write(f"{image_id} {qw!r} {qx!r} {qy!r} {qz!r} {tx!r} {ty!r} {tz!r} {camera_id} {name}\n\n")
+            written += 1
+
+    open(os.path.join(model_dir, "points3D.txt"), "w").close()
+    return written